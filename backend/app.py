@@ -1,77 +1,997 @@
+import asyncio
+import atexit
+import hmac
 import os
-import google.generativeai as genai
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify, Response, current_app, stream_with_context, has_request_context, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 import json
-import re 
+import logging
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
+from cache import ResponseCache, make_cache_key
+from cassettes import Cassette
+from compression import choose_encoding, compress
+from fuzzy_cache import FuzzyIndex
+from hedging import LatencyTracker, hedged_call, hedged_call_async
+from job_queue import PRIORITIES, JobStore, JobWorkers, RetryLater
+from json_stream import IncrementalJSONParser
+from json_repair import repair_json
+from lazy import Lazy
+from pre_review import PreReviewer
+from review_chunks import merge_review_suggestions, split_review_text
+from singleflight import FlightAbandoned, SingleFlight, fingerprint
+from governor import GeminiGovernor, GovernorError, RequestCancelledError, UpstreamTimeoutError, estimate_tokens
+from llm_backends import create_backend
+from model_tiers import ModelTiering, parse_tier_rules
+from observability import MetricsRegistry, Timer, log_event, log_payload, setup_logging
+from request_scope import TIMEOUT_HEADER, DisconnectMonitor, RequestScope, request_deadline
+from schemas import RESPONSE_SCHEMAS
+from skill_index import SkillIndex
+from tasks import InputBudgetError, InputField, Task, TaskRegistry, text_or
+from tenants import ANONYMOUS_TENANT, Tenant, TenantQuotaError, TenantStore, api_key_from_headers, parse_tenant_specs
 
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": ["http://localhost:5173", "http://127.0.0.1:5173"]}})
-
-
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment variables.")
-
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-1.5-flash')
-
-def parse_gemini_json(gemini_text):
-    """Attempts to parse JSON from Gemini response, handling potential markdown."""
+# Logs are JSON lines written from a background thread; payload bodies are only attached to a sample.
+setup_logging(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    payload_sample_rate=float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0)),
+    payload_max_chars=int(os.getenv("LOG_PAYLOAD_MAX_CHARS", 2000)),
+    log_format=os.getenv("LOG_FORMAT", "json"),
+)
+
+api = Blueprint('api', __name__)
+
+# Bump whenever any task's instruction or template below changes, so stale cached answers are not served.
+PROMPT_VERSION = "2"
+
+# The LLM backend is set by create_app(). It is a LazyBackend: the client (and the slow
+# google.generativeai import) is only built on the first call or the warm-up, once per process.
+llm_backend = None
+# Recorded upstream calls and API requests (cassettes.py), when recording or replaying; set by create_app().
+cassette = None
+
+# The response cache (cache.py), the job queue and the thread pools below are set by create_app() as well,
+# so importing this module opens no file and starts no thread.
+response_cache = None
+
+# Near-duplicate lookup after an exact miss, for the rewrite routes only. A route missing from
+# FUZZY_CACHE_THRESHOLDS (or with threshold 0) never answers from a fuzzy match.
+fuzzy_index = FuzzyIndex(
+    max_entries=int(os.getenv("FUZZY_CACHE_MAX_ENTRIES", 2000)),
+    bands=int(os.getenv("FUZZY_CACHE_BANDS", 8)),
+)
+FUZZY_CACHE_THRESHOLDS = {
+    route: float(threshold)
+    for route, threshold in (
+        item.split("=", 1) for item in os.getenv(
+            "FUZZY_CACHE_THRESHOLDS", "generate-summary=0.85,enhance-experience=0.85,enhance-project=0.85"
+        ).split(",") if "=" in item
+    )
+}
+
+# Bodies of at least this many bytes are gzip/brotli-compressed when the client accepts it (-1 disables).
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+
+gemini_flight = SingleFlight()
+
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 60))
+# Deadline (seconds) of one model call per route, covering queueing, retries and hedges.
+# Routes not listed get GEMINI_TIMEOUT_SECONDS.
+ROUTE_DEADLINES = {
+    route: float(seconds)
+    for route, seconds in (
+        item.split("=", 1) for item in os.getenv(
+            "ROUTE_DEADLINES",
+            "generate-summary=30,enhance-experience=30,enhance-project=30,suggest-skills=20,review-section=60,"
+            "analyze-experience=60,analyze-projects=60",
+        ).split(",") if "=" in item
+    )
+}
+
+# Overall deadline (seconds) of an API request by route (request_scope.py); a client's X-Request-Timeout
+# header may shorten it. Routes not listed get their model-call deadline from ROUTE_DEADLINES.
+REQUEST_DEADLINES = {
+    route: float(seconds)
+    for route, seconds in (
+        item.split("=", 1) for item in os.getenv("REQUEST_DEADLINES", "analyze-resume=90,enhance-batch=120").split(",")
+        if "=" in item
+    )
+}
+# Closed client connections of in-flight Flask requests are noticed within this many milliseconds (0 disables).
+disconnect_monitor = DisconnectMonitor(interval=float(os.getenv("DISCONNECT_POLL_MS", 100)) / 1000)
+# Model calls of a request run here, so the request's thread can stop waiting as soon as it is cancelled.
+call_executor = None
+
+# Hedged calls (hedging.py): on these routes a second request is sent when the first has run longer than
+# the route's observed HEDGE_PERCENTILE latency, once HEDGE_MIN_SAMPLES calls have been seen.
+HEDGE_ROUTES = {route.strip() for route in os.getenv("HEDGE_ROUTES", "").split(",") if route.strip()}
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 0.9))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_MS", 250)) / 1000
+latency_tracker = LatencyTracker(window=int(os.getenv("HEDGE_WINDOW", 200)),
+                                 min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", 20)))
+hedge_executor = None
+
+# Which model answers each call (model_tiers.py); set by create_app() like llm_backend.
+model_tiering = None
+
+gemini_governor = GeminiGovernor(
+    requests_per_minute=int(os.getenv("GEMINI_RPM", 60)),
+    tokens_per_minute=int(os.getenv("GEMINI_TPM", 1_000_000)),
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", 8)),
+    max_queue=int(os.getenv("GEMINI_MAX_QUEUE", 64)),
+    queue_timeout=float(os.getenv("GEMINI_QUEUE_TIMEOUT", 10)),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", 3)),
+    backoff_base=float(os.getenv("GEMINI_BACKOFF_BASE", 0.5)),
+    backoff_max=float(os.getenv("GEMINI_BACKOFF_MAX", 8)),
+    breaker_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", 5)),
+    breaker_reset=float(os.getenv("GEMINI_BREAKER_RESET", 30)),
+)
+
+# Send each route's response schema as Gemini's structured-output config (JSON mime type + schema).
+STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "true").lower() == "true"
+# How many times a reply that still fails parsing/validation after repair is re-asked before answering 500.
+AI_MAX_REASKS = int(os.getenv("AI_MAX_REASKS", 1))
+
+# Input budgets of the AI tasks (tasks.py), in estimated tokens, enforced before the upstream call.
+# Free-text fields (drafts, descriptions) and short fields (titles, company, technologies) over their
+# budget are truncated; a rendered request over AI_MAX_INPUT_TOKENS is rejected with 413.
+AI_TEXT_FIELD_MAX_TOKENS = int(os.getenv("AI_TEXT_FIELD_MAX_TOKENS", 1500))
+AI_SHORT_FIELD_MAX_TOKENS = int(os.getenv("AI_SHORT_FIELD_MAX_TOKENS", 100))
+AI_MAX_INPUT_TOKENS = int(os.getenv("AI_MAX_INPUT_TOKENS", 8000))
+task_registry = TaskRegistry()
+
+# Long review sections are split on '---' entry boundaries into chunks reviewed in parallel.
+REVIEW_CHUNK_TOKENS = int(os.getenv("REVIEW_CHUNK_TOKENS", 1200))
+# Per-request input budget for /api/review-section, checked before anything is sent upstream (0 disables).
+REVIEW_MAX_INPUT_TOKENS = int(os.getenv("REVIEW_MAX_INPUT_TOKENS", 12000))
+review_executor = None
+
+# Local job-title -> skills index; /api/suggest-skills only calls Gemini for titles it cannot match confidently.
+# Set by create_app() (None when SKILL_INDEX_PATH is none); a Lazy, so the files are read on first use.
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+skill_index = None
+SKILL_INDEX_MIN_CONFIDENCE = float(os.getenv("SKILL_INDEX_MIN_CONFIDENCE", 0.6))
+# Store Gemini's suggestions for unmatched titles in the learned file, so the next request is answered locally.
+SKILL_INDEX_WRITE_BACK = os.getenv("SKILL_INDEX_WRITE_BACK", "false").lower() == "true"
+
+# Review modes: 'llm' sends everything to Gemini; 'hybrid' checks spelling, doubled words, weak verbs,
+# passive voice and tense locally and only asks Gemini about clarity and tone; 'local' never calls Gemini.
+# 'hybrid' and 'local' are opt-in: the local spelling check knows a few thousand words (data/review_words.txt,
+# plus the names in data/review_skip_words.txt), not a full dictionary, so it misses typos Gemini catches.
+REVIEW_MODES = ('llm', 'hybrid', 'local')
+REVIEW_MODE = os.getenv("REVIEW_MODE", "llm")
+# Building the spelling index takes a few hundred milliseconds, so it happens on first use (or at warm-up).
+pre_reviewer = Lazy(partial(PreReviewer, os.path.join(data_dir, "review_words.txt"),
+                            os.path.join(data_dir, "review_skip_words.txt")), "pre-reviewer")
+
+# Readiness probes check upstream reachability at most this often (seconds; 0 disables the upstream check).
+READY_PROBE_INTERVAL = float(os.getenv("READY_PROBE_INTERVAL", 30))
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 25))
+batch_executor = None
+# Sections of /api/analyze-resume; separate from review_executor, which their review and retry sub-flows use.
+analysis_executor = None
+
+# Persistent job queue (POST /api/jobs) for bulk work and its worker pool; None while JOBS_DB_PATH=none,
+# which disables the job API.
+job_store = None
+job_workers = None
+JOBS_MAX_TASKS = int(os.getenv("JOBS_MAX_TASKS", 500))
+
+# API consumers (tenants.py). TENANTS declares them (id:weight=3:rpm=120:tpm=400000, ...) and TENANT_API_KEYS
+# maps each API key to its tenant (key=tenant, ...). Requests without a key belong to the anonymous tenant
+# unless TENANT_REQUIRE_KEY is set. TENANT_DEFAULT_* fill in the options a tenant leaves out and apply to the
+# anonymous tenant; a quota of 0 is unlimited. TENANTS_PATH keeps tenants and their usage in a local JSON
+# file (none: in memory only); settings given here override the file's.
+tenants_path = os.getenv("TENANTS_PATH", "none")
+tenant_store = TenantStore(
+    path=None if tenants_path.lower() == "none" else tenants_path,
+    require_key=os.getenv("TENANT_REQUIRE_KEY", "false").lower() == "true",
+    save_interval=float(os.getenv("TENANTS_SAVE_INTERVAL", 30)),
+)
+TENANT_DEFAULTS = {
+    'weight': float(os.getenv("TENANT_DEFAULT_WEIGHT", 1)),
+    'rpm': int(os.getenv("TENANT_DEFAULT_RPM", 0)),
+    'tpm': int(os.getenv("TENANT_DEFAULT_TPM", 0)),
+}
+
+
+def configured_tenant(tenant_id, options=None):
+    settings = dict(TENANT_DEFAULTS, **(options or {}))
+    return Tenant(tenant_id, settings['weight'], settings['rpm'], settings['tpm'])
+
+
+for tenant_id, options in dict({ANONYMOUS_TENANT: {}}, **parse_tenant_specs(os.getenv("TENANTS", ""))).items():
+    tenant_store.register(configured_tenant(tenant_id, options))
+for api_key, tenant_id in (item.rsplit("=", 1) for item in os.getenv("TENANT_API_KEYS", "").split(",") if "=" in item):
+    tenant_store.register(tenant_store.get(tenant_id.strip()) or configured_tenant(tenant_id.strip()),
+                          api_keys=[api_key.strip()])
+if tenant_store.path:
+    atexit.register(tenant_store.save)
+# The operational stats endpoints (cache, single-flight, governor and every tenant's usage) answer only
+# requests carrying ADMIN_API_KEY; other callers get 403, and /api/tenants/stats shows them their own tenant.
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "")
+
+# --- Metrics (rendered by GET /metrics) ---
+
+metrics = MetricsRegistry()
+REQUEST_LATENCY = metrics.histogram("http_request_duration_seconds", "End-to-end latency of API requests.", ("route",))
+REQUESTS = metrics.counter("http_requests_total", "API requests by route and status code.", ("route", "status"))
+PHASE_LATENCY = metrics.histogram("ai_phase_duration_seconds", "Time spent per phase of an AI request (gemini, parse, validate).", ("route", "phase"))
+TOKENS_USED = metrics.counter("ai_tokens_total", "Tokens reported by the model's usage metadata (prompt, completion, cached).", ("route", "kind"))
+PROMPT_TOKENS = metrics.histogram("ai_prompt_tokens", "Estimated tokens of each prepared task prompt, by part (instruction or input).", ("task", "part"),
+                                  buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384))
+INPUT_TRUNCATIONS = metrics.counter("ai_input_truncations_total", "Task inputs cut to their token budget before the upstream call.", ("task", "field"))
+INPUT_REJECTIONS = metrics.counter("ai_input_rejections_total", "Requests rejected (413) for an input over its token budget.", ("task",))
+PARSE_FAILURES = metrics.counter("ai_parse_failures_total", "Model responses that could not be parsed as JSON.", ("route",))
+SCHEMA_FAILURES = metrics.counter("ai_schema_failures_total", "Parsed model responses that failed the route's structural validation.", ("route",))
+JSON_REPAIRS = metrics.counter("ai_json_repairs_total", "Invalid JSON replies recovered by the repair parser instead of a new model call.", ("route",))
+GENERATIONS = metrics.counter("ai_generations_total", "Non-streaming model generations by attempt (initial or reask).", ("route", "attempt"))
+REASKS = metrics.counter("ai_reasks_total", "Automatic re-asks after an unusable reply, by reason (parse or schema).", ("route", "reason"))
+LOCAL_REVIEW_FINDINGS = metrics.counter("review_local_findings_total", "Review suggestions produced by the local pre-review, by type.", ("type",))
+CONDITIONAL_RESPONSES = metrics.counter("conditional_responses_total", "Requests to ETag routes by outcome (not_modified, stored, input_hash, unknown_hash, computed).", ("route", "result"))
+COMPRESSED_BYTES = metrics.counter("http_compressed_bytes_total", "Response bytes before (raw) and after (sent) compression, by encoding.", ("encoding", "stage"))
+FUZZY_CACHE_LOOKUPS = metrics.counter("fuzzy_cache_lookups_total", "Near-duplicate lookups after an exact cache miss, by result (hit or miss).", ("route", "result"))
+JOB_TASKS = metrics.counter("job_tasks_total", "Job tasks processed by the background workers, by route and status code.", ("route", "status"))
+MODEL_TIER_CALLS = metrics.counter("model_tier_calls_total", "Model calls by route and the model tier chosen for them.", ("route", "tier"))
+HEDGED_CALLS = metrics.counter("hedged_calls_total", "Model calls on hedged routes by outcome (unhedged, skipped, primary_won, hedge_won, failed).", ("route", "outcome"))
+DEADLINE_EXCEEDED = metrics.counter("ai_deadline_exceeded_total", "Model calls that ran out of their route deadline.", ("route",))
+REQUESTS_CANCELLED = metrics.counter("http_requests_cancelled_total", "API requests whose remaining work was dropped, by reason (disconnected or deadline).", ("route", "reason"))
+MODEL_CALLS_CANCELLED = metrics.counter("ai_calls_cancelled_total", "Model calls abandoned because their request was cancelled, by reason.", ("route", "reason"))
+TENANT_REQUESTS = metrics.counter("tenant_requests_total", "API requests by tenant and status code.", ("tenant", "status"))
+TENANT_REQUEST_LATENCY = metrics.histogram("tenant_request_duration_seconds", "End-to-end latency of API requests by tenant.", ("tenant",))
+TENANT_TOKENS = metrics.counter("tenant_ai_tokens_total", "Model tokens charged to each tenant's quota (estimated, plus reported usage beyond the estimate).", ("tenant",))
+TENANT_QUOTA_REJECTIONS = metrics.counter("tenant_quota_rejections_total", "Requests and model calls refused (429) for a spent tenant quota, by quota (requests or tokens).", ("tenant", "quota"))
+SKILL_INDEX_LOOKUPS = metrics.counter("skill_index_lookups_total", "Skill suggestions answered by the local index (hit) or passed on to Gemini (miss).", ("result",))
+metrics.add_collector("cache", lambda: response_cache.stats())
+metrics.add_collector("fuzzy_cache", fuzzy_index.stats)
+metrics.add_collector("singleflight", gemini_flight.stats)
+metrics.add_collector("governor", gemini_governor.stats)
+metrics.add_collector("disconnect_monitor", disconnect_monitor.stats)
+metrics.add_collector("jobs", lambda: job_store.stats() if job_store is not None else {})
+
+def parse_gemini_json(gemini_text, route=None):
+    """
+    Attempts to parse JSON from Gemini response, handling potential markdown.
+    Falls back to the repair parser (truncation, trailing commas, raw newlines) before giving up.
+    """
     if not gemini_text:
-        print("Warning: Received empty text from Gemini.")
+        log_event(logging.WARNING, "gemini_empty_response")
         return None
-    
+
     cleaned_text = re.sub(r'^```json\s*', '', gemini_text, flags=re.IGNORECASE | re.MULTILINE)
     cleaned_text = re.sub(r'\s*```$', '', cleaned_text)
     cleaned_text = cleaned_text.strip()
 
-    
-
     try:
         return json.loads(cleaned_text)
     except json.JSONDecodeError as e:
-        print(f"JSON Decode Error: {e}")
-        print(f"--- Problematic Text Start ---")
-        print(repr(cleaned_text)) # Use repr to see escape characters
-        print(f"--- Problematic Text End ---")
-        
-        return None 
+        repaired = repair_json(cleaned_text)
+        if repaired is not None:
+            JSON_REPAIRS.inc(route or 'unknown')
+            log_payload(logging.INFO, "gemini_json_repaired", cleaned_text, route=route, error=str(e))
+            return repaired
+        log_payload(logging.WARNING, "gemini_json_decode_error", cleaned_text, route=route, error=str(e))
+        return None
 
-# --- API Routes ---
 
-@app.route('/api/generate-summary', methods=['POST'])
-def generate_summary_route():
+def response_schema_for(task):
+    """The structured-output schema sent with a task's generation, or None when disabled."""
+    return task.schema if STRUCTURED_OUTPUT else None
+
+
+def record_token_usage(route, response):
+    """Adds the response's usage metadata to the token counters. Returns the total token count."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return 0
+    for kind, attribute in (('prompt', 'prompt_token_count'), ('completion', 'candidates_token_count'),
+                            ('cached', 'cached_content_token_count')):
+        count = getattr(usage, attribute, 0) or 0
+        if count:
+            TOKENS_USED.inc(route, kind, amount=count)
+    return getattr(usage, 'total_token_count', 0) or 0
+
+
+def charge_tenant_request(tenant):
+    """Takes one request from the tenant's quota. Raises TenantQuotaError (429) when it is spent."""
+    try:
+        tenant.acquire_request()
+    except TenantQuotaError:
+        TENANT_QUOTA_REJECTIONS.inc(tenant.id, 'requests')
+        raise
+
+
+def charge_tenant_tokens(tenant, estimated_tokens):
+    """Takes a model call's estimated tokens from its tenant's quota (nothing without a tenant). Raises TenantQuotaError."""
+    if tenant is None:
+        return
+    try:
+        tenant.acquire_tokens(estimated_tokens)
+    except TenantQuotaError:
+        TENANT_QUOTA_REJECTIONS.inc(tenant.id, 'tokens')
+        raise
+    TENANT_TOKENS.inc(tenant.id, amount=estimated_tokens)
+
+
+def record_tenant_tokens(tenant, estimated_tokens, actual_tokens):
+    """Charges the tenant for tokens the upstream reported beyond the call's estimate."""
+    if tenant is not None and actual_tokens > estimated_tokens:
+        tenant.record_tokens(estimated_tokens, actual_tokens)
+        TENANT_TOKENS.inc(tenant.id, amount=actual_tokens - estimated_tokens)
+
+
+def record_tenant_request(tenant, seconds, status_code):
+    """Counts one answered API request of tenant and its latency."""
+    TENANT_REQUESTS.inc(tenant.id, str(status_code))
+    TENANT_REQUEST_LATENCY.observe(seconds, tenant.id)
+    tenant_store.record_request(tenant, seconds, status_code)
+
+
+def fair_share(tenant):
+    """The governor arguments placing a call of tenant in the fair queue (the default tenant without one)."""
+    return {} if tenant is None else {'tenant': tenant.id, 'weight': tenant.weight}
+
+
+def handle_model_response(route, response, estimated_tokens, gemini_seconds, tenant=None):
+    """Records usage and latency of one generation and parses its reply. Returns (raw_response_text, result_json)."""
+    PHASE_LATENCY.observe(gemini_seconds, route, 'gemini')
+    total_tokens = record_token_usage(route, response)
+    gemini_governor.record_usage(estimated_tokens, total_tokens)
+    record_tenant_tokens(tenant, estimated_tokens, total_tokens)
+
+    raw_response_text = response.text if hasattr(response, 'text') else ''
+    log_payload(logging.INFO, "gemini_response", raw_response_text, route=route,
+                seconds=round(gemini_seconds, 3), chars=len(raw_response_text))
+
+    with Timer() as parse_timer:
+        result_json = parse_gemini_json(raw_response_text, route)
+    PHASE_LATENCY.observe(parse_timer.elapsed, route, 'parse')
+    if result_json is None:
+        PARSE_FAILURES.inc(route)
+    return raw_response_text, result_json
+
+
+def choose_model(route, estimated_tokens):
+    """Picks the model for a call by route and prompt size (see model_tiers.py) and counts the tier."""
+    tier, model_name = model_tiering.choose(route, estimated_tokens)
+    MODEL_TIER_CALLS.inc(route, tier)
+    return model_name
+
+
+def route_deadline(route):
+    return ROUTE_DEADLINES.get(route, GEMINI_TIMEOUT_SECONDS)
+
+
+def call_deadline(route, scope):
+    """Deadline (time.monotonic()) of one model call: the route's, or the request's when that is sooner."""
+    deadline = time.monotonic() + route_deadline(route)
+    return deadline if scope is None else min(deadline, scope.deadline)
+
+
+def remaining_timeout(deadline):
+    """Seconds left for the next upstream request; raises TimeoutError (retryable) once the deadline has passed."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("The route deadline passed before the upstream request started.")
+    return remaining
+
+
+def hedge_delay(route, model_name):
+    """Seconds to wait before hedging a call, or None when the route is not hedged or has too few samples yet."""
+    if route not in HEDGE_ROUTES:
+        return None
+    observed = latency_tracker.percentile((route, model_name), HEDGE_PERCENTILE)
+    return None if observed is None else max(observed, HEDGE_MIN_DELAY_SECONDS)
+
+
+def record_hedge_outcome(route, delay, outcome):
+    if delay is not None:
+        HEDGED_CALLS.inc(route, outcome)
+
+
+def deadline_exceeded(route, error, scope=None, deadline=None):
     """
-    API endpoint to generate a refined resume summary and suggestions.
-    Expects JSON: {"jobTitle": "...", "currentSummary": "..."}
-    Returns JSON: {"refinedSummary": "...", "suggestions": [{"level": "...", "text": "..."}, ...]}
+    Counts a call that ran out of its deadline and returns the GovernorError to raise for it (504).
+    When that deadline was the request's, the request is cancelled so its other work stops too.
+    """
+    DEADLINE_EXCEEDED.inc(route)
+    if scope is not None and deadline is not None and deadline >= scope.deadline:
+        scope.cancel('deadline')
+    if isinstance(error, UpstreamTimeoutError):
+        return error
+    return UpstreamTimeoutError("The AI service did not answer in time. Please try again shortly.", 1)
+
+
+def leader_gave_up(scope, error):
+    """
+    True when a coalesced call failed because of its leader's own request: cancelled, past the
+    request's deadline (deadline_exceeded() cancels only that scope) or over its tenant's token
+    quota. Followers then get FlightAbandoned and call again within their own deadline and
+    quota instead of sharing the error.
+    """
+    return scope is not None and (scope.cancelled.is_set() or isinstance(error, (RequestCancelledError, TenantQuotaError)))
+
+
+def generate_json(prompt, task, scope=None):
+    """
+    Calls the configured LLM backend for a task and parses the JSON reply; prompt is
+    the task's rendered context, sent after its static instruction.
+    An identical prompt already in flight on another thread is awaited and its
+    parsed result shared, instead of starting a second upstream call. The call
+    itself goes through the governor (quota, concurrency, retries, breaker), is
+    bounded by the route's deadline and, on HEDGE_ROUTES, hedged once it runs
+    longer than the route usually takes.
+    With a RequestScope, the request's deadline applies when it is sooner, and the
+    call runs on call_executor so a cancelled request stops waiting for it at once;
+    whatever has not reached the upstream yet is dropped. The scope's tenant is
+    charged the call's estimated tokens up front, unless the call is shared with one
+    already in flight, and queues it fairly among tenants.
+    Returns (raw_response_text, result_json). Raises GovernorError when rejected
+    (UpstreamTimeoutError once the deadline passes, RequestCancelledError once cancelled,
+    TenantQuotaError when the tenant's token quota is spent).
+    """
+    route = task.route
+    tenant = scope.tenant if scope is not None else None
+    estimated_tokens = task.instruction_tokens + estimate_tokens(prompt)
+    model_name = choose_model(route, estimated_tokens)
+    deadline = call_deadline(route, scope)
+    cancelled = scope.cancelled if scope is not None else None
+
+    def attempt(kind):
+        if kind == 'hedge':
+            log_event(logging.INFO, "gemini_hedge_started", route=route, model=model_name)
+
+        def request():
+            with Timer() as upstream_timer:
+                response = llm_backend.generate(prompt, route=route, timeout=remaining_timeout(deadline),
+                                                response_schema=response_schema_for(task), model_name=model_name,
+                                                system_instruction=task.instruction)
+            latency_tracker.observe((route, model_name), upstream_timer.elapsed)
+            return response
+
+        return gemini_governor.call(request, estimated_tokens, deadline, cancelled, **fair_share(tenant))
+
+    def call_model():
+        charge_tenant_tokens(tenant, estimated_tokens)  # only the caller that goes upstream pays
+        delay = hedge_delay(route, model_name)
+        with Timer() as gemini_timer:
+            try:
+                if delay is None:
+                    response, outcome = attempt('primary'), 'unhedged'
+                else:
+                    response, outcome = hedged_call(attempt, delay, hedge_executor, deadline,
+                                                    may_hedge=gemini_governor.has_spare_capacity)
+            except (UpstreamTimeoutError, TimeoutError) as e:
+                record_hedge_outcome(route, delay, 'failed')
+                raise deadline_exceeded(route, e, scope, deadline) from e
+            except Exception:
+                record_hedge_outcome(route, delay, 'failed')
+                raise
+        record_hedge_outcome(route, delay, outcome)
+        return handle_model_response(route, response, estimated_tokens, gemini_timer.elapsed, tenant)
+
+    def shared_call():
+        while True:
+            try:
+                return gemini_flight.do(fingerprint(model_name, task.name, prompt), call_model,
+                                        partial(leader_gave_up, scope))
+            except FlightAbandoned:
+                continue  # the leader's request went away or ran out of time; this one tries within its own
+
+    if scope is None:
+        return shared_call()
+    future = None
+    try:
+        scope.check()
+        future = call_executor.submit(shared_call)
+        return scope.wait(future)
+    except GovernorError as e:
+        if future is not None and future.done() and not isinstance(e, RequestCancelledError):
+            raise
+        MODEL_CALLS_CANCELLED.inc(route, scope.reason)
+        raise scope.error() from e
+
+
+async def generate_json_async(prompt, task, scope=None):
+    """
+    Async counterpart of generate_json() for the ASGI app; same coalescing, governor, deadline, hedging and parsing.
+    A cancelled request cancels the task awaiting this, which cancels the upstream call itself.
+    """
+    if scope is not None:
+        scope.check()
+    route = task.route
+    tenant = scope.tenant if scope is not None else None
+    estimated_tokens = task.instruction_tokens + estimate_tokens(prompt)
+    model_name = choose_model(route, estimated_tokens)
+    deadline = call_deadline(route, scope)
+
+    async def attempt(kind):
+        if kind == 'hedge':
+            log_event(logging.INFO, "gemini_hedge_started", route=route, model=model_name)
+
+        async def request():
+            timeout = remaining_timeout(deadline)
+            with Timer() as upstream_timer:
+                response = await asyncio.wait_for(
+                    llm_backend.generate_async(prompt, route=route, timeout=timeout,
+                                               response_schema=response_schema_for(task), model_name=model_name,
+                                               system_instruction=task.instruction),
+                    timeout,
+                )
+            latency_tracker.observe((route, model_name), upstream_timer.elapsed)
+            return response
+
+        return await gemini_governor.acall(request, estimated_tokens, deadline, **fair_share(tenant))
+
+    async def call_model():
+        charge_tenant_tokens(tenant, estimated_tokens)  # only the caller that goes upstream pays
+        delay = hedge_delay(route, model_name)
+        with Timer() as gemini_timer:
+            try:
+                if delay is None:
+                    response, outcome = await attempt('primary'), 'unhedged'
+                else:
+                    response, outcome = await hedged_call_async(attempt, delay, deadline,
+                                                                may_hedge=gemini_governor.has_spare_capacity)
+            except (UpstreamTimeoutError, TimeoutError) as e:
+                record_hedge_outcome(route, delay, 'failed')
+                raise deadline_exceeded(route, e, scope, deadline) from e
+            except Exception:
+                record_hedge_outcome(route, delay, 'failed')
+                raise
+        record_hedge_outcome(route, delay, outcome)
+        return handle_model_response(route, response, estimated_tokens, gemini_timer.elapsed, tenant)
+
+    while True:
+        try:
+            return await gemini_flight.do_async(fingerprint(model_name, task.name, prompt), call_model,
+                                                partial(leader_gave_up, scope))
+        except FlightAbandoned:
+            continue  # the leader's request went away or ran out of time; this one tries within its own
+        except asyncio.CancelledError:
+            MODEL_CALLS_CANCELLED.inc(route, scope.reason if scope is not None and scope.reason else 'disconnected')
+            raise
+
+
+# --- Route flows ---
+# Each route's logic is written once as a generator that yields a ModelCall (a task's
+# rendered prompt) whenever it needs a generation and is sent back (raw_response_text, result_json), or yields a list
+# of sub-flows to run in parallel and is sent back their results. run_flow() drives a
+# flow on the calling thread for the Flask app; run_flow_async() drives the same flow on
+# the event loop for the ASGI app (asgi.py). A flow returns (body, status_code).
+
+ModelCall = namedtuple('ModelCall', ['prompt', 'task'])
+
+
+def run_flow(flow, executor=None, scope=None):
+    """
+    Runs a flow to completion, calling the model synchronously. Returns (body, status_code).
+    Sub-flows run on executor (default review_executor); their own sub-flows always use
+    review_executor, so a flow whose sub-flows fan out again should get a separate pool.
+    With a RequestScope, every model call is bounded by the request's deadline and the
+    flow stops waiting as soon as the request is cancelled.
+    """
+    try:
+        step = next(flow)
+        while True:
+            try:
+                if isinstance(step, ModelCall):
+                    result = generate_json(step.prompt, step.task, scope)
+                else:
+                    futures = [(executor or review_executor).submit(run_flow, sub_flow, None, scope) for sub_flow in step]
+                    result = wait_for_sub_flows(futures, scope)
+            except Exception as e:
+                step = flow.throw(e)
+            else:
+                step = flow.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+def wait_for_sub_flows(futures, scope):
+    """
+    Results of sub-flows submitted by run_flow(). A disconnect stops the wait at once and drops the
+    sub-flows that have not started; past the deadline they end promptly with their own 504s instead.
+    """
+    if scope is None:
+        return [future.result() for future in futures]
+    try:
+        return [scope.wait(future) if scope.reason != 'deadline' else future.result() for future in futures]
+    except RequestCancelledError:
+        for future in futures:
+            future.cancel()
+        raise
+    except UpstreamTimeoutError:
+        return [future.result() for future in futures]
+
+
+def resume_flow(resume, value):
+    """
+    flow.send(value) or flow.throw(value). Returns (False, next step) or, once the flow returns,
+    (True, its return value): StopIteration cannot cross the thread boundary of asyncio.to_thread.
+    """
+    try:
+        return False, resume(value)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+async def run_flow_async(flow, scope=None):
+    """
+    Runs a flow to completion on the event loop, awaiting model calls. Returns (body, status_code).
+    The flow's own code between model calls (response cache reads and writes in SQLite, local review,
+    the lazily built pre-reviewer and skill index) runs on a worker thread, so it never blocks the loop.
+    """
+    finished, step = await asyncio.to_thread(resume_flow, flow.send, None)
+    while not finished:
+        try:
+            if isinstance(step, ModelCall):
+                result = await generate_json_async(step.prompt, step.task, scope)
+            else:
+                result = await asyncio.gather(*(run_flow_async(sub_flow, scope) for sub_flow in step))
+        except Exception as e:
+            finished, step = await asyncio.to_thread(resume_flow, flow.throw, e)
+        else:
+            finished, step = await asyncio.to_thread(resume_flow, flow.send, result)
+    return step
+
+
+def open_request_scope(path, timeout_header, tenant=None):
+    """RequestScope of an /api/* request of tenant: its route's deadline, or the client's X-Request-Timeout when sooner."""
+    name = path.removeprefix('/api/').removesuffix('/stream')
+    return RequestScope(path, request_deadline(timeout_header, REQUEST_DEADLINES.get(name, route_deadline(name))),
+                        tenant)
+
+
+def close_request_scope(scope):
+    """Counts a finished request whose remaining work was dropped."""
+    if scope.cancelled.is_set():
+        REQUESTS_CANCELLED.inc(scope.route, scope.reason)
+        log_event(logging.INFO, "request_cancelled", route=scope.route, reason=scope.reason)
+
+
+@contextmanager
+def watched_request_scope():
+    """RequestScope of the current Flask request, cancelled if the client disconnects within the block."""
+    scope = open_request_scope(request.url_rule.rule, request.headers.get(TIMEOUT_HEADER), current_tenant())
+    try:
+        with disconnect_monitor.watch(request.environ, scope):
+            yield scope
+    finally:
+        close_request_scope(scope)
+
+
+def run_request_flow(flow, executor=None):
+    """run_flow() for the current Flask request: bounded by its deadline and cancelled when the client disconnects."""
+    with watched_request_scope() as scope:
+        return run_flow(flow, executor, scope)
+
+
+def cache_bypass_requested(data):
+    """True when the caller sent "skipCache": true or a Cache-Control: no-cache header."""
+    if data.get('skipCache'):
+        return True
+    return has_request_context() and 'no-cache' in request.headers.get('Cache-Control', '').lower()
+
+
+def lookup_cached_response(route_name, inputs, data):
+    """
+    Checks the response cache for a route.
+    Returns (cache_key, cached_body). cached_body is None on a miss or when the
+    caller sent "skipCache": true (or a Cache-Control: no-cache header) to force a fresh rewrite.
+    """
+    cache_key = make_cache_key(route_name, inputs, model_tiering.route_models(route_name), PROMPT_VERSION)
+    if cache_bypass_requested(data):
+        response_cache.record_bypass()
+        return cache_key, None
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        log_event(logging.INFO, "cache_hit", route=route_name)
+    return cache_key, cached
+
+
+def fuzzy_scope(route_name, scope_inputs):
+    """Everything a fuzzy match must share exactly: the route, its models, prompt version and the non-text inputs."""
+    return make_cache_key(route_name, scope_inputs, model_tiering.route_models(route_name), PROMPT_VERSION)
+
+
+def lookup_similar_response(route_name, scope_inputs, text, data):
+    """
+    Near-duplicate lookup after an exact cache miss: a cached answer for the same scope_inputs
+    whose text is at least FUZZY_CACHE_THRESHOLDS[route_name] similar to text.
+    Returns the cached body marked with "fuzzyCacheHit": true and the similarity, or None.
+    """
+    threshold = FUZZY_CACHE_THRESHOLDS.get(route_name, 0)
+    if threshold <= 0 or cache_bypass_requested(data):
+        return None
+    cache_key, similarity = fuzzy_index.find(fuzzy_scope(route_name, scope_inputs), text, threshold)
+    cached = response_cache.get(cache_key) if cache_key is not None else None
+    if cache_key is not None and cached is None:
+        fuzzy_index.discard(cache_key)  # the answer expired or was evicted from the response cache
+    FUZZY_CACHE_LOOKUPS.inc(route_name, 'hit' if cached is not None else 'miss')
+    if cached is None:
+        return None
+    log_event(logging.INFO, "fuzzy_cache_hit", route=route_name, similarity=round(similarity, 3))
+    return dict(cached, fuzzyCacheHit=True, fuzzySimilarity=round(similarity, 3))
+
+
+def current_tenant():
+    """The tenant of the current Flask request (set by identify_tenant), or None outside /api/*."""
+    return g.get('tenant') if has_request_context() else None
+
+
+def tenant_stats(tenant_id=None):
+    """
+    Per-tenant usage, quotas and request latency, with the tenant's upstream slot usage under "queue".
+    With tenant_id, only that tenant's entry.
+    """
+    queues = gemini_governor.stats()['tenants']
+    return {stats_id: dict(stats, queue=queues.get(stats_id, {"calls": 0, "queued": 0, "waitSeconds": 0.0}))
+            for stats_id, stats in tenant_store.stats().items() if tenant_id is None or stats_id == tenant_id}
+
+
+def governor_stats():
+    """Governor state plus the recent upstream latency percentiles that drive hedging."""
+    return dict(gemini_governor.stats(), latency=latency_tracker.stats())
+
+
+def cache_stats():
+    return dict(response_cache.stats(), fuzzy=fuzzy_index.stats())
+
+
+def is_admin_key(api_key):
+    """True for ADMIN_API_KEY (never while it is unset)."""
+    return bool(ADMIN_API_KEY) and api_key is not None and \
+        hmac.compare_digest(api_key.encode("utf-8"), ADMIN_API_KEY.encode("utf-8"))
+
+
+STATS = {
+    'cache': cache_stats,
+    'singleflight': gemini_flight.stats,
+    'governor': governor_stats,
+    'tenants': tenant_stats,
+}
+
+
+def stats_response(name, api_key):
+    """
+    (body, status_code) of the STATS[name] endpoint for a caller with api_key: everything for the admin
+    key; otherwise 403, except that a tenant's key reads its own entry of the tenant stats.
+    """
+    if is_admin_key(api_key):
+        return STATS[name](), 200
+    tenant = tenant_store.identify(api_key) if name == 'tenants' else None
+    if tenant is not None:
+        return tenant_stats(tenant.id), 200
+    return {"error": "These statistics require the admin API key."}, 403
+
+
+def remember_similar_response(route_name, scope_inputs, text, cache_key):
+    """Indexes a freshly cached answer so near-duplicates of text can reuse it."""
+    if FUZZY_CACHE_THRESHOLDS.get(route_name, 0) > 0:
+        fuzzy_index.add(fuzzy_scope(route_name, scope_inputs), text, cache_key)
+
+
+# --- Conditional responses ---
+# Review and skill-suggestion answers depend only on their inputs, the prompt version and
+# the route's models. Their ETag is a hash of exactly that, returned as a weak ETag and as
+# X-Input-Hash. A client can revalidate with If-None-Match (304, no model call) or send
+# {"inputHash": "..."} instead of the full input to fetch the stored body.
+
+INPUT_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+def review_response_inputs(data):
+    """The inputs a review answer depends on, or None when the request does not carry them."""
+    if 'text' not in data:
+        return None
+    return {'sectionName': data.get('sectionName', 'Unknown Section'), 'text': data.get('text', ''),
+            'reviewMode': data.get('reviewMode') or REVIEW_MODE}
+
+
+def skills_response_inputs(data):
+    """The inputs a skill suggestion depends on (skill order and case ignored), or None when absent."""
+    if 'jobTitle' not in data:
+        return None
+    existing_skills = data.get('skills', [])
+    if not isinstance(existing_skills, list) or not all(isinstance(s, str) for s in existing_skills):
+        existing_skills = []
+    return {'jobTitle': data.get('jobTitle', ''), 'skills': sorted({skill.lower().strip() for skill in existing_skills})}
+
+
+ETAG_ROUTES = {
+    'review-section': review_response_inputs,
+    'suggest-skills': skills_response_inputs,
+}
+
+
+def etag_matches(if_none_match, etag_key, stored):
+    """
+    True when an If-None-Match header lists etag_key (weak comparison), or is '*' and a
+    representation is stored (stored): '*' only matches a current one (RFC 9110 §13.1.2).
+    """
+    for tag in (if_none_match or '').split(','):
+        tag = tag.strip()
+        if tag == '*' and stored or tag.removeprefix('W/').strip('"') == etag_key:
+            return True
+    return False
+
+
+def lookup_conditional_response(route_name, data, if_none_match):
     """
+    Answers an ETag route's request from its input hash when possible.
+    Returns (etag_key, answer): answer is (None, 304) when the client's copy is current,
+    (stored body, 200), a 404 for an inputHash with no stored body, or None when the
+    route has to run. etag_key is None when the request carries neither input nor hash.
+    """
+    inputs = ETAG_ROUTES[route_name](data)
+    if inputs is not None:
+        etag_key = make_cache_key(f"{route_name}:response", inputs, model_tiering.route_models(route_name), PROMPT_VERSION)
+    elif isinstance(data.get('inputHash'), str) and INPUT_HASH.fullmatch(data['inputHash']):
+        etag_key = data['inputHash']
+    else:
+        return None, None
+
+    if cache_bypass_requested(data):
+        return etag_key, None
+    stored = response_cache.get(etag_key)
+    if etag_matches(if_none_match, etag_key, stored is not None):
+        CONDITIONAL_RESPONSES.inc(route_name, 'not_modified')
+        return etag_key, (None, 304)
+    if stored is not None:
+        CONDITIONAL_RESPONSES.inc(route_name, 'stored' if inputs is not None else 'input_hash')
+        return etag_key, (stored, 200)
+    if inputs is None:
+        CONDITIONAL_RESPONSES.inc(route_name, 'unknown_hash')
+        return etag_key, ({"error": "No stored response for this inputHash. Send the full request instead."}, 404)
+    return etag_key, None
+
+
+def store_conditional_response(route_name, etag_key, body, status):
+    """Keeps a freshly computed 200 body under its input hash."""
+    if etag_key is not None and status == 200:
+        CONDITIONAL_RESPONSES.inc(route_name, 'computed')
+        response_cache.set(etag_key, body)
+
+
+def conditional_json_response(route_name, flow):
+    """Flask response for an ETag route, with ETag and X-Input-Hash headers on 200 and 304 answers."""
     if not request.is_json:
         return jsonify({"error": "Request must be JSON"}), 400
 
     data = request.get_json()
-    job_title = data.get('jobTitle', '')
-    current_summary = data.get('currentSummary', '')
+    etag_key, answer = lookup_conditional_response(route_name, data, request.headers.get('If-None-Match'))
+    if answer is None:
+        answer = run_request_flow(flow(data))
+        store_conditional_response(route_name, etag_key, *answer)
+    body, status = answer
+    response = Response(status=304) if status == 304 else jsonify(body)
+    response.status_code = status
+    if etag_key is not None and status in (200, 304):
+        response.set_etag(etag_key, weak=True)
+        response.headers['X-Input-Hash'] = etag_key
+    return response
+
+
+def build_reask_prompt(prompt, error):
+    """Appends a correction note to the original prompt after an unusable reply (the instruction stays as is)."""
+    detail = error.get('error') if isinstance(error, dict) else error
+    return prompt + f"""
+
+IMPORTANT: Your previous reply could not be used ({detail}).
+Reply again with *only* the JSON object described in the Output Format of your instructions, complete and valid."""
+
+
+def prepare_task(task, data):
+    """task.prepare(data), counting the prompt's tokens and any truncated or rejected input."""
+    try:
+        prepared = task.prepare(data)
+    except InputBudgetError as e:
+        INPUT_REJECTIONS.inc(task.name)
+        log_event(logging.INFO, "ai_input_rejected", task=task.name, field=e.field, tokens=e.tokens, limit=e.limit)
+        raise
+    PROMPT_TOKENS.observe(task.instruction_tokens, task.name, 'instruction')
+    PROMPT_TOKENS.observe(prepared.input_tokens, task.name, 'input')
+    for field in prepared.truncated:
+        INPUT_TRUNCATIONS.inc(task.name, field)
+    if prepared.truncated:
+        log_event(logging.INFO, "ai_input_truncated", task=task.name, fields=list(prepared.truncated))
+    return prepared
+
+
+def ai_request_flow(task, data, cache_key):
+    """
+    Shared prepare/call/parse/validate flow of the AI routes.
+    The task's prompt is rendered from data, and its finalize post-processing turns the parsed
+    reply into the body. A reply that is still unusable after JSON repair is re-asked up to
+    AI_MAX_REASKS times before the error is returned; an input over its budget answers 413
+    without any model call.
+    Returns (body, status_code). GovernorError propagates so the caller can answer 503 + Retry-After.
+    """
+    route = task.route
+    try:
+        prepared = prepare_task(task, data)
+        attempt_prompt = prepared.text
+        for attempt in range(AI_MAX_REASKS + 1):
+            GENERATIONS.inc(route, 'initial' if attempt == 0 else 'reask')
+            raw_response_text, result_json = yield ModelCall(attempt_prompt, task)
+
+            with Timer() as validate_timer:
+                body, error = prepared.finalize(result_json)
+            PHASE_LATENCY.observe(validate_timer.elapsed, route, 'validate')
+
+            if body is not None:
+                response_cache.set(cache_key, body)
+                return body, 200
+
+            if result_json is not None:
+                SCHEMA_FAILURES.inc(route)
+            if attempt < AI_MAX_REASKS:
+                reason = 'parse' if result_json is None else 'schema'
+                REASKS.inc(route, reason)
+                log_event(logging.WARNING, "ai_reask", route=route, reason=reason, attempt=attempt + 1)
+                attempt_prompt = build_reask_prompt(prepared.text, error)
+
+        if isinstance(error, dict):
+            log_event(logging.WARNING, "ai_response_invalid", route=route, error=error.get('error'))
+            return error, 500
+        log_event(logging.WARNING, "ai_response_invalid", route=route, error=error)
+        if raw_response_text and not result_json:
+            return {"error": error, "raw_ai_response": raw_response_text[:1000]}, 500 # Limit raw response size
+        return {"error": error, "received_structure": result_json}, 500
+
+    except InputBudgetError as e:
+        return {"error": str(e)}, e.status_code
+    except GovernorError:
+        raise
+    except Exception as e:
+        log_event(logging.ERROR, "ai_request_failed", route=route, error=str(e))
+        return {"error": f"{task.failure_message}: {str(e)}"}, 500
 
-    if not job_title:
-        print("Warning: Generating summary without job title context.")
-        
 
-    
-    prompt = f"""
-    You are an expert resume writing assistant.
-    Your task is to refine a resume summary and generate suggestions based on the provided draft and target job title.
+# --- AI tasks ---
+# Each route's model call, declared once (tasks.py): the inputs it reads, its static
+# instruction, its context template, its response schema and its post-processing.
+# Shared by the regular routes, their streaming variants and /api/analyze-resume.
 
-    Context:
-    - Target Job Title: "{job_title if job_title else 'Not Provided'}"
-    - Current Summary Draft: "{current_summary if current_summary else 'No draft provided. Please write a professional summary.'}"
+def finalize_summary_result(result_json):
+    """
+    Validates parsed summary JSON.
+    Returns (body, None) when it matches the route contract, otherwise (None, error_detail).
+    """
+    if result_json and isinstance(result_json, dict) and \
+       'refinedSummary' in result_json and isinstance(result_json['refinedSummary'], str) and \
+       'suggestions' in result_json and isinstance(result_json['suggestions'], list) and \
+       len(result_json['suggestions']) == 2 and \
+       all(isinstance(s, dict) and 'level' in s and 'text' in s for s in result_json['suggestions']):
+        return result_json, None
+
+    error_detail = "AI returned data in an unexpected format."
+    if not result_json:
+        error_detail = "AI failed to return valid JSON."
+    elif 'refinedSummary' not in result_json or 'suggestions' not in result_json:
+        error_detail = "AI response missing required fields ('refinedSummary', 'suggestions')."
+    elif not isinstance(result_json['suggestions'], list) or len(result_json['suggestions']) != 2:
+        error_detail = "AI response 'suggestions' field is not a list of two items."
+    return None, error_detail
+
+
+SUMMARY_TASK = task_registry.register(Task(
+    'generate-summary',
+    instruction="""
+    You are an expert resume writing assistant.
+    Your task is to refine a resume summary and generate suggestions based on the draft and target job title given in the Context.
 
     Instructions:
-    1. Refine the "Current Summary Draft" into a professional, concise, and impactful resume summary (2-4 sentences long). Use strong action verbs, quantify achievements where possible (even if inferring reasonable numbers/percentages based on common roles), and tailor it towards the "{job_title if job_title else 'target job'}". If no draft is provided, write a suitable summary from scratch based *only* on the job title, keeping it general if the title is broad.
+    1. Refine the "Current Summary Draft" into a professional, concise, and impactful resume summary (2-4 sentences long). Use strong action verbs, quantify achievements where possible (even if inferring reasonable numbers/percentages based on common roles), and tailor it towards the "Target Job Title". If no draft is provided, write a suitable summary from scratch based *only* on the job title, keeping it general if the title is broad.
     2. Generate exactly two alternative summaries in the 'suggestions' array:
         - One for a "Mid-Level" candidate (implying 3-7 years experience, focusing on quantifiable achievements and specific technical/leadership skills relevant to the job title).
         - One for a "Junior-Level" candidate (implying 0-2 years experience, focusing on transferable skills, enthusiasm, relevant projects/internships, and key technologies learned).
@@ -79,94 +999,76 @@ def generate_summary_route():
 
     Output Format:
     Return *only* a valid JSON object with the following structure. Do not include any other text, explanations, or markdown formatting around the JSON object itself. Ensure the JSON is strictly valid.
-    {{
+    {
       "refinedSummary": "The single refined summary text.",
       "suggestions": [
-        {{ "level": "Mid-Level", "text": "The mid-level summary text." }},
-        {{ "level": "Junior-Level", "text": "The junior-level summary text." }}
+        { "level": "Mid-Level", "text": "The mid-level summary text." },
+        { "level": "Junior-Level", "text": "The junior-level summary text." }
       ]
-    }}
+    }
+    """,
+    template="""
+    Context:
+    - Target Job Title: "{jobTitle}"
+    - Current Summary Draft: "{currentSummary}"
+    """,
+    inputs=(InputField('jobTitle', format=text_or('Not Provided'), max_tokens=AI_SHORT_FIELD_MAX_TOKENS),
+            InputField('currentSummary', format=text_or('No draft provided. Please write a professional summary.'),
+                       max_tokens=AI_TEXT_FIELD_MAX_TOKENS)),
+    finalize=lambda result_json, inputs: finalize_summary_result(result_json),
+    failure_message="An unexpected error occurred while generating the summary",
+    schema=RESPONSE_SCHEMAS['generate-summary'],
+    max_input_tokens=AI_MAX_INPUT_TOKENS,
+))
+
+
+def format_bullet_points(text, label):
     """
+    Prefixes each line with '• ' when the model ignored the bullet instruction.
+    Bullets separated by a literal backslash-n (JSON escaped twice) are split onto lines first.
+    """
+    if '\n' not in text and '\\n' in text:
+        text = text.replace('\\n', '\n')
+    if '•' in text or text.strip() == "": # Allow empty if AI couldn't generate
+        return text
 
-    try:
-        print(f"--- Sending Prompt to Gemini (Summary) ---")
-        # print(prompt) # Uncomment for debugging the exact prompt sent
-        print(f"--- End Prompt ---")
-
-        # Call the Gemini API
-        response = model.generate_content(prompt)
-
-        print(f"--- Received Response from Gemini (Summary) ---")
-        # Use response.text safely
-        raw_response_text = response.text if hasattr(response, 'text') else ''
-        print(raw_response_text)
-        print(f"--- End Response ---")
-
-        # Parse the response text
-        result_json = parse_gemini_json(raw_response_text)
-
-        # Validate the parsed JSON structure
-        if result_json and isinstance(result_json, dict) and \
-           'refinedSummary' in result_json and isinstance(result_json['refinedSummary'], str) and \
-           'suggestions' in result_json and isinstance(result_json['suggestions'], list) and \
-           len(result_json['suggestions']) == 2 and \
-           all(isinstance(s, dict) and 'level' in s and 'text' in s for s in result_json['suggestions']):
-             print("Successfully parsed Gemini response for summary.")
-             return jsonify(result_json), 200
-        else:
-             print("Error: Unexpected or invalid JSON structure received from Gemini for summary.")
-             # Provide more context in the error response
-             error_detail = "AI returned data in an unexpected format."
-             if not result_json:
-                 error_detail = "AI failed to return valid JSON."
-             elif 'refinedSummary' not in result_json or 'suggestions' not in result_json:
-                 error_detail = "AI response missing required fields ('refinedSummary', 'suggestions')."
-             elif not isinstance(result_json['suggestions'], list) or len(result_json['suggestions']) != 2:
-                 error_detail = "AI response 'suggestions' field is not a list of two items."
-
-             
-             if raw_response_text and not result_json:
-                 return jsonify({"error": error_detail, "raw_ai_response": raw_response_text[:1000]}), 500 # Limit raw response size
-             
-             return jsonify({"error": error_detail, "received_structure": result_json}), 500
-
-    except Exception as e:
-        
-        print(f"Error calling Gemini API or processing response for summary: {e}")
-        
-        return jsonify({"error": f"An unexpected error occurred while generating the summary: {str(e)}"}), 500
+    log_event(logging.WARNING, "bullets_missing_reformatting", label=label)
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    formatted = "\n".join([f"• {line}" for line in lines])
+    if not formatted and text:
+        log_event(logging.WARNING, "bullets_reformatting_empty", label=label)
+        return text
+    return formatted
 
 
-@app.route('/api/enhance-experience', methods=['POST'])
-def enhance_experience_route():
+def finalize_experience_result(result_json):
     """
-    API endpoint to enhance an experience section summary into bullet points.
-    Expects JSON: {"jobTitle": "...", "company": "...", "summary": "..."}
-    Returns JSON: {"enhancedSummary": "• Bullet point 1\\n• Bullet point 2..."}
+    Validates parsed experience JSON and normalizes the bullets.
+    Returns (body, None) on success, otherwise (None, error_detail).
     """
-    if not request.is_json:
-        return jsonify({"error": "Request must be JSON"}), 400
-
-    data = request.get_json()
-    job_title = data.get('jobTitle', '') # Job title from the experience item
-    company = data.get('company', '')
-    original_summary = data.get('summary', '')
-
-    if not original_summary:
-        return jsonify({"error": "No experience summary provided"}), 400
-
-    # Construct the prompt for the Gemini model
-    prompt = f"""
+    if result_json and isinstance(result_json, dict) and \
+       'enhancedSummary' in result_json and isinstance(result_json['enhancedSummary'], str):
+        enhanced_summary = result_json['enhancedSummary']
+        formatted_summary = format_bullet_points(enhanced_summary, 'experience')
+        if formatted_summary == enhanced_summary:
+            return result_json, None
+        return {"enhancedSummary": formatted_summary}, None
+
+    error_detail = "AI returned data in an unexpected format for experience."
+    if not result_json:
+        error_detail = "AI failed to return valid JSON for experience."
+    elif 'enhancedSummary' not in result_json:
+        error_detail = "AI response missing required 'enhancedSummary' field."
+    return None, error_detail
+
+
+EXPERIENCE_TASK = task_registry.register(Task(
+    'enhance-experience',
+    instruction="""
     You are an expert resume writing assistant specializing in crafting achievement-oriented experience bullet points.
 
-    Context:
-    - Position Title: "{job_title if job_title else 'Not Provided'}"
-    - Company: "{company if company else 'Not Provided'}"
-    - Original Summary/Bullet Points Draft (may contain newlines or existing bullets):
-    "{original_summary}"
-
     Instructions:
-    1. Rewrite the provided "Original Summary/Bullet Points Draft" into 3-5 impactful bullet points for a resume experience section. Each bullet point should start on a new line.
+    1. Rewrite the "Original Summary/Bullet Points Draft" given in the Context into 3-5 impactful bullet points for a resume experience section. Each bullet point should start on a new line.
     2. Start each bullet point *strictly* with a strong action verb (e.g., Managed, Developed, Led, Increased, Reduced, Implemented, Created, Optimized, Coordinated, Analyzed).
     3. Apply the STAR method (Situation, Task, Action, Result) where applicable to structure the points.
     4. Quantify achievements with specific metrics (numbers, percentages) whenever possible based on the original text or reasonable inference for the role (e.g., "Increased sales by 15%", "Managed a budget of $X", "Reduced processing time by Y%"). If quantification isn't possible, focus on the impact, scope, or scale of the action.
@@ -176,208 +1078,130 @@ def enhance_experience_route():
 
     Output Format:
     Return *only* a valid JSON object with the following structure. Do not include any text before or after the JSON object. Do not use markdown formatting for the JSON structure itself. The value of "enhancedSummary" must be a single string containing the bullet points separated by '\\n'.
-    {{
+    {
       "enhancedSummary": "• Rewritten bullet point 1 using past tense and action verbs.\\n• Quantified achievement where possible (e.g., Increased efficiency by 15%).\\n• Another achievement-focused bullet point applying STAR method."
-    }}
-    """
-    try:
-        print(f"--- Sending Prompt to Gemini (Experience) ---")
-        
-        print(f"--- End Prompt ---")
-
-        # Call the Gemini API
-        response = model.generate_content(prompt)
-
-        print(f"--- Received Response from Gemini (Experience) ---")
-        raw_response_text = response.text if hasattr(response, 'text') else ''
-        print(raw_response_text)
-        print(f"--- End Response ---")
-
-        # Parse the response text
-        result_json = parse_gemini_json(raw_response_text)
-
-        # Validate the parsed JSON structure
-        if result_json and isinstance(result_json, dict) and \
-           'enhancedSummary' in result_json and isinstance(result_json['enhancedSummary'], str):
-            enhanced_summary = result_json['enhancedSummary']
-            # Basic check to ensure it looks like bullet points were attempted
-            if '•' in enhanced_summary or enhanced_summary.strip() == "": # Allow empty if AI couldn't generate
-                 print("Successfully parsed Gemini response for experience.")
-                 
-                 return jsonify(result_json), 200
-            else:
-                
-                print("Warning: Gemini response for experience didn't contain bullet points as expected, attempting to format.")
-                
-                lines = [line.strip() for line in enhanced_summary.split('\n') if line.strip()]
-                formatted_summary = "\n".join([f"• {line}" for line in lines])
-                
-                if not formatted_summary and enhanced_summary:
-                    print("Warning: Formatting attempt resulted in empty string, returning original non-bulleted text.")
-                    return jsonify({"enhancedSummary": enhanced_summary}), 200
-                return jsonify({"enhancedSummary": formatted_summary}), 200
-        else:
-             print("Error: Unexpected or invalid JSON structure from Gemini for experience.")
-             error_detail = "AI returned data in an unexpected format for experience."
-             if not result_json:
-                 error_detail = "AI failed to return valid JSON for experience."
-             elif 'enhancedSummary' not in result_json:
-                 error_detail = "AI response missing required 'enhancedSummary' field."
-
-             if raw_response_text and not result_json:
-                 return jsonify({"error": error_detail, "raw_ai_response": raw_response_text[:1000]}), 500
-             return jsonify({"error": error_detail, "received_structure": result_json}), 500
-
-    except Exception as e:
-        print(f"Error calling Gemini API or processing response for experience: {e}")
-        # import traceback
-        # traceback.print_exc()
-        return jsonify({"error": f"An unexpected error occurred while enhancing experience: {str(e)}"}), 500
-
-
-@app.route('/api/enhance-project', methods=['POST'])
-def enhance_project_route():
+    }
+    """,
+    template="""
+    Context:
+    - Position Title: "{jobTitle}"
+    - Company: "{company}"
+    - Original Summary/Bullet Points Draft (may contain newlines or existing bullets):
+    "{summary}"
+    """,
+    inputs=(InputField('jobTitle', format=text_or('Not Provided'), max_tokens=AI_SHORT_FIELD_MAX_TOKENS),
+            InputField('company', format=text_or('Not Provided'), max_tokens=AI_SHORT_FIELD_MAX_TOKENS),
+            InputField('summary', max_tokens=AI_TEXT_FIELD_MAX_TOKENS)),
+    finalize=lambda result_json, inputs: finalize_experience_result(result_json),
+    failure_message="An unexpected error occurred while enhancing experience",
+    schema=RESPONSE_SCHEMAS['enhance-experience'],
+    max_input_tokens=AI_MAX_INPUT_TOKENS,
+))
+
+
+def finalize_project_result(result_json):
     """
-    API endpoint to enhance a project description into bullet points.
-    Expects JSON: {"title": "...", "tech": "...", "description": "..."}
-    Returns JSON: {"enhancedDescription": "• Bullet point 1\\n• Bullet point 2..."}
+    Validates parsed project JSON and normalizes the bullets.
+    Returns (body, None) on success, otherwise (None, error_detail).
     """
-    if not request.is_json:
-        return jsonify({"error": "Request must be JSON"}), 400
-
-    data = request.get_json()
-    title = data.get('title', '')
-    tech = data.get('tech', '') # Could be a string or list, handle appropriately
-    original_description = data.get('description', '')
-
-    if not original_description:
-        return jsonify({"error": "No project description provided"}), 400
-
-    
+    if result_json and isinstance(result_json, dict) and \
+       'enhancedDescription' in result_json and isinstance(result_json['enhancedDescription'], str):
+        enhanced_description = result_json['enhancedDescription']
+        formatted_desc = format_bullet_points(enhanced_description, 'project')
+        if formatted_desc == enhanced_description:
+            return result_json, None
+        return {"enhancedDescription": formatted_desc}, None
+
+    error_detail = "AI returned data in an unexpected format for project."
+    if not result_json:
+        error_detail = "AI failed to return valid JSON for project."
+    elif 'enhancedDescription' not in result_json:
+        error_detail = "AI response missing required 'enhancedDescription' field."
+    return None, error_detail
+
+
+def project_tech_string(tech):
+    """Normalizes the project 'tech' field, which may be a string or a list."""
     tech_str = tech
     if isinstance(tech, list):
         tech_str = ", ".join(tech)
-    tech_str = tech_str if tech_str else 'Not Specified'
+    return tech_str if tech_str else 'Not Specified'
 
 
-    # Construct the prompt for the Gemini model
-    prompt = f"""
+PROJECT_TASK = task_registry.register(Task(
+    'enhance-project',
+    instruction="""
     You are a technical writer assisting with resume project descriptions.
 
-    Context:
-    - Project Title: "{title if title else 'Unnamed Project'}"
-    - Technologies Used: "{tech_str}"
-    - Original Description Draft:
-    "{original_description}"
-
     Instructions:
-    1. Rewrite the project description into 2-4 concise bullet points for a resume. Each bullet point must start on a new line.
+    1. Rewrite the "Original Description Draft" given in the Context into 2-4 concise bullet points for a resume. Each bullet point must start on a new line.
     2. Start each bullet point *strictly* with '• '.
     3. Clearly state the project's main goal or purpose in the first bullet point.
-    4. Emphasize the key technologies mentioned ({tech_str}) and explain *how* they were applied to solve a specific problem or build key features.
+    4. Emphasize the key technologies listed under "Technologies Used" and explain *how* they were applied to solve a specific problem or build key features.
     5. Describe 1-2 significant technical challenges faced (if inferable from the draft) or highlight the most important features implemented.
     6. Mention the main outcome or result of the project (e.g., "Successfully deployed...", "Resulted in a functional web application for...", "Demonstrated skills in...").
     7. Ensure the final output text contains only the rewritten bullet points, separated by a newline character ('\\n').
 
     Output Format:
     Return *only* a valid JSON object with the following structure. Do not include any text before or after the JSON object. Do not use markdown formatting for the JSON structure itself. The value of "enhancedDescription" must be a single string.
-    {{
-      "enhancedDescription": "• Developed a [Project Type, e.g., web application] titled '{title}' using {tech_str} to achieve [State the main goal concisely].\\n• Implemented [Key Feature, e.g., user authentication] utilizing [Specific Tech] to address [Challenge/Need].\\n• Successfully deployed the project, demonstrating proficiency in [Key Skill/Technology]."
-    }}
-    """
-    try:
-        print(f"--- Sending Prompt to Gemini (Project) ---")
-        # print(prompt)
-        print(f"--- End Prompt ---")
-
-        # Call the Gemini API
-        response = model.generate_content(prompt)
-
-        print(f"--- Received Response from Gemini (Project) ---")
-        raw_response_text = response.text if hasattr(response, 'text') else ''
-        print(raw_response_text)
-        print(f"--- End Response ---")
-
-        # Parse the response text
-        result_json = parse_gemini_json(raw_response_text)
-
-        # Validate the parsed JSON structure
-        if result_json and isinstance(result_json, dict) and \
-           'enhancedDescription' in result_json and isinstance(result_json['enhancedDescription'], str):
-             enhanced_description = result_json['enhancedDescription']
-             # Basic check for bullets
-             if '•' in enhanced_description or enhanced_description.strip() == "":
-                 print("Successfully parsed Gemini response for project.")
-                 # result_json['enhancedDescription'] = result_json['enhancedDescription'].replace('\\n', '\n')
-                 return jsonify(result_json), 200
-             else:
-                 print("Warning: Gemini response for project didn't contain bullet points as expected, attempting to format.")
-                 lines = [line.strip() for line in enhanced_description.split('\n') if line.strip()]
-                 formatted_desc = "\n".join([f"• {line}" for line in lines])
-                 if not formatted_desc and enhanced_description:
-                    print("Warning: Formatting attempt resulted in empty string, returning original non-bulleted text.")
-                    return jsonify({"enhancedDescription": enhanced_description}), 200
-                 return jsonify({"enhancedDescription": formatted_desc}), 200
-        else:
-             print("Error: Unexpected or invalid JSON structure from Gemini for project.")
-             error_detail = "AI returned data in an unexpected format for project."
-             if not result_json:
-                 error_detail = "AI failed to return valid JSON for project."
-             elif 'enhancedDescription' not in result_json:
-                 error_detail = "AI response missing required 'enhancedDescription' field."
-
-             if raw_response_text and not result_json:
-                 return jsonify({"error": error_detail, "raw_ai_response": raw_response_text[:1000]}), 500
-             return jsonify({"error": error_detail, "received_structure": result_json}), 500
-
-    except Exception as e:
-        print(f"Error calling Gemini API or processing response for project: {e}")
-        # import traceback
-        # traceback.print_exc()
-        return jsonify({"error": f"An unexpected error occurred while enhancing the project: {str(e)}"}), 500
-
-
-@app.route('/api/suggest-skills', methods=['POST'])
-def suggest_skills_route():
+    {
+      "enhancedDescription": "• Developed a [Project Type, e.g., web application] titled '[Project Title]' using [Technologies Used] to achieve [State the main goal concisely].\\n• Implemented [Key Feature, e.g., user authentication] utilizing [Specific Tech] to address [Challenge/Need].\\n• Successfully deployed the project, demonstrating proficiency in [Key Skill/Technology]."
+    }
+    """,
+    template="""
+    Context:
+    - Project Title: "{title}"
+    - Technologies Used: "{tech}"
+    - Original Description Draft:
+    "{description}"
+    """,
+    inputs=(InputField('title', format=text_or('Unnamed Project'), max_tokens=AI_SHORT_FIELD_MAX_TOKENS),
+            InputField('tech', format=project_tech_string, max_tokens=AI_SHORT_FIELD_MAX_TOKENS),
+            InputField('description', max_tokens=AI_TEXT_FIELD_MAX_TOKENS)),
+    finalize=lambda result_json, inputs: finalize_project_result(result_json),
+    failure_message="An unexpected error occurred while enhancing the project",
+    schema=RESPONSE_SCHEMAS['enhance-project'],
+    max_input_tokens=AI_MAX_INPUT_TOKENS,
+))
+
+
+def finalize_skills_result(result_json, existing_skills):
     """
-    API endpoint to suggest relevant skills based on job title and existing skills.
-    Expects JSON: {"jobTitle": "...", "skills": ["skill1", "skill2", ...]}
-    Returns JSON: {"suggestedSkills": ["suggestion1", "suggestion2", ...]}
+    Validates parsed skill suggestions and drops any the user already has (case-insensitive).
+    Returns (body, None) on success, otherwise (None, error_detail).
     """
-    if not request.is_json:
-        return jsonify({"error": "Request must be JSON"}), 400
-
-    data = request.get_json()
-    job_title = data.get('jobTitle', '') # Job title from Personal section
-    existing_skills = data.get('skills', []) # Expecting a list of skill names
-
-    if not job_title:
-        return jsonify({"error": "Job title is required to suggest relevant skills"}), 400
-
-    
-    if not isinstance(existing_skills, list) or not all(isinstance(s, str) for s in existing_skills):
-         print("Warning: 'skills' field received is not a list of strings. Treating as empty.")
-         existing_skills = []
-
-
-    skills_list_str = ", ".join(existing_skills) if existing_skills else "None provided"
-
-    # Construct the prompt for the Gemini model
-    prompt = f"""
+    if result_json and isinstance(result_json, dict) and \
+       'suggestedSkills' in result_json and isinstance(result_json['suggestedSkills'], list) and \
+       all(isinstance(s, str) for s in result_json['suggestedSkills']):
+        existing_lower = {skill.lower().strip() for skill in existing_skills}
+
+        filtered_suggestions = [
+            s.strip() for s in result_json['suggestedSkills']
+            if s.strip() and s.strip().lower() not in existing_lower
+        ]
+        return {"suggestedSkills": filtered_suggestions}, None
+
+    error_detail = "AI returned data in an unexpected format for skills."
+    if not result_json:
+        error_detail = "AI failed to return valid JSON for skills."
+    elif 'suggestedSkills' not in result_json or not isinstance(result_json.get('suggestedSkills'), list):
+        error_detail = "AI response missing or invalid 'suggestedSkills' array."
+    return None, error_detail
+
+
+SKILLS_TASK = task_registry.register(Task(
+    'suggest-skills',
+    instruction="""
     You are an expert technical recruiter and resume analyst identifying key skills for job roles.
 
-    Context:
-    - Target Job Title: "{job_title}"
-    - User's Current Skill List: [{skills_list_str}]
-
     Instructions:
-    1. Based *only* on the Target Job Title "{job_title}", identify 5-7 highly relevant skills (these can be technical skills, software tools, programming languages, or essential soft skills) that are commonly expected or beneficial for this specific role.
+    1. Based *only* on the Target Job Title given in the Context, identify 5-7 highly relevant skills (these can be technical skills, software tools, programming languages, or essential soft skills) that are commonly expected or beneficial for this specific role.
     2. Ensure the suggested skills are *not* already present in the User's Current Skill List (perform a case-insensitive check). If a skill is closely related but distinct (e.g., "JavaScript" vs "React"), it can be suggested.
     3. Provide only the list of suggested skill names.
 
     Output Format:
     Return *only* a valid JSON object with the following structure. Do not include any other text, explanations, or markdown formatting around the JSON object itself. The value must be an array of strings.
-    {{
+    {
       "suggestedSkills": [
         "Relevant Skill Suggestion 1",
         "Relevant Skill Suggestion 2",
@@ -385,89 +1209,76 @@ def suggest_skills_route():
         "Relevant Skill Suggestion 4",
         "Relevant Skill Suggestion 5"
       ]
-    }}
+    }
+    """,
+    template="""
+    Context:
+    - Target Job Title: "{jobTitle}"
+    - User's Current Skill List: [{skills}]
+    """,
+    inputs=(InputField('jobTitle', max_tokens=AI_SHORT_FIELD_MAX_TOKENS),
+            InputField('skills', default=(), format=lambda skills: ", ".join(skills) if skills else "None provided",
+                       max_tokens=AI_TEXT_FIELD_MAX_TOKENS)),
+    # Suggestions the user already has are dropped here, whatever the model did with the instruction.
+    finalize=lambda result_json, inputs: finalize_skills_result(result_json, inputs['skills']),
+    failure_message="An unexpected error occurred while suggesting skills",
+    schema=RESPONSE_SCHEMAS['suggest-skills'],
+    max_input_tokens=AI_MAX_INPUT_TOKENS,
+))
+
+
+def finalize_review_result(result_json, section_name):
     """
-    try:
-        print(f"--- Sending Prompt to Gemini (Skills) ---")
-        # print(prompt)
-        print(f"--- End Prompt ---")
-
-        # Call the Gemini API
-        response = model.generate_content(prompt)
-
-        print(f"--- Received Response from Gemini (Skills) ---")
-        raw_response_text = response.text if hasattr(response, 'text') else ''
-        print(raw_response_text)
-        print(f"--- End Response ---")
-
-        # Parse the response text
-        result_json = parse_gemini_json(raw_response_text)
-
-        # Validate the structure
-        if result_json and isinstance(result_json, dict) and \
-           'suggestedSkills' in result_json and isinstance(result_json['suggestedSkills'], list) and \
-           all(isinstance(s, str) for s in result_json['suggestedSkills']):
-            print("Successfully parsed Gemini response for skill suggestions.")
-            
-            existing_lower = {skill.lower().strip() for skill in existing_skills}
-            
-            filtered_suggestions = [
-                s.strip() for s in result_json['suggestedSkills']
-                if s.strip() and s.strip().lower() not in existing_lower
-            ]
-            return jsonify({"suggestedSkills": filtered_suggestions}), 200
-        else:
-            print("Error: Unexpected or invalid JSON structure from Gemini for skill suggestions.")
-            error_detail = "AI returned data in an unexpected format for skills."
-            if not result_json:
-                error_detail = "AI failed to return valid JSON for skills."
-            elif 'suggestedSkills' not in result_json or not isinstance(result_json.get('suggestedSkills'), list):
-                 error_detail = "AI response missing or invalid 'suggestedSkills' array."
-
-            if raw_response_text and not result_json:
-                 return jsonify({"error": error_detail, "raw_ai_response": raw_response_text[:1000]}), 500
-            return jsonify({"error": error_detail, "received_structure": result_json}), 500
-
-    except Exception as e:
-        print(f"Error calling Gemini API or processing response for skill suggestions: {e}")
-        # import traceback
-        # traceback.print_exc()
-        return jsonify({"error": f"An unexpected error occurred while suggesting skills: {str(e)}"}), 500
-
-
-@app.route('/api/review-section', methods=['POST'])
-def review_section_route():
+    Validates parsed review JSON, including every suggestion item.
+    Returns (body, None) on success, otherwise (None, error_detail or error body).
     """
-    API endpoint to review a specific resume section for errors and improvements.
-    Expects JSON: {"sectionName": "...", "text": "..."}
-    Returns JSON: {"suggestions": [{"type": "...", "original": "...", "suggestion": "...", "explanation": "..."}, ...]}
+    if result_json and isinstance(result_json, dict) and \
+       'suggestions' in result_json and isinstance(result_json['suggestions'], list):
+        # Further validation: check the structure of items within the list
+        for item in result_json['suggestions']:
+            if not (isinstance(item, dict) and
+                    'type' in item and isinstance(item['type'], str) and
+                    'original' in item and isinstance(item['original'], str) and
+                    'suggestion' in item and isinstance(item['suggestion'], str) and
+                    'explanation' in item and isinstance(item['explanation'], str)):
+                log_event(logging.WARNING, "review_item_invalid", section=section_name, item=item)
+                # Return the partially valid structure, but flag the error
+                return None, {"error": f"AI returned suggestions with invalid item structure for review ({section_name}).",
+                              "received_suggestions": result_json['suggestions']}
+        return result_json, None
+
+    error_detail = f"AI returned data in an unexpected format for review ({section_name})."
+    if not result_json:
+        error_detail = f"AI failed to return valid JSON for review ({section_name})."
+    elif 'suggestions' not in result_json or not isinstance(result_json.get('suggestions'), list):
+        error_detail = f"AI response missing or invalid 'suggestions' array for review ({section_name})."
+    return None, error_detail
+
+
+# Both review tasks read the same inputs; review_section_flow() checks the whole section's budget
+# before chunking, so 'text' is only rejected here when a single chunk is still over it. Their
+# context budget is that text budget plus the section name and template around it, so the text's
+# own limit is the one a reviewer runs into, not AI_MAX_INPUT_TOKENS.
+REVIEW_INPUTS = (InputField('sectionName', default='Unknown Section', max_tokens=AI_SHORT_FIELD_MAX_TOKENS),
+                 InputField('text', max_tokens=REVIEW_MAX_INPUT_TOKENS, over_budget='reject'))
+REVIEW_TEMPLATE = """
+    Context:
+    - Resume Section Being Reviewed: "{sectionName}"
+    - Text to Review:
+    ---
+    {text}
+    ---
     """
-    if not request.is_json:
-        return jsonify({"error": "Request must be JSON"}), 400
+REVIEW_CONTEXT_MAX_TOKENS = (REVIEW_MAX_INPUT_TOKENS + AI_SHORT_FIELD_MAX_TOKENS + estimate_tokens(REVIEW_TEMPLATE)
+                             if REVIEW_MAX_INPUT_TOKENS else None)
 
-    data = request.get_json()
-    section_name = data.get('sectionName', 'Unknown Section') # e.g., "Summary", "Experience"
-    section_text = data.get('text', '')
-
-    if not section_text:
-        
-        print(f"Review requested for empty section '{section_name}'. Returning no suggestions.")
-        return jsonify({"suggestions": []}), 200
-        
-
-    # Construct the prompt for the Gemini model
-    prompt = f"""
+REVIEW_TASK = task_registry.register(Task(
+    'review-section',
+    instruction="""
     You are a meticulous proofreader and professional resume editor reviewing a specific section of a resume.
 
-    Context:
-    - Resume Section Being Reviewed: "{section_name}"
-    - Text to Review:
-    ---
-    {section_text}
-    ---
-
     Instructions:
-    1. Carefully proofread the provided "Text to Review".
+    1. Carefully proofread the "Text to Review" given in the Context.
     2. Identify specific issues and list them as suggestions. Focus on:
         - **Grammar errors:** Incorrect sentence structure, subject-verb agreement, etc.
         - **Spelling mistakes:** Typos and misspellings.
@@ -480,73 +1291,1493 @@ def review_section_route():
 
     Output Format:
     Return *only* a valid JSON object with the following structure. Do not include any other text, explanations, or markdown formatting around the JSON object itself. The value of "suggestions" must be an array of objects, or an empty array []. Each object in the array must have "type", "original", "suggestion", and "explanation" keys with string values.
-    {{
+    {
       "suggestions": [
-        {{
+        {
           "type": "Grammar" | "Spelling" | "Punctuation" | "Tense" | "Tone" | "Clarity",
           "original": "The specific phrase or sentence snippet with the issue.",
           "suggestion": "The suggested correction or a clear description of the problem (e.g., 'Inconsistent verb tense').",
           "explanation": "Brief reason for the suggestion (e.g., 'Use past tense for completed role', 'Passive voice detected, suggest active', 'Potential typo found')."
-        }}
+        }
         // ... more suggestion objects if issues are found
       ]
-    }}
+    }
+    """,
+    template=REVIEW_TEMPLATE,
+    inputs=REVIEW_INPUTS,
+    finalize=lambda result_json, inputs: finalize_review_result(result_json, inputs['sectionName']),
+    failure_message="An unexpected error occurred during section review",
+    schema=RESPONSE_SCHEMAS['review-section'],
+    max_input_tokens=REVIEW_CONTEXT_MAX_TOKENS,
+))
+
+# The hybrid-mode review: only clarity and tone, the rest is checked locally (pre_review.py).
+STYLE_REVIEW_TASK = task_registry.register(Task(
+    'review-section-style',
+    route='review-section',
+    instruction="""
+    You are a professional resume editor reviewing a specific section of a resume for clarity and tone.
+
+    Instructions:
+    1. Spelling, doubled words, verb tense and weak or passive phrasing are already checked separately. Do not report them.
+    2. Identify only these issues in the "Text to Review" given in the Context and list them as suggestions:
+        - **Clarity and Conciseness:** Sentences that are wordy, unclear, or use jargon inappropriately.
+        - **Tone:** Wording that is not professional, confident, and achievement-oriented (e.g., statements that describe duties instead of results).
+    3. For each issue found, provide the original snippet, the suggested rewrite, and a brief explanation.
+    4. If *no significant issues* are found in the provided text, return an empty "suggestions" array. Do not invent issues.
+
+    Output Format:
+    Return *only* a valid JSON object with the following structure. Do not include any other text, explanations, or markdown formatting around the JSON object itself. The value of "suggestions" must be an array of objects, or an empty array []. Each object in the array must have "type", "original", "suggestion", and "explanation" keys with string values.
+    {
+      "suggestions": [
+        {
+          "type": "Clarity" | "Tone",
+          "original": "The specific phrase or sentence snippet with the issue.",
+          "suggestion": "The suggested rewrite.",
+          "explanation": "Brief reason for the suggestion."
+        }
+      ]
+    }
+    """,
+    template=REVIEW_TEMPLATE,
+    inputs=REVIEW_INPUTS,
+    finalize=lambda result_json, inputs: finalize_review_result(result_json, inputs['sectionName']),
+    failure_message="An unexpected error occurred during section review",
+    schema=RESPONSE_SCHEMAS['review-section'],
+    max_input_tokens=REVIEW_CONTEXT_MAX_TOKENS,
+))
+
+
+def finalize_group_result(result_json, inputs):
     """
-    try:
-        print(f"--- Sending Prompt to Gemini (Review {section_name}) ---")
-        
-        print(f"--- End Prompt ---")
-
-        # Calling the Gemini API
-        response = model.generate_content(prompt)
-
-        print(f"--- Received Response from Gemini (Review {section_name}) ---")
-        raw_response_text = response.text if hasattr(response, 'text') else ''
-        print(raw_response_text)
-        print(f"--- End Response ---")
-
-        # Parse the response text
-        result_json = parse_gemini_json(raw_response_text)
-
-        # Validate the structure
-        if result_json and isinstance(result_json, dict) and \
-           'suggestions' in result_json and isinstance(result_json['suggestions'], list):
-            # Further validation: check the structure of items within the list
-            valid_suggestions = True
-            for item in result_json['suggestions']:
-                if not (isinstance(item, dict) and
-                        'type' in item and isinstance(item['type'], str) and
-                        'original' in item and isinstance(item['original'], str) and
-                        'suggestion' in item and isinstance(item['suggestion'], str) and
-                        'explanation' in item and isinstance(item['explanation'], str)):
-                    valid_suggestions = False
-                    print(f"Invalid suggestion item found: {item}")
-                    break
-
-            if valid_suggestions:
-                print(f"Successfully parsed Gemini response for review ({section_name}). Found {len(result_json['suggestions'])} suggestions.")
-                return jsonify(result_json), 200
-            else:
-                print(f"Error: Invalid structure within the 'suggestions' array for review ({section_name}).")
-                # Return the partially valid structure if possible, but flag the error
-                return jsonify({"error": f"AI returned suggestions with invalid item structure for review ({section_name}).", "received_suggestions": result_json['suggestions']}), 500
+    Post-processing of the grouped /api/analyze-resume tasks: maps each entry's answer to its id.
+    Each answer is validated separately, with the individual route's finalize function.
+    Returns ({id: answer}, None), or (None, error_detail) when there is no entries list at all.
+    """
+    if not isinstance(result_json, dict) or not isinstance(result_json.get('entries'), list):
+        return None, "AI response missing required 'entries' array."
+    answers = {}
+    for item in result_json['entries']:
+        if isinstance(item, dict) and 'id' in item:
+            answers[str(item['id'])] = {key: value for key, value in item.items() if key != 'id'}
+    return answers, None
+
+
+def entries_json(entries):
+    return json.dumps(entries, indent=2, ensure_ascii=False)
+
+
+EXPERIENCE_GROUP_TASK = task_registry.register(Task(
+    'analyze-experience',
+    instruction="""
+    You are an expert resume writing assistant specializing in crafting achievement-oriented experience bullet points.
+    The Context lists experience entries of one resume, each with an "id", its position title, company and the original summary/bullet points draft.
+
+    Instructions (apply to every entry independently):
+    1. Rewrite the entry's "draft" into 3-5 impactful bullet points for a resume experience section. Each bullet point should start on a new line.
+    2. Start each bullet point *strictly* with a strong action verb (e.g., Managed, Developed, Led, Increased, Reduced, Implemented, Created, Optimized, Coordinated, Analyzed).
+    3. Apply the STAR method (Situation, Task, Action, Result) where applicable to structure the points.
+    4. Quantify achievements with specific metrics (numbers, percentages) whenever possible based on the draft or reasonable inference for the role. If quantification isn't possible, focus on the impact, scope, or scale of the action.
+    5. Ensure all points describing completed tasks are in the simple past tense.
+    6. Maintain a professional and concise tone. Focus on accomplishments rather than just listing duties. Do not move details between entries.
+    7. Each rewritten text contains only the bullet points, each starting with '• ' and separated by a newline character ('\\n').
+
+    Output Format:
+    Return *only* a valid JSON object with the following structure, with exactly one element per input entry and its "id" copied unchanged. Do not include any text before or after the JSON object. Do not use markdown formatting for the JSON structure itself.
+    {
+      "entries": [
+        { "id": "1", "enhancedSummary": "• Rewritten bullet point 1.\\n• Quantified achievement (e.g., Increased efficiency by 15%)." }
+      ]
+    }
+    """,
+    template="""
+    Context:
+    - Experience entries:
+    {entries}
+    """,
+    # Each entry is rendered (and truncated) by EXPERIENCE_TASK first; see enhance_entries_flow().
+    inputs=(InputField('entries', default=(), format=entries_json),),
+    finalize=finalize_group_result,
+    failure_message="An unexpected error occurred while enhancing experience",
+    schema=RESPONSE_SCHEMAS['analyze-experience'],
+    max_input_tokens=AI_MAX_INPUT_TOKENS,
+))
+
+PROJECT_GROUP_TASK = task_registry.register(Task(
+    'analyze-projects',
+    instruction="""
+    You are a technical writer assisting with resume project descriptions.
+    The Context lists project entries of one resume, each with an "id", its title, the technologies used and the original description draft.
+
+    Instructions (apply to every entry independently):
+    1. Rewrite the entry's "draft" into 2-4 concise bullet points for a resume. Each bullet point must start on a new line.
+    2. Start each bullet point *strictly* with '• '.
+    3. Clearly state the project's main goal or purpose in the first bullet point.
+    4. Emphasize the entry's technologies and explain *how* they were applied to solve a specific problem or build key features.
+    5. Describe 1-2 significant technical challenges faced (if inferable from the draft) or highlight the most important features implemented.
+    6. Mention the main outcome or result of the project (e.g., "Successfully deployed...", "Demonstrated skills in...").
+    7. Each rewritten text contains only the bullet points, separated by a newline character ('\\n'). Do not move details between entries.
 
+    Output Format:
+    Return *only* a valid JSON object with the following structure, with exactly one element per input entry and its "id" copied unchanged. Do not include any text before or after the JSON object. Do not use markdown formatting for the JSON structure itself.
+    {
+      "entries": [
+        { "id": "1", "enhancedDescription": "• Developed a web application using React to achieve [main goal].\\n• Implemented [key feature] utilizing [specific tech]." }
+      ]
+    }
+    """,
+    template="""
+    Context:
+    - Project entries:
+    {entries}
+    """,
+    inputs=(InputField('entries', default=(), format=entries_json),),
+    finalize=finalize_group_result,
+    failure_message="An unexpected error occurred while enhancing the project",
+    schema=RESPONSE_SCHEMAS['analyze-projects'],
+    max_input_tokens=AI_MAX_INPUT_TOKENS,
+))
+
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def replay_cached_events(body, bullet_fields):
+    """Re-emits a cached body as the same event sequence a live stream would produce."""
+    for key, value in body.items():
+        if key in bullet_fields and isinstance(value, str):
+            bullets = [line.strip() for line in value.split('\n') if line.strip()]
+            for index, text in enumerate(bullets):
+                yield sse_event('bullet', {"key": key, "index": index, "text": text})
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                yield sse_event('item', {"key": key, "index": index, "value": item})
         else:
-            print(f"Error: Unexpected or invalid JSON structure from Gemini for review ({section_name}).")
-            error_detail = f"AI returned data in an unexpected format for review ({section_name})."
-            if not result_json:
-                 error_detail = f"AI failed to return valid JSON for review ({section_name})."
-            elif 'suggestions' not in result_json or not isinstance(result_json.get('suggestions'), list):
-                 error_detail = f"AI response missing or invalid 'suggestions' array for review ({section_name})."
+            yield sse_event('field', {"key": key, "value": value})
+    yield sse_event('done', body)
 
-            if raw_response_text and not result_json:
-                 return jsonify({"error": error_detail, "raw_ai_response": raw_response_text[:1000]}), 500
-            return jsonify({"error": error_detail, "received_structure": result_json}), 500
 
+def stream_gemini_events(prepared, label, cache_key, bullet_fields=(), scope=None):
+    """
+    Streams the Gemini generation of a prepared task prompt (prepare_task) as Server-Sent Events.
+
+    Emits 'field' for each completed top-level value, 'item' for each completed
+    array element and 'bullet' for each completed line of a bullet field. The
+    final 'done' event carries the same validated JSON the non-streaming route
+    returns; failures end the stream with an 'error' event instead. With a
+    RequestScope, the stream is bounded by the request's deadline too and queued as
+    its tenant, whose quota the route has already charged (charge_tenant_tokens).
+    """
+    task = prepared.task
+    route = task.route
+    tenant = scope.tenant if scope is not None else None
+    parser = IncrementalJSONParser(bullet_fields=bullet_fields)
+    chunks = []
+    usage_chunk = None
+    try:
+        log_event(logging.INFO, "gemini_stream_started", route=route)
+        # The governor slot is held for the whole stream; a stream cannot be retried once it has started.
+        estimated_tokens = prepared.tokens
+        model_name = choose_model(route, estimated_tokens)
+        deadline = call_deadline(route, scope)
+        with Timer() as gemini_timer, gemini_governor.slot(estimated_tokens, deadline,
+                                                            scope.cancelled if scope is not None else None,
+                                                            **fair_share(tenant)):
+            response = llm_backend.generate(prepared.text, route=route, stream=True, timeout=remaining_timeout(deadline),
+                                            response_schema=response_schema_for(task), model_name=model_name,
+                                            system_instruction=task.instruction)
+            for chunk in response:
+                if getattr(chunk, 'usage_metadata', None) is not None:
+                    usage_chunk = chunk
+                chunk_text = chunk.text if hasattr(chunk, 'text') else ''
+                if not chunk_text:
+                    continue
+                chunks.append(chunk_text)
+                for event in parser.feed(chunk_text):
+                    if event['type'] == 'field':
+                        # Arrays and bullet fields were already streamed piece by piece.
+                        if event['key'] in bullet_fields or isinstance(event['value'], list):
+                            continue
+                        yield sse_event('field', {"key": event['key'], "value": event['value']})
+                    elif event['type'] == 'item':
+                        yield sse_event('item', {"key": event['key'], "index": event['index'], "value": event['value']})
+                    else:
+                        yield sse_event('bullet', {"key": event['key'], "index": event['index'], "text": event['text']})
+        PHASE_LATENCY.observe(gemini_timer.elapsed, route, 'gemini')
+        record_tenant_tokens(tenant, estimated_tokens, record_token_usage(route, usage_chunk))
+
+        raw_response_text = "".join(chunks)
+        log_payload(logging.INFO, "gemini_stream_finished", raw_response_text, route=route,
+                    seconds=round(gemini_timer.elapsed, 3), chars=len(raw_response_text))
+        with Timer() as parse_timer:
+            result_json = parse_gemini_json(raw_response_text, route)
+        PHASE_LATENCY.observe(parse_timer.elapsed, route, 'parse')
+        if result_json is None:
+            PARSE_FAILURES.inc(route)
+
+        with Timer() as validate_timer:
+            body, error_detail = prepared.finalize(result_json)
+        PHASE_LATENCY.observe(validate_timer.elapsed, route, 'validate')
+        if error_detail:
+            if result_json is not None:
+                SCHEMA_FAILURES.inc(route)
+            log_event(logging.WARNING, "ai_response_invalid", route=route, error=error_detail, stream=True)
+            yield sse_event('error', {"error": error_detail, "raw_ai_response": raw_response_text[:1000]})
+            return
+        response_cache.set(cache_key, body)
+        yield sse_event('done', body)
+
+    except GovernorError as e:
+        log_event(logging.WARNING, "governor_rejected", route=route, error=str(e), stream=True)
+        yield sse_event('error', {"error": str(e), "retryAfter": e.retry_after})
     except Exception as e:
-        print(f"Error calling Gemini API or processing response for review ({section_name}): {e}")
-        
-        return jsonify({"error": f"An unexpected error occurred during section review: {str(e)}"}), 500
+        log_event(logging.ERROR, "gemini_stream_failed", route=route, error=str(e))
+        yield sse_event('error', {"error": f"An unexpected error occurred while streaming the {label}: {str(e)}"})
+
+
+def sse_response(events, scope=None):
+    """
+    Wraps an event generator in a streaming text/event-stream response. When the client
+    closes the stream early, the server closes the generator, which cancels scope.
+    """
+    if scope is not None:
+        events = scoped_events(events, scope)
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def scoped_events(events, scope):
+    try:
+        yield from events
+    except GeneratorExit:
+        scope.cancel('disconnected')
+        raise
+    finally:
+        close_request_scope(scope)
+
+
+# --- Route services ---
+# The route logic without the HTTP layer, written as flows (see run_flow) so batch
+# requests can run it per item and the ASGI app can run it on the event loop.
+
+def generate_summary_flow(data):
+    """
+    Generates a refined summary and two alternatives.
+    Expects: {"jobTitle": "...", "currentSummary": "..."}
+    Returns (body, status_code).
+    """
+    job_title = data.get('jobTitle', '')
+    current_summary = data.get('currentSummary', '')
+
+    if not job_title:
+        log_event(logging.INFO, "summary_without_job_title")
+
+    cache_key, cached = lookup_cached_response('generate-summary', {'jobTitle': job_title, 'currentSummary': current_summary}, data)
+    if cached is not None:
+        return cached, 200
+    similar = lookup_similar_response('generate-summary', {'jobTitle': job_title}, current_summary, data)
+    if similar is not None:
+        return similar, 200
+
+    body, status = yield from ai_request_flow(SUMMARY_TASK, data, cache_key)
+    if status == 200:
+        remember_similar_response('generate-summary', {'jobTitle': job_title}, current_summary, cache_key)
+    return body, status
+
+
+def experience_entry_inputs(data):
+    """
+    Reads one experience entry ({"jobTitle", "company", "summary"}).
+    Returns (cache_inputs, fuzzy scope_inputs, text).
+    """
+    job_title = data.get('jobTitle', '') # Job title from the experience item
+    company = data.get('company', '')
+    original_summary = data.get('summary', '')
+    return ({'jobTitle': job_title, 'company': company, 'summary': original_summary},
+            {'jobTitle': job_title, 'company': company}, original_summary)
+
+
+def enhance_experience_flow(data):
+    """
+    Enhances one experience entry.
+    Expects: {"jobTitle": "...", "company": "...", "summary": "..."}
+    Returns (body, status_code).
+    """
+    cache_inputs, scope_inputs, original_summary = experience_entry_inputs(data)
+
+    if not original_summary:
+        return {"error": "No experience summary provided"}, 400
+
+    cache_key, cached = lookup_cached_response('enhance-experience', cache_inputs, data)
+    if cached is not None:
+        return cached, 200
+    similar = lookup_similar_response('enhance-experience', scope_inputs, original_summary, data)
+    if similar is not None:
+        return similar, 200
+
+    body, status = yield from ai_request_flow(EXPERIENCE_TASK, data, cache_key)
+    if status == 200:
+        remember_similar_response('enhance-experience', scope_inputs, original_summary, cache_key)
+    return body, status
+
+
+def project_entry_inputs(data):
+    """
+    Reads one project entry ({"title", "tech", "description"}).
+    Returns (cache_inputs, fuzzy scope_inputs, text).
+    """
+    title = data.get('title', '')
+    tech = data.get('tech', '') # Could be a string or list, handle appropriately
+    original_description = data.get('description', '')
+    tech_str = project_tech_string(tech)
+    return ({'title': title, 'tech': tech_str, 'description': original_description},
+            {'title': title, 'tech': tech_str}, original_description)
+
+
+def enhance_project_flow(data):
+    """
+    Enhances one project entry.
+    Expects: {"title": "...", "tech": "...", "description": "..."}
+    Returns (body, status_code).
+    """
+    cache_inputs, scope_inputs, original_description = project_entry_inputs(data)
+
+    if not original_description:
+        return {"error": "No project description provided"}, 400
+
+    cache_key, cached = lookup_cached_response('enhance-project', cache_inputs, data)
+    if cached is not None:
+        return cached, 200
+    similar = lookup_similar_response('enhance-project', scope_inputs, original_description, data)
+    if similar is not None:
+        return similar, 200
+
+    body, status = yield from ai_request_flow(PROJECT_TASK, data, cache_key)
+    if status == 200:
+        remember_similar_response('enhance-project', scope_inputs, original_description, cache_key)
+    return body, status
+
+
+def suggest_skills_flow(data):
+    """
+    Suggests skills for a job title that the user does not already list.
+    Expects: {"jobTitle": "...", "skills": ["skill1", "skill2", ...]}
+    Returns (body, status_code).
+    """
+    job_title = data.get('jobTitle', '') # Job title from Personal section
+    existing_skills = data.get('skills', []) # Expecting a list of skill names
+
+    if not job_title:
+        return {"error": "Job title is required to suggest relevant skills"}, 400
+
+    if not isinstance(existing_skills, list) or not all(isinstance(s, str) for s in existing_skills):
+        log_event(logging.WARNING, "skills_field_invalid")
+        existing_skills = []
+
+    index_consulted = skill_index is not None and not cache_bypass_requested(data)
+    if index_consulted:
+        with Timer() as index_timer:
+            suggestions, confidence = skill_index.get().suggest(job_title, existing_skills, min_confidence=SKILL_INDEX_MIN_CONFIDENCE)
+        PHASE_LATENCY.observe(index_timer.elapsed, 'suggest-skills', 'index')
+        SKILL_INDEX_LOOKUPS.inc('hit' if suggestions else 'miss')
+        if suggestions:
+            return {"suggestedSkills": suggestions}, 200
+        log_event(logging.INFO, "skill_index_miss", job_title=job_title, confidence=round(confidence, 3))
+
+    # A title the index is going to learn is asked about without the user's skills: the learned entry answers
+    # every later user, so it must not lack the skills this one lists. They are dropped from this answer below.
+    learning = index_consulted and SKILL_INDEX_WRITE_BACK
+    asked_skills = [] if learning else existing_skills
+    # Skill order does not change the answer, so it should not change the cache key either.
+    normalized_skills = sorted({skill.lower().strip() for skill in asked_skills})
+    cache_key, body = lookup_cached_response('suggest-skills', {'jobTitle': job_title, 'skills': normalized_skills}, data)
+    if body is None:
+        body, status = yield from ai_request_flow(SKILLS_TASK, {'jobTitle': job_title, 'skills': asked_skills}, cache_key)
+        if status != 200:
+            return body, status
+        if learning:
+            skill_index.get().add(job_title, body['suggestedSkills'])
+    if learning:
+        body, _ = finalize_skills_result(body, existing_skills)
+    return body, 200
+
+
+def review_section_flow(data):
+    """
+    Reviews one resume section for errors and improvements.
+    Expects: {"sectionName": "...", "text": "...", "reviewMode": "llm" | "hybrid" | "local" (optional)}
+    Returns (body, status_code).
+    """
+    section_name = data.get('sectionName', 'Unknown Section') # e.g., "Summary", "Experience"
+    section_text = data.get('text', '')
+
+    if not section_text:
+        log_event(logging.INFO, "review_empty_section", section=section_name)
+        return {"suggestions": []}, 200
+
+    review_mode = data.get('reviewMode') or REVIEW_MODE
+    if review_mode not in REVIEW_MODES:
+        return {"error": f"Unknown reviewMode '{review_mode}'. Expected one of: {', '.join(REVIEW_MODES)}."}, 400
+
+    local_findings = []
+    if review_mode != 'llm':
+        with Timer() as local_timer:
+            local_findings = pre_reviewer.get().analyze(section_text)
+        PHASE_LATENCY.observe(local_timer.elapsed, 'review-section', 'local')
+        for _, suggestion in local_findings:
+            LOCAL_REVIEW_FINDINGS.inc(suggestion['type'])
+    if review_mode == 'local':
+        return {"suggestions": merge_review_suggestions(section_text, local_review_results(local_findings))}, 200
+
+    input_tokens = estimate_tokens(section_text)
+    if REVIEW_MAX_INPUT_TOKENS and input_tokens > REVIEW_MAX_INPUT_TOKENS:
+        return {"error": f"Section is too long to review (about {input_tokens} tokens, limit {REVIEW_MAX_INPUT_TOKENS}). "
+                         "Please shorten it or review the entries separately."}, 413
+
+    chunks = split_review_text(section_text, REVIEW_CHUNK_TOKENS)
+    if len(chunks) == 1 and review_mode == 'llm':
+        return (yield from review_chunk_flow(section_name, section_text, data, review_mode))
+    return (yield from chunked_review_flow(section_name, section_text, chunks, data, review_mode, local_findings))
+
+
+def local_review_results(local_findings):
+    """Shapes pre-review findings as merge input, one entry per finding so each keeps its exact position."""
+    return [(position, [suggestion]) for position, suggestion in local_findings]
+
+
+def review_chunk_flow(section_name, chunk_text, data, review_mode='llm'):
+    """Reviews one chunk (or a whole short section). Chunks are cached like standalone reviews."""
+    inputs = {'sectionName': section_name, 'text': chunk_text}
+    if review_mode == 'hybrid':
+        inputs['reviewMode'] = review_mode
+    cache_key, cached = lookup_cached_response('review-section', inputs, data)
+    if cached is not None:
+        return cached, 200
+
+    task = STYLE_REVIEW_TASK if review_mode == 'hybrid' else REVIEW_TASK
+    return (yield from ai_request_flow(task, {'sectionName': section_name, 'text': chunk_text}, cache_key))
+
+
+def chunked_review_flow(section_name, section_text, chunks, data, review_mode, local_findings):
+    """
+    Map-reduce review of a section: chunks are reviewed in parallel and their suggestions
+    merged in document order with the local pre-review findings. Fails as a whole if any
+    chunk fails, so a partial review is never presented as complete.
+    """
+    if len(chunks) == 1:
+        results = [(yield from review_chunk_flow(section_name, section_text, data, review_mode))]
+    else:
+        log_event(logging.INFO, "review_chunked", section=section_name, chunks=len(chunks))
+        # Worker threads have no request context, so resolve the Cache-Control header here.
+        chunk_data = dict(data, skipCache=cache_bypass_requested(data))
+        results = yield [review_chunk_flow(section_name, chunk_text, chunk_data, review_mode)
+                         for _, chunk_text in chunks]
+
+    # Local findings go first so they win ties against an overlapping LLM suggestion.
+    chunk_results = local_review_results(local_findings)
+    for (offset, _), (body, status) in zip(chunks, results):
+        if status != 200:
+            return body, status
+        chunk_results.append((offset, body['suggestions']))
+
+    return {"suggestions": merge_review_suggestions(section_text, chunk_results)}, 200
+
+
+def status_result(body, status):
+    """Shapes one item of a multi-part response: {"status": 200, "result": {...}} or the error body plus "status"."""
+    if status == 200:
+        return {"status": status, "result": body}
+    return dict(body, status=status)
+
+
+def collect_results(named_results):
+    """Builds {"results": {name: status_result}, "succeeded": n, "failed": m} from (name, (body, status)) pairs."""
+    results = {}
+    succeeded = 0
+    for name, (body, status) in named_results:
+        results[name] = status_result(body, status)
+        succeeded += status == 200
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+
+# --- Whole-resume analysis ---
+# /api/analyze-resume runs a fixed set of sections in parallel: summary, experience,
+# projects, skills and review. Each section reuses its individual route's flow or,
+# for the entry lists, one grouped call whose answer is validated entry by entry with
+# the individual route's finalize function.
+
+# group_entry(group_id, values) shapes one entry of the grouped prompt from the values the individual
+# task rendered for it, so grouped entries get the same placeholders and truncation as single ones.
+EntryKind = namedtuple('EntryKind', ['entry_inputs', 'task', 'group_task', 'group_entry', 'finalize'])
+
+ENTRY_KINDS = {
+    'experience': EntryKind(experience_entry_inputs, EXPERIENCE_TASK, EXPERIENCE_GROUP_TASK,
+                            lambda group_id, values: {"id": group_id, "positionTitle": values['jobTitle'],
+                                                      "company": values['company'], "draft": values['summary']},
+                            finalize_experience_result),
+    'projects': EntryKind(project_entry_inputs, PROJECT_TASK, PROJECT_GROUP_TASK,
+                          lambda group_id, values: {"id": group_id, "projectTitle": values['title'],
+                                                    "technologies": values['tech'], "draft": values['description']},
+                          finalize_project_result),
+}
+
+ANALYSIS_SECTIONS = ('summary', 'experience', 'projects', 'skills', 'review')
+
+
+def enhance_entries_flow(kind, entries, data):
+    """
+    Enhances every entry of one resume section in as few model calls as possible.
+    entries: list of (entry_id, payload), payload being the individual route's request body.
+    Entries found in the response cache (exactly or as a near-duplicate) are answered from it.
+    The rest share one grouped prompt; each entry of its answer is validated with the individual
+    route's finalize function and cached under the individual route's key, so /api/enhance-*
+    reuses it. Entries the grouped answer leaves out or gets wrong are retried in parallel
+    with the individual prompt.
+    Returns (body, status_code), the body shaped like /api/enhance-batch's.
+    """
+    route, group_route = kind.task.route, kind.group_task.route
+    answered = {}
+    pending = []
+    for entry_id, payload in entries:
+        cache_inputs, scope_inputs, text = kind.entry_inputs(payload)
+        cache_key, cached = lookup_cached_response(route, cache_inputs, data)
+        if cached is None:
+            cached = lookup_similar_response(route, scope_inputs, text, data)
+        if cached is not None:
+            answered[entry_id] = (cached, 200)
+            continue
+        try:
+            values = kind.task.prepare(payload).values
+        except InputBudgetError as e:
+            INPUT_REJECTIONS.inc(kind.task.name)
+            answered[entry_id] = ({"error": str(e)}, e.status_code)
+            continue
+        pending.append((entry_id, cache_key, scope_inputs, text, payload, values))
+
+    retry = pending
+    if len(pending) > 1:
+        # The model sees short positional ids instead of the client's (often long) entry ids.
+        group_ids = [str(position + 1) for position in range(len(pending))]
+        GENERATIONS.inc(group_route, 'initial')
+        try:
+            prepared = prepare_task(kind.group_task, {'entries': [kind.group_entry(group_id, entry[5])
+                                                                  for group_id, entry in zip(group_ids, pending)]})
+            _, result_json = yield ModelCall(prepared.text, kind.group_task)
+            answers = prepared.finalize(result_json)[0] or {}
+        except GovernorError:
+            raise
+        except Exception as e:
+            log_event(logging.WARNING, "ai_group_request_failed", route=group_route, error=str(e))
+            result_json, answers = None, {}
+
+        retry = []
+        with Timer() as validate_timer:
+            for group_id, entry in zip(group_ids, pending):
+                entry_id, cache_key, scope_inputs, text = entry[:4]
+                body, _ = kind.finalize(answers.get(group_id))
+                if body is None:
+                    retry.append(entry)
+                    continue
+                response_cache.set(cache_key, body)
+                remember_similar_response(route, scope_inputs, text, cache_key)
+                answered[entry_id] = (body, 200)
+        PHASE_LATENCY.observe(validate_timer.elapsed, group_route, 'validate')
+        if retry:
+            if result_json is not None:
+                SCHEMA_FAILURES.inc(group_route)
+            log_event(logging.WARNING, "ai_group_entries_retried", route=group_route,
+                      retried=len(retry), entries=len(pending))
+
+    if retry:
+        results = yield [ai_request_flow(kind.task, payload, cache_key) for _, cache_key, _, _, payload, _ in retry]
+        for (entry_id, cache_key, scope_inputs, text, _, _), (body, status) in zip(retry, results):
+            if status == 200:
+                remember_similar_response(route, scope_inputs, text, cache_key)
+            answered[entry_id] = (body, status)
+
+    return collect_results((entry_id, answered[entry_id]) for entry_id, _ in entries), 200
+
+
+def guarded_section_flow(section, flow):
+    """
+    Runs one analysis section and never raises, so one failing section cannot fail the others.
+    A cancelled request is the exception: nobody is left to read the other sections either.
+    """
+    try:
+        return (yield from flow)
+    except RequestCancelledError:
+        raise
+    except GovernorError as e:
+        return {"error": str(e), "retryAfter": e.retry_after}, e.status_code
+    except Exception as e:
+        log_event(logging.ERROR, "analysis_section_failed", section=section, error=str(e))
+        return {"error": f"An unexpected error occurred while analyzing this section: {str(e)}"}, 500
+
+
+def skill_names(skills):
+    """Skill names from ResumeContext's skills list, whose items are {"name": ...} objects or plain strings."""
+    names = []
+    for skill in skills if isinstance(skills, list) else []:
+        name = skill.get('name', '') if isinstance(skill, dict) else skill
+        if isinstance(name, str) and name.strip():
+            names.append(name.strip())
+    return names
+
+
+def resume_review_text(resume_data, experience, projects):
+    """The resume text reviewed by the 'review' section, laid out like the ReviewForm's per-section texts."""
+    parts = []
+    summary = resume_data.get('summary') or ''
+    if isinstance(summary, str) and summary.strip():
+        parts.append(f"Summary:\n{summary}")
+    if experience:
+        parts.append("Experience:\n" + '\n\n---\n\n'.join(
+            f"Role: {payload['jobTitle'] or 'Untitled'}\n{payload['summary']}" for _, payload in experience))
+    if projects:
+        parts.append("Projects:\n" + '\n\n---\n\n'.join(
+            f"Project: {payload['title'] or 'Untitled'}\n{payload['description']}" for _, payload in projects))
+    return '\n\n'.join(parts)
+
+
+def resume_analysis_sections(data):
+    """
+    Splits an /api/analyze-resume request into its independent section flows.
+    Expects: {"resumeData": {"personal": {"jobTitle": ...}, "summary": "...", "experience": [...],
+              "projects": [...], "skills": [...]}, "reviewMode": "..." (optional), "skipCache": bool (optional)}
+    Returns (sections, skipped, error): sections is a list of (name, flow) in ANALYSIS_SECTIONS order,
+    skipped the names of sections with nothing to analyze, error a message when the request is invalid.
+    """
+    resume_data = data.get('resumeData')
+    if not isinstance(resume_data, dict):
+        return None, None, "'resumeData' must be an object"
+
+    # Worker threads have no request context, so resolve the Cache-Control header here.
+    base = {'skipCache': cache_bypass_requested(data)}
+    personal = resume_data.get('personal') if isinstance(resume_data.get('personal'), dict) else {}
+    job_title = personal.get('jobTitle') or ''
+    summary = resume_data.get('summary') or ''
+
+    def entry_list(key, fields, text_field):
+        # Entries without text are blank form rows; the individual routes would reject them.
+        items = resume_data.get(key)
+        entries = []
+        for index, item in enumerate(items if isinstance(items, list) else []):
+            if isinstance(item, dict) and isinstance(item.get(text_field), str) and item[text_field].strip():
+                payload = {name: item.get(source) or '' for name, source in fields.items()}
+                entries.append((str(item.get('id', index)), dict(base, **payload)))
+        return entries
+
+    experience = entry_list('experience', {'jobTitle': 'title', 'company': 'company', 'summary': 'summary'}, 'summary')
+    projects = entry_list('projects', {'title': 'title', 'tech': 'tech', 'description': 'description'}, 'description')
+    if len(experience) + len(projects) > BATCH_MAX_ITEMS:
+        return None, None, f"Too many experience and project entries to analyze (max {BATCH_MAX_ITEMS})"
+    if len({entry_id for entry_id, _ in experience}) != len(experience) or \
+       len({entry_id for entry_id, _ in projects}) != len(projects):
+        return None, None, "Entry ids must be unique within a section"
+
+    flows = {}
+    if job_title or summary:
+        flows['summary'] = generate_summary_flow(dict(base, jobTitle=job_title, currentSummary=summary))
+    if experience:
+        flows['experience'] = enhance_entries_flow(ENTRY_KINDS['experience'], experience, base)
+    if projects:
+        flows['projects'] = enhance_entries_flow(ENTRY_KINDS['projects'], projects, base)
+    if job_title:
+        flows['skills'] = suggest_skills_flow(dict(base, jobTitle=job_title, skills=skill_names(resume_data.get('skills'))))
+    review_text = resume_review_text(resume_data, experience, projects)
+    if review_text:
+        flows['review'] = review_section_flow(dict(base, sectionName='Resume', text=review_text,
+                                                   reviewMode=data.get('reviewMode')))
+
+    sections = [(name, guarded_section_flow(name, flows[name])) for name in ANALYSIS_SECTIONS if name in flows]
+    return sections, [name for name in ANALYSIS_SECTIONS if name not in flows], None
+
+
+def analysis_body(section_results, skipped):
+    """Combined /api/analyze-resume body from (name, (body, status)) pairs."""
+    collected = collect_results(section_results)
+    return {"sections": collected["results"], "succeeded": collected["succeeded"],
+            "failed": collected["failed"], "skipped": skipped}
+
+
+def analyze_resume_flow(data):
+    """
+    Analyzes a whole resume: all sections run as parallel sub-flows.
+    Returns (body, status_code); see resume_analysis_sections for the request shape.
+    """
+    sections, skipped, error = resume_analysis_sections(data)
+    if error:
+        return {"error": error}, 400
+    log_event(logging.INFO, "analysis_started", sections=len(sections))
+    results = yield [flow for _, flow in sections]
+    return analysis_body(zip([name for name, _ in sections], results), skipped), 200
+
+
+BATCH_ITEM_FLOWS = {
+    'experience': enhance_experience_flow,
+    'project': enhance_project_flow,
+}
+
+
+def run_batch_item(item, skip_cache, scope=None):
+    """Runs one batch item and never raises, so one failure cannot fail the whole batch."""
+    item_flow = BATCH_ITEM_FLOWS.get(item.get('type'))
+    if item_flow is None:
+        return {"error": f"Unknown item type '{item.get('type')}'. Expected 'experience' or 'project'."}, 400
+    payload = dict(item)
+    if skip_cache:
+        payload['skipCache'] = True
+    try:
+        return run_flow(item_flow(payload), scope=scope)
+    except GovernorError as e:
+        return {"error": str(e), "retryAfter": e.retry_after}, e.status_code
+    except Exception as e:
+        log_event(logging.ERROR, "batch_item_failed", item_id=item.get('id'), error=str(e))
+        return {"error": f"An unexpected error occurred while processing this item: {str(e)}"}, 500
+
+
+JOB_TASK_FLOWS = {
+    'generate-summary': generate_summary_flow,
+    'enhance-experience': enhance_experience_flow,
+    'enhance-project': enhance_project_flow,
+    'suggest-skills': suggest_skills_flow,
+    'review-section': review_section_flow,
+}
+
+
+def run_job_task(route, payload, tenant_id=None):
+    """
+    Runs one queued task on the quotas of the tenant that submitted it. A governor rejection
+    (a spent tenant quota included) puts the task back in the queue instead of failing it.
+    """
+    tenant = tenant_store.get(tenant_id) if tenant_id is not None else None
+    # Jobs have no request deadline; the scope only carries the tenant, so each call keeps its route deadline.
+    scope = RequestScope(f"job:{route}", float('inf'), tenant) if tenant is not None else None
+    try:
+        body, status = run_flow(JOB_TASK_FLOWS[route](payload), scope=scope)
+    except GovernorError as e:
+        raise RetryLater(str(e), e.retry_after) from e
+    JOB_TASKS.inc(route, str(status))
+    return body, status
+
+
+def interactive_requests_waiting():
+    """True while requests are queued for an upstream slot; job workers pause so those go first."""
+    return gemini_governor.stats()['queued'] > 0
+
+
+def validate_job_tasks(tasks):
+    """Returns (normalized tasks, None) or (None, error message) for the 'tasks' list of a job."""
+    if not isinstance(tasks, list) or not tasks or not all(isinstance(task, dict) for task in tasks):
+        return None, "'tasks' must be a non-empty list of objects"
+    if len(tasks) > JOBS_MAX_TASKS:
+        return None, f"Too many tasks in job (max {JOBS_MAX_TASKS})"
+    normalized = []
+    for index, task in enumerate(tasks):
+        route = task.get('route')
+        if route not in JOB_TASK_FLOWS:
+            return None, f"Unknown route '{route}' in task {index}. Expected one of: {', '.join(JOB_TASK_FLOWS)}."
+        if not isinstance(task.get('payload'), dict):
+            return None, f"Task {index} needs a 'payload' object with the route's request body"
+        normalized.append({"id": str(task.get('id', index)), "route": route, "payload": task['payload']})
+    if len({task['id'] for task in normalized}) != len(normalized):
+        return None, "Task ids must be unique within a job"
+    return normalized, None
+
+
+# --- Startup, warm-up and readiness ---
+
+WARMUP_LEVELS = ('none', 'local', 'client', 'upstream')
+process_started = time.time()
+warmup_state = {"status": "skipped", "level": "none", "seconds": None, "error": None}
+upstream_probe = {"reachable": None, "checkedAt": None, "error": None}
+upstream_probe_lock = threading.Lock()
+
+
+def warm_up(level):
+    """
+    Builds what the first request would otherwise pay for. 'local' loads the local indexes,
+    'client' also builds the LLM client, 'upstream' also checks that the upstream answers.
+    """
+    warmup_state.update(status="running", level=level, error=None)
+    try:
+        with Timer() as warmup_timer:
+            if level in ('local', 'client', 'upstream'):
+                pre_reviewer.get()
+                if skill_index is not None:
+                    skill_index.get()
+            if level in ('client', 'upstream'):
+                llm_backend.get()
+            if level == 'upstream':
+                probe_upstream(max_age=0)
+        warmup_state.update(status="done", seconds=round(warmup_timer.elapsed, 3))
+        log_event(logging.INFO, "warmup_done", warmup_level=level, seconds=round(warmup_timer.elapsed, 3))
+    except Exception as e:
+        warmup_state.update(status="failed", error=str(e))
+        log_event(logging.ERROR, "warmup_failed", warmup_level=level, error=str(e))
+
+
+def start_warm_up(level, blocking):
+    """Runs the warm-up inline or on a background thread, so the server can accept connections meanwhile."""
+    if level == 'none':
+        return
+    if blocking:
+        warm_up(level)
+    else:
+        warmup_state.update(status="running", level=level)
+        threading.Thread(target=warm_up, args=(level,), name="warmup", daemon=True).start()
+
+
+def probe_upstream(max_age=READY_PROBE_INTERVAL):
+    """Pings the LLM backend unless the last result is younger than max_age seconds. Returns upstream_probe."""
+    with upstream_probe_lock:
+        checked_at = upstream_probe["checkedAt"]
+        if checked_at is not None and time.time() - checked_at < max_age:
+            return upstream_probe
+        try:
+            llm_backend.ping(timeout=min(GEMINI_TIMEOUT_SECONDS, 5))
+            upstream_probe.update(reachable=True, error=None)
+        except Exception as e:
+            upstream_probe.update(reachable=False, error=str(e))
+        upstream_probe["checkedAt"] = time.time()
+        return upstream_probe
+
+
+def health_status():
+    """Liveness: the process is up. Reports queue depth and the last known upstream state without probing."""
+    governor_stats = gemini_governor.stats()
+    return {
+        "status": "ok",
+        "pid": os.getpid(),
+        "uptimeSeconds": round(time.time() - process_started, 1),
+        "warmup": warmup_state["status"],
+        "active": governor_stats["active"],
+        "queueDepth": governor_stats["queued"],
+        "circuitState": governor_stats["circuitState"],
+        "upstreamReachable": upstream_probe["reachable"],
+    }
+
+
+def readiness_status():
+    """
+    Readiness: whether this process should get traffic. Not ready while the warm-up is running,
+    when the LLM client cannot be built (e.g. a missing API key), when the upstream is unreachable
+    or the circuit breaker is open, or when the governor's wait queue is full.
+    Returns (body, status_code).
+    """
+    governor_stats = gemini_governor.stats()
+    reasons = []
+    if warmup_state["status"] == "running":
+        reasons.append("warm-up in progress")
+    try:
+        llm_backend.get()
+        client = "ok"
+    except Exception as e:
+        client = "error"
+        reasons.append(f"LLM client unavailable: {e}")
+    if client == "ok" and READY_PROBE_INTERVAL > 0:
+        probe = probe_upstream()
+        if not probe["reachable"]:
+            reasons.append(f"upstream unreachable: {probe['error']}")
+    if governor_stats["circuitState"] == "open":
+        reasons.append("circuit breaker open")
+    if governor_stats["queued"] >= gemini_governor.max_queue:
+        reasons.append("upstream queue full")
+
+    body = {
+        "ready": not reasons,
+        "reasons": reasons,
+        "warmup": dict(warmup_state),
+        "llmClient": client,
+        "upstreamReachable": upstream_probe["reachable"],
+        "circuitState": governor_stats["circuitState"],
+        "active": governor_stats["active"],
+        "queueDepth": governor_stats["queued"],
+        "maxQueue": gemini_governor.max_queue,
+    }
+    return body, 200 if not reasons else 503
+
+
+# --- API Routes ---
+
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@api.before_app_request
+def identify_tenant():
+    """
+    Attributes each /api/* request to a tenant by its API key (tenants.py): 401 for an unknown key,
+    or a missing one when keys are required; a POST over the tenant's request quota answers 429.
+    """
+    if not request.path.startswith('/api/') or request.method == 'OPTIONS':
+        return None
+    api_key = api_key_from_headers(request.headers)
+    if request.method == 'GET' and is_admin_key(api_key):
+        return None  # the admin key reads the stats endpoints; it is not a tenant and cannot submit work
+    tenant = tenant_store.identify(api_key)
+    if tenant is None:
+        return jsonify({"error": "A valid API key is required (X-API-Key header)."}), 401
+    g.tenant = tenant
+    if request.method == 'POST':
+        charge_tenant_request(tenant)
+    return None
+
+
+@api.after_app_request
+def record_request_metrics(response):
+    """Records latency and status of every /api/* request, by route and by tenant."""
+    started = g.get('request_started')
+    if started is not None and request.path.startswith('/api/'):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        seconds = time.perf_counter() - started
+        REQUEST_LATENCY.observe(seconds, route)
+        REQUESTS.inc(route, str(response.status_code))
+        if g.get('tenant') is not None:
+            record_tenant_request(g.tenant, seconds, response.status_code)
+    return response
+
+
+@api.after_app_request
+def compress_response(response):
+    """gzip/brotli-compresses JSON bodies of at least COMPRESS_MIN_BYTES when the client accepts it."""
+    if COMPRESS_MIN_BYTES < 0 or response.direct_passthrough or response.is_streamed or \
+       response.status_code != 200 or 'Content-Encoding' in response.headers or \
+       not response.mimetype.endswith('json'):
+        return response
+    response.vary.add('Accept-Encoding')
+    raw = response.get_data()
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None or len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    compressed = compress(raw, encoding)
+    COMPRESSED_BYTES.inc(encoding, 'raw', amount=len(raw))
+    COMPRESSED_BYTES.inc(encoding, 'sent', amount=len(compressed))
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@api.after_app_request
+def record_api_request(response):
+    """With CASSETTE_RECORD, appends each JSON API request and its (uncompressed) response to the cassette."""
+    if cassette is None or not current_app.config['CASSETTE_RECORD'] or request.method != 'POST' or \
+       not request.path.startswith('/api/') or request.path.startswith('/api/jobs') or response.is_streamed:
+        return response
+    started = g.get('request_started')
+    cassette.append({
+        "type": "request", "path": request.path, "body": request.get_json(silent=True),
+        "status": response.status_code, "response": response.get_json(silent=True),
+        "recordedAt": round(time.time(), 3),
+        "seconds": round(time.perf_counter() - started, 4) if started is not None else None,
+    })
+    return response
+
+
+@api.app_errorhandler(GovernorError)
+def governor_error_handler(error):
+    """
+    Turns governor rejections into a 503 with a Retry-After header (429 for a spent tenant quota,
+    499/504 for cancelled and timed-out requests).
+    """
+    if not isinstance(error, RequestCancelledError):
+        log_event(logging.WARNING, "governor_rejected", path=request.path, error=str(error), retry_after=error.retry_after)
+    response = jsonify({"error": str(error), "retryAfter": error.retry_after})
+    response.status_code = error.status_code
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+@api.route('/healthz', methods=['GET'])
+def healthz_route():
+    """
+    Liveness probe; always 200 while the process can serve requests.
+    Returns JSON: {"status": "ok", "uptimeSeconds": 0.0, "queueDepth": 0, "circuitState": "closed", ...}
+    """
+    return jsonify(health_status()), 200
+
+
+@api.route('/readyz', methods=['GET'])
+def readyz_route():
+    """
+    Readiness probe; 200 when this process should receive traffic, 503 with the reasons otherwise.
+    Returns JSON: {"ready": true, "reasons": [], "upstreamReachable": true, "queueDepth": 0, ...}
+    """
+    body, status = readiness_status()
+    return jsonify(body), status
+
+
+@api.route('/metrics', methods=['GET'])
+def metrics_route():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@api.route('/api/cache/stats', methods=['GET'])
+def cache_stats_route():
+    """
+    API endpoint exposing the response cache counters, with the near-duplicate index under "fuzzy" (admin key only).
+    Returns JSON: {"memoryHits": 0, "diskHits": 0, "misses": 0, "hitRate": 0.0, ..., "fuzzy": {"hits": 0, ...}}
+    """
+    body, status = stats_response('cache', api_key_from_headers(request.headers))
+    return jsonify(body), status
+
+
+@api.route('/api/singleflight/stats', methods=['GET'])
+def singleflight_stats_route():
+    """
+    API endpoint exposing request-coalescing counters (admin key only).
+    Returns JSON: {"upstreamCalls": 0, "coalescedCalls": 0, "inFlight": 0, "dedupeRatio": 0.0}
+    """
+    body, status = stats_response('singleflight', api_key_from_headers(request.headers))
+    return jsonify(body), status
+
+
+@api.route('/api/governor/stats', methods=['GET'])
+def governor_stats_route():
+    """
+    API endpoint exposing the upstream governor state (admin key only).
+    Returns JSON: {"active": 0, "queued": 0, "circuitState": "closed", "retries": 0, ...,
+                   "latency": {"<route>/<model>": {"samples": 200, "p50": 0.8, "p90": 2.1, "p99": 6.0}}}
+    """
+    body, status = stats_response('governor', api_key_from_headers(request.headers))
+    return jsonify(body), status
+
+
+@api.route('/api/tenants/stats', methods=['GET'])
+def tenant_stats_route():
+    """
+    API endpoint exposing each tenant's usage, quotas and latency, and its share of the upstream slots.
+    The admin key reads every tenant; a tenant's own key only its own entry.
+    Returns JSON: {"<tenant>": {"requests": 0, "errors": 0, "quotaRejections": 0, "modelCalls": 0, "tokens": 0,
+                                "weight": 1.0, "requestsPerMinute": 0, "tokensPerMinute": 0,
+                                "latency": {"samples": 0, "p50": null, "p90": null, "p99": null},
+                                "queue": {"calls": 0, "queued": 0, "waitSeconds": 0.0}}}
+    """
+    body, status = stats_response('tenants', api_key_from_headers(request.headers))
+    return jsonify(body), status
+
+
+@api.route('/api/generate-summary', methods=['POST'])
+def generate_summary_route():
+    """
+    API endpoint to generate a refined resume summary and suggestions.
+    Expects JSON: {"jobTitle": "...", "currentSummary": "..."}
+    Returns JSON: {"refinedSummary": "...", "suggestions": [{"level": "...", "text": "..."}, ...]}
+    An answer reused for a near-identical summary also carries "fuzzyCacheHit": true and "fuzzySimilarity".
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    body, status = run_request_flow(generate_summary_flow(request.get_json()))
+    return jsonify(body), status
+
+
+@api.route('/api/generate-summary/stream', methods=['POST'])
+def generate_summary_stream_route():
+    """
+    Streaming variant of /api/generate-summary using Server-Sent Events.
+    Expects JSON: {"jobTitle": "...", "currentSummary": "..."}
+    Streams: 'field' (refinedSummary), 'item' (each suggestion), then 'done' with the full
+    JSON the non-streaming route returns, or 'error'.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    job_title = data.get('jobTitle', '')
+    current_summary = data.get('currentSummary', '')
+
+    cache_key, cached = lookup_cached_response('generate-summary', {'jobTitle': job_title, 'currentSummary': current_summary}, data)
+    if cached is not None:
+        return sse_response(replay_cached_events(cached, ()))
+
+    try:
+        prepared = prepare_task(SUMMARY_TASK, data)
+    except InputBudgetError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    # Charged before the stream starts, so a spent quota still answers 429 with Retry-After.
+    charge_tenant_tokens(current_tenant(), prepared.tokens)
+    scope = open_request_scope(request.url_rule.rule, request.headers.get(TIMEOUT_HEADER), current_tenant())
+    return sse_response(stream_gemini_events(prepared, 'summary', cache_key, scope=scope), scope)
+
+
+@api.route('/api/enhance-experience', methods=['POST'])
+def enhance_experience_route():
+    """
+    API endpoint to enhance an experience section summary into bullet points.
+    Expects JSON: {"jobTitle": "...", "company": "...", "summary": "..."}
+    Returns JSON: {"enhancedSummary": "• Bullet point 1\\n• Bullet point 2..."}
+    An answer reused for a near-identical summary also carries "fuzzyCacheHit": true and "fuzzySimilarity".
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    body, status = run_request_flow(enhance_experience_flow(request.get_json()))
+    return jsonify(body), status
+
+
+@api.route('/api/enhance-experience/stream', methods=['POST'])
+def enhance_experience_stream_route():
+    """
+    Streaming variant of /api/enhance-experience using Server-Sent Events.
+    Expects JSON: {"jobTitle": "...", "company": "...", "summary": "..."}
+    Streams: 'bullet' for each completed bullet point, then 'done' with the full
+    JSON the non-streaming route returns, or 'error'.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    job_title = data.get('jobTitle', '')
+    company = data.get('company', '')
+    original_summary = data.get('summary', '')
+
+    if not original_summary:
+        return jsonify({"error": "No experience summary provided"}), 400
+
+    cache_key, cached = lookup_cached_response('enhance-experience', {'jobTitle': job_title, 'company': company, 'summary': original_summary}, data)
+    if cached is not None:
+        return sse_response(replay_cached_events(cached, ('enhancedSummary',)))
+
+    try:
+        prepared = prepare_task(EXPERIENCE_TASK, data)
+    except InputBudgetError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    charge_tenant_tokens(current_tenant(), prepared.tokens)
+    scope = open_request_scope(request.url_rule.rule, request.headers.get(TIMEOUT_HEADER), current_tenant())
+    return sse_response(stream_gemini_events(prepared, 'experience', cache_key, bullet_fields=('enhancedSummary',),
+                                             scope=scope), scope)
+
+
+@api.route('/api/enhance-project', methods=['POST'])
+def enhance_project_route():
+    """
+    API endpoint to enhance a project description into bullet points.
+    Expects JSON: {"title": "...", "tech": "...", "description": "..."}
+    Returns JSON: {"enhancedDescription": "• Bullet point 1\\n• Bullet point 2..."}
+    An answer reused for a near-identical description also carries "fuzzyCacheHit": true and "fuzzySimilarity".
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    body, status = run_request_flow(enhance_project_flow(request.get_json()))
+    return jsonify(body), status
+
+
+@api.route('/api/enhance-batch', methods=['POST'])
+def enhance_batch_route():
+    """
+    API endpoint to enhance many experience and project entries in one request.
+    Items run concurrently on a bounded worker pool shared by all batch requests.
+    Expects JSON: {"items": [{"id": "...", "type": "experience", "jobTitle": "...", "company": "...", "summary": "..."},
+                             {"id": "...", "type": "project", "title": "...", "tech": "...", "description": "..."}]}
+    Returns JSON: {"results": {"<id>": {"status": 200, "result": {...}} or {"status": 500, "error": "..."}},
+                   "succeeded": 1, "failed": 0}
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    items = data.get('items', [])
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({"error": "'items' must be a non-empty list of objects"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many items in batch (max {BATCH_MAX_ITEMS})"}), 400
+
+    item_ids = [str(item.get('id', index)) for index, item in enumerate(items)]
+    if len(set(item_ids)) != len(item_ids):
+        return jsonify({"error": "Item ids must be unique within a batch"}), 400
+
+    skip_cache = bool(data.get('skipCache'))
+    log_event(logging.INFO, "batch_started", items=len(items))
+    with watched_request_scope() as scope:
+        futures = [batch_executor.submit(run_batch_item, item, skip_cache, scope) for item in items]
+        results = wait_for_sub_flows(futures, scope)
+    return jsonify(collect_results(zip(item_ids, results))), 200
+
+
+@api.route('/api/analyze-resume', methods=['POST'])
+def analyze_resume_route():
+    """
+    API endpoint to analyze a whole resume in one request: refined summary, enhanced bullets
+    for every experience and project entry, skill suggestions and a review of the resume text.
+    The sections run in parallel; each is validated like its individual route.
+    Expects JSON: {"resumeData": {"personal": {"jobTitle": "..."}, "summary": "...",
+                                  "experience": [{"id": ..., "title": "...", "company": "...", "summary": "..."}],
+                                  "projects": [{"id": ..., "title": "...", "tech": "...", "description": "..."}],
+                                  "skills": [{"name": "..."}]},
+                   "reviewMode": "llm" | "hybrid" | "local" (optional)}
+    Returns JSON: {"sections": {"summary": {"status": 200, "result": {...}},
+                                "experience": {"status": 200, "result": {"results": {"<id>": {...}}, "succeeded": 1, "failed": 0}},
+                                "projects": ..., "skills": ..., "review": ...},
+                   "succeeded": 5, "failed": 0, "skipped": []}
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    body, status = run_request_flow(analyze_resume_flow(request.get_json()), executor=analysis_executor)
+    return jsonify(body), status
+
+
+@api.route('/api/analyze-resume/stream', methods=['POST'])
+def analyze_resume_stream_route():
+    """
+    Streaming variant of /api/analyze-resume using Server-Sent Events.
+    Expects the same JSON as /api/analyze-resume.
+    Streams: 'section' as each section finishes ({"section": "...", "status": 200, "result": {...}}
+    or the section's error body), then 'done' with the full JSON the non-streaming route returns.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    sections, skipped, error = resume_analysis_sections(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    scope = open_request_scope(request.url_rule.rule, request.headers.get(TIMEOUT_HEADER), current_tenant())
+
+    def events():
+        log_event(logging.INFO, "analysis_started", sections=len(sections), stream=True)
+        futures = {analysis_executor.submit(run_flow, flow, None, scope): name for name, flow in sections}
+        results = {}
+        try:
+            for future in as_completed(futures):
+                name = futures[future]
+                results[name] = future.result()
+                yield sse_event('section', dict(status_result(*results[name]), section=name))
+        finally:
+            for future in futures:
+                future.cancel()  # sections not started yet when the client went away
+        yield sse_event('done', analysis_body([(name, results[name]) for name, _ in sections], skipped))
+
+    return sse_response(events(), scope)
+
+
+@api.route('/api/jobs', methods=['POST'])
+def create_job_route():
+    """
+    API endpoint to queue route-style tasks for background processing.
+    Tasks run on a persistent queue in priority order ('interactive', 'normal', 'bulk'); bulk
+    work pauses while interactive requests are waiting for the AI service.
+    Expects JSON: {"tasks": [{"id": "...", "route": "enhance-experience", "payload": {...}}, ...],
+                   "priority": "bulk" (default) | "normal" | "interactive",
+                   "idempotencyKey": "..." (optional; an Idempotency-Key header works too)}
+    Returns JSON (202, or 200 when the idempotency key matches an earlier job):
+                  {"jobId": "...", "total": 2, "statusUrl": "/api/jobs/<jobId>"}
+    """
+    if job_store is None:
+        return jsonify({"error": "The job API is disabled on this server"}), 503
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    tasks, error = validate_job_tasks(data.get('tasks'))
+    if error:
+        return jsonify({"error": error}), 400
+    priority = data.get('priority', 'bulk')
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"Unknown priority '{priority}'. Expected one of: {', '.join(PRIORITIES)}."}), 400
+
+    tenant = current_tenant()
+    idempotency_key = data.get('idempotencyKey') or request.headers.get('Idempotency-Key')
+    if idempotency_key and tenant.id != ANONYMOUS_TENANT:
+        idempotency_key = f"{tenant.id}:{idempotency_key}"  # one tenant's key never returns another tenant's job
+    job_id, created = job_store.create_job(tasks, priority, idempotency_key, tenant.id)
+    job_workers.ensure_started()
+    job_workers.notify()
+    log_event(logging.INFO, "job_queued" if created else "job_resubmitted", job_id=job_id, tasks=len(tasks), priority=priority)
+
+    status_url = f"/api/jobs/{job_id}"
+    response = jsonify({"jobId": job_id, "total": len(tasks), "statusUrl": status_url})
+    response.status_code = 202 if created else 200
+    response.headers['Location'] = status_url
+    return response
+
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status_route(job_id):
+    """
+    API endpoint reporting a job's progress and per-task results.
+    Only the tenant that submitted the job can read it; for any other caller it is unknown (404).
+    Returns JSON: {"jobId": "...", "tenant": "...", "status": "queued" | "running" | "done", "total": 2,
+                   "completed": 1, "succeeded": 1, "failed": 0, "progress": 0.5,
+                   "tasks": [{"id": "...", "route": "...", "status": "done", "statusCode": 200, "result": {...}},
+                             {"id": "...", "route": "...", "status": "queued", "attempts": 0}]}
+    """
+    if job_store is None:
+        return jsonify({"error": "The job API is disabled on this server"}), 503
+    job_workers.ensure_started()
+    job = job_store.get_job(job_id)
+    tenant = current_tenant()
+    # Another tenant's job is answered like an unknown one; jobs queued before jobs had tenants are anonymous.
+    if job is None or tenant is None or (job['tenant'] or ANONYMOUS_TENANT) != tenant.id:
+        return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+    return jsonify(job), 200
+
+
+@api.route('/api/suggest-skills', methods=['POST'])
+def suggest_skills_route():
+    """
+    API endpoint to suggest relevant skills based on job title and existing skills.
+    Expects JSON: {"jobTitle": "...", "skills": ["skill1", "skill2", ...]} or {"inputHash": "..."}
+    Returns JSON: {"suggestedSkills": ["suggestion1", "suggestion2", ...]}
+    Answers carry an ETag and X-Input-Hash; a matching If-None-Match gets a 304.
+    """
+    return conditional_json_response('suggest-skills', suggest_skills_flow)
+
+
+@api.route('/api/review-section', methods=['POST'])
+def review_section_route():
+    """
+    API endpoint to review a specific resume section for errors and improvements.
+    Expects JSON: {"sectionName": "...", "text": "..."} or {"inputHash": "..."}
+    Returns JSON: {"suggestions": [{"type": "...", "original": "...", "suggestion": "...", "explanation": "..."}, ...]}
+    Answers carry an ETag and X-Input-Hash; a matching If-None-Match gets a 304.
+    """
+    return conditional_json_response('review-section', review_section_flow)
+
+
+def default_config():
+    """Settings create_app() reads from the environment (.env included)."""
+    return {
+        # LLM_BACKEND=stub answers locally (no API key, no quota) for load tests and offline development;
+        # LLM_BACKEND=replay answers from the cassette at CASSETTE_PATH (see cassettes.py).
+        'LLM_BACKEND': os.getenv("LLM_BACKEND", "gemini"),
+        'GEMINI_API_KEY': os.getenv("GEMINI_API_KEY"),
+        'GEMINI_MODEL': os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
+        # Optional faster/cheaper and stronger models, chosen per call by MODEL_TIER_RULES (see model_tiers.py).
+        'GEMINI_FAST_MODEL': os.getenv("GEMINI_FAST_MODEL", ""),
+        'GEMINI_STRONG_MODEL': os.getenv("GEMINI_STRONG_MODEL", ""),
+        'MODEL_TIER_RULES': os.getenv("MODEL_TIER_RULES", "suggest-skills=fast,generate-summary<700=fast,review-section>1200=strong"),
+        # Tasks' static instructions are served from a Gemini context cache living this many seconds (0 disables)
+        # once they reach GEMINI_CONTEXT_CACHE_MIN_TOKENS, the model's minimum cacheable size (see tasks.py).
+        # The API accepts nothing smaller (1.5 models need far more), and today's instructions are all under
+        # 600 tokens: explicit caching stays inert for them and they rely on implicit prefix caching.
+        'GEMINI_CONTEXT_CACHE_TTL': int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", 3600)),
+        'GEMINI_CONTEXT_CACHE_MIN_TOKENS': int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1024)),
+        'STUB_OPTIONS': {
+            'latency': float(os.getenv("STUB_LATENCY_MS", 50)) / 1000,
+            'jitter': float(os.getenv("STUB_JITTER_MS", 0)) / 1000,
+            'error_rate': float(os.getenv("STUB_ERROR_RATE", 0)),
+            'malformed_rate': float(os.getenv("STUB_MALFORMED_RATE", 0)),
+            'seed': int(os.environ["STUB_SEED"]) if os.getenv("STUB_SEED") else None,
+            'tail_rate': float(os.getenv("STUB_TAIL_RATE", 0)),
+            'tail_latency': float(os.getenv("STUB_TAIL_MS", 1000)) / 1000,
+        },
+        # Record every upstream call and API request into the cassette, to replay them offline later.
+        'CASSETTE_RECORD': os.getenv("CASSETTE_RECORD", "false").lower() == "true",
+        'CASSETTE_PATH': os.getenv("CASSETTE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 "cassettes", "recorded.jsonl")),
+        # Replayed latencies are divided by this (2 replays twice as fast, 0 without any delay).
+        'REPLAY_SPEED': float(os.getenv("REPLAY_SPEED", 1)),
+        # What to build at startup instead of on the first request: one of WARMUP_LEVELS.
+        'WARMUP': os.getenv("WARMUP", "none"),
+        # Browser origins allowed to call /api/* (comma separated), e.g. each internal frontend.
+        'CORS_ORIGINS': [origin.strip() for origin in os.getenv(
+            "CORS_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173").split(",") if origin.strip()],
+        # Block create_app() until the warm-up is done; otherwise it runs in the background and /readyz waits for it.
+        'WARMUP_BLOCKING': os.getenv("WARMUP_BLOCKING", "false").lower() == "true",
+        # Response cache: a SQLite file shared by the workers on this host (none: memory only) and its limits.
+        'CACHE_DB_PATH': os.getenv("CACHE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 "cache.sqlite3")),
+        'CACHE_MAX_ENTRIES': int(os.getenv("CACHE_MAX_ENTRIES", 512)),
+        'CACHE_MAX_BYTES': int(os.getenv("CACHE_MAX_BYTES", 8 * 1024 * 1024)),
+        'CACHE_TTL_SECONDS': int(os.getenv("CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+        'CACHE_MAX_DISK_ENTRIES': int(os.getenv("CACHE_MAX_DISK_ENTRIES", 50000)),
+        # Job-title -> skills index (none disables it) and the file Gemini's answers for unknown titles go to.
+        'SKILL_INDEX_PATH': os.getenv("SKILL_INDEX_PATH", os.path.join(data_dir, "skill_index.json")),
+        'SKILL_INDEX_LEARNED_PATH': os.getenv("SKILL_INDEX_LEARNED_PATH",
+                                              os.path.join(data_dir, "skill_index.learned.json")),
+        # Thread pools for model calls, hedges, review sub-flows, batch items and analyze-resume sections.
+        'CALL_MAX_WORKERS': int(os.getenv("CALL_MAX_WORKERS", 64)),
+        'HEDGE_MAX_WORKERS': int(os.getenv("HEDGE_MAX_WORKERS", 32)),
+        'REVIEW_MAX_WORKERS': int(os.getenv("REVIEW_MAX_WORKERS", 4)),
+        'BATCH_MAX_WORKERS': int(os.getenv("BATCH_MAX_WORKERS", 4)),
+        'ANALYZE_MAX_WORKERS': int(os.getenv("ANALYZE_MAX_WORKERS", 10)),
+        # Job queue (job_queue.py): its SQLite file (none disables the job API), leases, retries and workers.
+        'JOBS_DB_PATH': os.getenv("JOBS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3")),
+        'JOBS_LEASE_SECONDS': float(os.getenv("JOBS_LEASE_SECONDS", 600)),
+        'JOBS_MAX_ATTEMPTS': int(os.getenv("JOBS_MAX_ATTEMPTS", 3)),
+        'JOBS_RETENTION_SECONDS': float(os.getenv("JOBS_RETENTION_SECONDS", 7 * 24 * 3600)),
+        'JOBS_MAX_DEFERRALS': int(os.getenv("JOBS_MAX_DEFERRALS", 20)),
+        'JOBS_WORKERS': int(os.getenv("JOBS_WORKERS", 2)),
+        # Start the job workers in create_app(), so jobs queued before a restart resume without a new request.
+        # Off by default: importing the module must not start threads. The __main__ server starts them itself;
+        # set this for other servers (e.g. gunicorn app:app) that should resume queued jobs at startup.
+        'JOBS_WORKERS_AUTOSTART': os.getenv("JOBS_WORKERS_AUTOSTART", "false").lower() == "true",
+    }
+
+
+def create_app(config=None):
+    """
+    Builds the Flask app and the module's backend, response cache, skill index, job queue and thread pools.
+    config overrides default_config(). Nothing slow happens here unless a warm-up is configured:
+    the LLM client and local indexes are built lazily in each process, forked workers repeat the
+    warm-up for themselves, SQLite files are opened on first use and pools start threads on demand.
+    """
+    global llm_backend, model_tiering, cassette, response_cache, skill_index, job_store, job_workers
+    global call_executor, hedge_executor, review_executor, batch_executor, analysis_executor
+    settings = dict(default_config(), **(config or {}))
+    if settings['WARMUP'] not in WARMUP_LEVELS:
+        raise ValueError(f"Unknown WARMUP '{settings['WARMUP']}'. Expected one of: {', '.join(WARMUP_LEVELS)}.")
+
+    flask_app = Flask(__name__)
+    flask_app.config.update(settings)
+    CORS(flask_app, resources={r"/api/*": {"origins": settings['CORS_ORIGINS'],
+                                           "expose_headers": ["ETag", "X-Input-Hash", "Retry-After"]}})
+    flask_app.register_blueprint(api)
+
+    replaying = settings['LLM_BACKEND'] == 'replay'
+    recording = settings['CASSETTE_RECORD'] and not replaying
+    flask_app.config['CASSETTE_RECORD'] = recording
+    cassette = Cassette(settings['CASSETTE_PATH'], load=replaying) if replaying or recording else None
+    llm_backend = create_backend(settings['LLM_BACKEND'], api_key=settings['GEMINI_API_KEY'],
+                                 model_name=settings['GEMINI_MODEL'], lazy=True, cassette=cassette, record=recording,
+                                 replay_speed=settings['REPLAY_SPEED'],
+                                 context_cache_ttl=settings['GEMINI_CONTEXT_CACHE_TTL'],
+                                 context_cache_min_tokens=settings['GEMINI_CONTEXT_CACHE_MIN_TOKENS'],
+                                 **settings['STUB_OPTIONS'])
+    model_tiering = ModelTiering(parse_tier_rules(settings['MODEL_TIER_RULES']),
+                                 {'fast': settings['GEMINI_FAST_MODEL'], 'strong': settings['GEMINI_STRONG_MODEL']},
+                                 llm_backend.model_name)
+    response_cache = ResponseCache(
+        db_path=settings['CACHE_DB_PATH'] if settings['CACHE_DB_PATH'].lower() != "none" else None,
+        max_entries=settings['CACHE_MAX_ENTRIES'],
+        max_bytes=settings['CACHE_MAX_BYTES'],
+        ttl_seconds=settings['CACHE_TTL_SECONDS'],
+        max_disk_entries=settings['CACHE_MAX_DISK_ENTRIES'],
+    )
+    skill_index = None
+    if settings['SKILL_INDEX_PATH'].lower() != "none":
+        skill_index = Lazy(partial(SkillIndex, settings['SKILL_INDEX_PATH'],
+                                   learned_path=settings['SKILL_INDEX_LEARNED_PATH']), "skill-index")
+    call_executor = ThreadPoolExecutor(max_workers=settings['CALL_MAX_WORKERS'], thread_name_prefix="call")
+    hedge_executor = ThreadPoolExecutor(max_workers=settings['HEDGE_MAX_WORKERS'], thread_name_prefix="hedge")
+    review_executor = ThreadPoolExecutor(max_workers=settings['REVIEW_MAX_WORKERS'], thread_name_prefix="review")
+    batch_executor = ThreadPoolExecutor(max_workers=settings['BATCH_MAX_WORKERS'], thread_name_prefix="batch")
+    analysis_executor = ThreadPoolExecutor(max_workers=settings['ANALYZE_MAX_WORKERS'], thread_name_prefix="analyze")
+    job_store = job_workers = None
+    if settings['JOBS_DB_PATH'].lower() != "none":
+        job_store = JobStore(settings['JOBS_DB_PATH'], lease_seconds=settings['JOBS_LEASE_SECONDS'],
+                             max_attempts=settings['JOBS_MAX_ATTEMPTS'],
+                             retention_seconds=settings['JOBS_RETENTION_SECONDS'],
+                             max_deferrals=settings['JOBS_MAX_DEFERRALS'])
+        job_workers = JobWorkers(job_store, run_job_task, workers=settings['JOBS_WORKERS'],
+                                 should_yield=interactive_requests_waiting)
+    start_warm_up(settings['WARMUP'], settings['WARMUP_BLOCKING'])
+    if settings['WARMUP'] != 'none' and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=partial(start_warm_up, settings['WARMUP'], False))
+    if job_workers is not None and settings['JOBS_WORKERS_AUTOSTART']:
+        # Resume queued work left by a previous run; forked workers start their own pool on their first job request.
+        job_workers.ensure_started()
+    return flask_app
+
+
+app = create_app()
 
 
 if __name__ == '__main__':
@@ -555,5 +2786,7 @@ if __name__ == '__main__':
     server_port = int(os.environ.get('PORT', 5000))
     server_host = os.environ.get('HOST', '0.0.0.0')
 
-    print(f"Starting Flask server on {server_host}:{server_port} (Debug: {debug_mode})...")
+    log_event(logging.INFO, "server_starting", host=server_host, port=server_port, debug=debug_mode)
+    if job_workers is not None and (not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        job_workers.ensure_started()  # resume queued jobs; the reloader's watcher process serves nothing
     app.run(debug=debug_mode, host=server_host, port=server_port)
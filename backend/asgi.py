@@ -0,0 +1,200 @@
+"""
+ASGI variant of the API for high-concurrency deployments.
+
+Serves the five AI routes and /api/analyze-resume with the same request and
+response JSON as app.py, but every request is a coroutine on one event loop instead
+of a worker thread, so one process can hold hundreds of in-flight Gemini calls
+without a thread (and its stack) per call. The route logic is app.py's: the same flows are driven by run_flow_async,
+which uses the backends' generate_async, SingleFlight.do_async and the governor's
+async slots, and runs the flows' blocking parts (cache I/O, local indexes) on threads. Upstream concurrency is still bounded by GEMINI_MAX_CONCURRENCY (raise
+it for this mode) and waiting callers by GEMINI_MAX_QUEUE; ASGI_LIMIT_CONCURRENCY
+caps open connections, so memory stays bounded under overload. A request whose
+client disconnects has its task cancelled, which cancels its upstream calls. Requests are
+attributed to tenants and held to their quotas as in app.py. Set WARMUP=client
+so the first request does not build the LLM client on the event loop.
+
+The streaming and batch routes are only served by the Flask app.
+
+    uvicorn asgi:app --port 5000
+    python asgi.py
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from app import (COMPRESS_MIN_BYTES, REQUEST_LATENCY, REQUESTS, analyze_resume_flow, charge_tenant_request,
+                 close_request_scope, enhance_experience_flow, enhance_project_flow, generate_summary_flow,
+                 health_status, lookup_conditional_response, metrics, open_request_scope, readiness_status,
+                 record_tenant_request, review_section_flow, run_flow_async, stats_response, store_conditional_response,
+                 suggest_skills_flow, tenant_store)
+from app import app as flask_app
+from governor import GovernorError, RequestCancelledError
+from observability import log_event
+from request_scope import TIMEOUT_HEADER
+from tenants import api_key_from_headers
+
+
+async def read_json(request):
+    """Returns the JSON body as a dict, or None when the request is not JSON."""
+    if 'application/json' not in request.headers.get('content-type', ''):
+        return None
+    try:
+        data = json.loads(await request.body())
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    # There is no Flask request context here, so carry a Cache-Control: no-cache header as skipCache.
+    if 'no-cache' in request.headers.get('cache-control', '').lower():
+        data['skipCache'] = True
+    return data
+
+
+async def wait_for_disconnect(request):
+    """Returns once the server reports that the client went away. Call it after the body has been read."""
+    while (await request.receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def run_until_disconnect(request, flow, scope):
+    """Runs run_flow_async(flow, scope), cancelling it (RequestCancelledError) if the client disconnects first."""
+    task = asyncio.ensure_future(run_flow_async(flow, scope))
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+    if not task.done():
+        scope.cancel('disconnected')
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        raise scope.error()
+    return task.result()
+
+
+def flow_endpoint(flow, etag_route=None):
+    """
+    Builds an async endpoint that runs flow(data) and answers with its (body, status_code).
+    With etag_route, the endpoint handles ETags, If-None-Match and inputHash like app.py's route.
+    """
+    async def endpoint(request):
+        started = time.perf_counter()
+        tenant = tenant_store.identify(api_key_from_headers(request.headers))
+        if tenant is None:
+            response = JSONResponse({"error": "A valid API key is required (X-API-Key header)."}, status_code=401)
+            REQUESTS.inc(request.url.path, str(response.status_code))
+            return response
+        try:
+            charge_tenant_request(tenant)
+            data = await read_json(request)
+            etag_key, answer = None, None
+            if data is None:
+                answer = {"error": "Request must be JSON"}, 400
+            elif etag_route is not None:
+                etag_key, answer = await run_in_threadpool(lookup_conditional_response, etag_route, data,
+                                                           request.headers.get('if-none-match'))
+            if answer is None:
+                scope = open_request_scope(request.url.path, request.headers.get(TIMEOUT_HEADER), tenant)
+                try:
+                    answer = await run_until_disconnect(request, flow(data), scope)
+                finally:
+                    close_request_scope(scope)
+                if etag_route is not None:
+                    await run_in_threadpool(store_conditional_response, etag_route, etag_key, *answer)
+            body, status = answer
+            response = Response(status_code=304) if status == 304 else JSONResponse(body, status_code=status)
+            if etag_key is not None and status in (200, 304):
+                response.headers['ETag'] = f'W/"{etag_key}"'
+                response.headers['X-Input-Hash'] = etag_key
+        except GovernorError as error:
+            response = governor_error_response(request, error)
+        seconds = time.perf_counter() - started
+        REQUEST_LATENCY.observe(seconds, request.url.path)
+        REQUESTS.inc(request.url.path, str(response.status_code))
+        record_tenant_request(tenant, seconds, response.status_code)
+        return response
+    return endpoint
+
+
+def governor_error_response(request, error):
+    """Turns governor rejections into a 503 (429 for a spent tenant quota) with a Retry-After header, as the Flask app does."""
+    if not isinstance(error, RequestCancelledError):
+        log_event(logging.WARNING, "governor_rejected", path=request.url.path, error=str(error), retry_after=error.retry_after)
+    return JSONResponse({"error": str(error), "retryAfter": error.retry_after}, status_code=error.status_code,
+                        headers={'Retry-After': str(error.retry_after)})
+
+
+async def metrics_endpoint(request):
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+async def healthz_endpoint(request):
+    return JSONResponse(health_status())
+
+
+async def readyz_endpoint(request):
+    # The readiness check may build the client or ping the upstream, which blocks.
+    body, status = await run_in_threadpool(readiness_status)
+    return JSONResponse(body, status_code=status)
+
+
+def stats_endpoint(name):
+    """The app's STATS[name] endpoint: admin key only, except a tenant's own entry of the tenant stats."""
+    async def endpoint(request):
+        body, status = stats_response(name, api_key_from_headers(request.headers))
+        return JSONResponse(body, status_code=status)
+    return endpoint
+
+
+routes = [
+    Route('/api/generate-summary', flow_endpoint(generate_summary_flow), methods=['POST']),
+    Route('/api/enhance-experience', flow_endpoint(enhance_experience_flow), methods=['POST']),
+    Route('/api/enhance-project', flow_endpoint(enhance_project_flow), methods=['POST']),
+    Route('/api/suggest-skills', flow_endpoint(suggest_skills_flow, etag_route='suggest-skills'), methods=['POST']),
+    Route('/api/review-section', flow_endpoint(review_section_flow, etag_route='review-section'), methods=['POST']),
+    Route('/api/analyze-resume', flow_endpoint(analyze_resume_flow), methods=['POST']),
+    Route('/healthz', healthz_endpoint, methods=['GET']),
+    Route('/readyz', readyz_endpoint, methods=['GET']),
+    Route('/metrics', metrics_endpoint, methods=['GET']),
+    Route('/api/cache/stats', stats_endpoint('cache'), methods=['GET']),
+    Route('/api/singleflight/stats', stats_endpoint('singleflight'), methods=['GET']),
+    Route('/api/governor/stats', stats_endpoint('governor'), methods=['GET']),
+    Route('/api/tenants/stats', stats_endpoint('tenants'), methods=['GET']),
+]
+
+middleware = [
+    Middleware(CORSMiddleware, allow_origins=flask_app.config['CORS_ORIGINS'],
+               allow_methods=["*"], allow_headers=["*"], expose_headers=["ETag", "X-Input-Hash", "Retry-After"]),
+]
+if COMPRESS_MIN_BYTES >= 0:
+    # Starlette only ships gzip; brotli is applied by the Flask app alone.
+    middleware.append(Middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES))
+
+app = Starlette(routes=routes, middleware=middleware)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    server_port = int(os.environ.get('PORT', 5000))
+    server_host = os.environ.get('HOST', '0.0.0.0')
+    limit_concurrency = int(os.environ.get('ASGI_LIMIT_CONCURRENCY', 1000))
+
+    log_event(logging.INFO, "server_starting", host=server_host, port=server_port, mode="asgi",
+              limit_concurrency=limit_concurrency)
+    uvicorn.run(app, host=server_host, port=server_port, limit_concurrency=limit_concurrency,
+                log_level=os.getenv("LOG_LEVEL", "INFO").lower())
@@ -0,0 +1,310 @@
+"""
+Load-test benchmark for the five AI routes.
+
+By default the app is loaded in-process with LLM_BACKEND=stub, so the numbers
+measure our own server overhead (validation, caching, governor, JSON handling)
+on top of a known, configurable upstream latency, without quota or network.
+Pass --url to drive a running server over HTTP instead.
+
+--mode asgi drives the ASGI app (asgi.py) in-process instead of the Flask app:
+each client is an asyncio task rather than a thread. --mode both runs the sync
+and the async variant back to back with the same load and compares requests/sec.
+Throughput counts successful (200) responses only. A comparison whose two runs
+differ in error rate by more than --max-error-gap exits with status 1, since the
+faster side may only be failing faster.
+--server-threads caps the threads serving the sync app, like a WSGI server's
+worker threads; by default every client gets its own thread.
+
+Usage:
+    python benchmarks/load_test.py --concurrency 16 --requests 400
+    python benchmarks/load_test.py --stub-latency-ms 200 --stub-error-rate 0.05
+    HEDGE_ROUTES=suggest-skills python benchmarks/load_test.py --stub-tail-rate 0.05 --stub-tail-ms 800
+    python benchmarks/load_test.py --url http://localhost:5000 --routes suggest-skills review-section
+    python benchmarks/load_test.py --mode both --concurrency 256 --requests 2000 --server-threads 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROUTES = ['generate-summary', 'enhance-experience', 'enhance-project', 'suggest-skills', 'review-section']
+
+
+def build_payload(route, index, unique):
+    """Returns a realistic request body; unique payloads defeat the response cache."""
+    tag = f" (run {index})" if unique else ""
+    if route == 'generate-summary':
+        return {"jobTitle": "Software Engineer", "currentSummary": f"I build web apps and APIs with Python and React{tag}."}
+    if route == 'enhance-experience':
+        return {"jobTitle": "Backend Developer", "company": "Acme Corp",
+                "summary": f"- worked on payments service\n- helped migrate to AWS\n- was responsible for on-call{tag}"}
+    if route == 'enhance-project':
+        return {"title": "Resume Builder", "tech": ["React", "Flask", "Gemini"],
+                "description": f"A web app that helps people write resumes with AI suggestions{tag}."}
+    if route == 'suggest-skills':
+        return {"jobTitle": f"Data Analyst{tag}", "skills": ["Excel", "SQL"]}
+    return {"sectionName": "Summary", "text": f"I helped the team and was responsible for reporting{tag}."}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def make_http_sender(base_url, timeout):
+    def send(route, payload):
+        request = urllib.request.Request(
+            f"{base_url.rstrip('/')}/api/{route}",
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+    return send
+
+
+def configure_inprocess(args):
+    os.environ.setdefault('LLM_BACKEND', 'stub')
+    os.environ['STUB_LATENCY_MS'] = str(args.stub_latency_ms)
+    os.environ['STUB_JITTER_MS'] = str(args.stub_jitter_ms)
+    os.environ['STUB_ERROR_RATE'] = str(args.stub_error_rate)
+    os.environ['STUB_MALFORMED_RATE'] = str(args.stub_malformed_rate)
+    os.environ['STUB_TAIL_RATE'] = str(args.stub_tail_rate)
+    os.environ['STUB_TAIL_MS'] = str(args.stub_tail_ms)
+    os.environ.setdefault('STUB_SEED', '1234')
+    os.environ.setdefault('CACHE_DB_PATH', 'none')
+    os.environ.setdefault('JOBS_DB_PATH', 'none')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Keep the governor out of the way unless the caller configured it explicitly.
+    os.environ.setdefault('GEMINI_RPM', '0')
+    os.environ.setdefault('GEMINI_TPM', '0')
+    os.environ.setdefault('GEMINI_MAX_CONCURRENCY', str(max(args.concurrency, 1)))
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_inprocess_sender(args):
+    configure_inprocess(args)
+    import app as app_module
+
+    local = threading.local()
+
+    def send(route, payload):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app_module.app.test_client()
+        response = client.post(f'/api/{route}', json=payload)
+        return response.status_code
+    return send
+
+
+def make_asgi_sender(args):
+    """Calls the ASGI app directly (no sockets), so only the server side is measured."""
+    configure_inprocess(args)
+    import asgi
+
+    async def send(route, payload):
+        body = json.dumps(payload).encode('utf-8')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+            'scheme': 'http', 'path': f'/api/{route}', 'raw_path': f'/api/{route}'.encode(), 'root_path': '',
+            'query_string': b'', 'headers': [(b'content-type', b'application/json')],
+            'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80),
+        }
+        status = []
+        sent = False
+        finished = asyncio.Event()
+
+        async def receive():
+            # Like a server, report a disconnect only once the client has its answer; the app
+            # watches for one while the request runs and would cancel it otherwise.
+            nonlocal sent
+            if sent:
+                await finished.wait()
+                return {'type': 'http.disconnect'}
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def respond(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finished.set()
+
+        await asgi.app(scope, receive, respond)
+        return status[0] if status else 0
+    return send
+
+
+def run(args, mode=None, offset=0):
+    mode = mode or args.mode
+    routes = args.routes or ROUTES
+    jobs = [(routes[i % len(routes)], offset + i) for i in range(args.requests)]
+    if mode == 'asgi':
+        return asyncio.run(run_async(args, routes, jobs))
+    send = make_http_sender(args.url, args.timeout) if args.url else make_inprocess_sender(args)
+    samples = {route: [] for route in routes}
+    lock = threading.Lock()
+
+    def worker(job):
+        route, index = job
+        payload = build_payload(route, index, not args.repeat_payloads)
+        started = time.perf_counter()
+        try:
+            status = send(route, payload)
+        except Exception:
+            status = 0
+        elapsed = time.perf_counter() - started
+        with lock:
+            samples[route].append((elapsed, status))
+
+    for route in routes:  # warm-up: imports, first connections, lazy state
+        worker((route, -1))
+    samples = {route: [] for route in routes}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(args.concurrency, args.server_threads or args.concurrency)) as pool:
+        list(pool.map(worker, jobs))
+    wall = time.perf_counter() - started
+    return samples, wall
+
+
+async def run_async(args, routes, jobs):
+    send = make_asgi_sender(args)
+    samples = {route: [] for route in routes}
+    pending = iter(jobs)
+
+    async def client():
+        for route, index in pending:
+            payload = build_payload(route, index, not args.repeat_payloads)
+            started = time.perf_counter()
+            try:
+                status = await send(route, payload)
+            except Exception:
+                status = 0
+            samples[route].append((time.perf_counter() - started, status))
+
+    for route in routes:  # warm-up
+        await send(route, build_payload(route, -1, not args.repeat_payloads))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+    return samples, wall
+
+
+def summarize(samples, wall):
+    """Per-route and overall figures; throughputRps counts successful (200) responses only."""
+    report = {}
+    for route, values in samples.items():
+        latencies = sorted(elapsed * 1000 for elapsed, _ in values)
+        errors = sum(1 for _, status in values if status != 200)
+        report[route] = {
+            "requests": len(values),
+            "errorRate": round(errors / len(values), 4) if values else 0.0,
+            "throughputRps": round((len(values) - errors) / wall, 2) if wall else 0.0,
+            "p50Ms": round(percentile(latencies, 50), 2),
+            "p95Ms": round(percentile(latencies, 95), 2),
+            "p99Ms": round(percentile(latencies, 99), 2),
+        }
+    total = sum(len(v) for v in samples.values())
+    errors = sum(1 for values in samples.values() for _, status in values if status != 200)
+    report["_overall"] = {"requests": total, "errorRate": round(errors / total, 4) if total else 0.0,
+                          "wallSeconds": round(wall, 3),
+                          "throughputRps": round((total - errors) / wall, 2) if wall else 0.0}
+    return report
+
+
+def print_table(report, args, mode=None):
+    mode = mode or args.mode
+    target = f"HTTP {args.url}" if args.url else f"in-process {mode} app, stub ({args.stub_latency_ms} ms upstream)"
+    print(f"\nLoad test: {target}, concurrency={args.concurrency}, requests={args.requests}")
+    print(f"{'route':<20}{'reqs':>6}{'err%':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, row in report.items():
+        if route == "_overall":
+            continue
+        print(f"{route:<20}{row['requests']:>6}{row['errorRate'] * 100:>7.1f}%{row['throughputRps']:>9.1f}"
+              f"{row['p50Ms']:>10.1f}{row['p95Ms']:>10.1f}{row['p99Ms']:>10.1f}")
+    overall = report["_overall"]
+    print(f"{'total':<20}{overall['requests']:>6}{overall['errorRate'] * 100:>7.1f}%{overall['throughputRps']:>9.1f}"
+          f"   wall {overall['wallSeconds']} s")
+
+
+def print_comparison(reports, args):
+    """Prints asgi vs sync throughput; a run with errors is not comparable, so no ratio is given then."""
+    sync_rps, asgi_rps = reports['sync']["_overall"]["throughputRps"], reports['asgi']["_overall"]["throughputRps"]
+    sync_errors, asgi_errors = reports['sync']["_overall"]["errorRate"], reports['asgi']["_overall"]["errorRate"]
+    print(f"\nasgi vs sync at concurrency {args.concurrency}: {asgi_rps:.1f} vs {sync_rps:.1f} req/s", end="")
+    if sync_errors or asgi_errors:
+        print(f" (no speedup computed: {sync_errors:.1%} sync and {asgi_errors:.1%} asgi errors)")
+    else:
+        print(f" ({asgi_rps / sync_rps:.2f}x)" if sync_rps else "")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['sync', 'asgi', 'both'], default='sync',
+                        help='In-process app to drive: the Flask app, the ASGI app, or both for a comparison.')
+    parser.add_argument('--server-threads', type=int, default=0,
+                        help='Threads serving the sync app (default: one per client).')
+    parser.add_argument('--url', help='Base URL of a running server. Omit to load the app in-process with the stub backend.')
+    parser.add_argument('--routes', nargs='*', choices=ROUTES, help='Routes to drive (default: all five).')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Total requests, spread round-robin across routes.')
+    parser.add_argument('--timeout', type=float, default=120, help='Per-request timeout in HTTP mode (seconds).')
+    parser.add_argument('--repeat-payloads', action='store_true', help='Send identical payloads so the cache can answer.')
+    parser.add_argument('--stub-latency-ms', type=float, default=50)
+    parser.add_argument('--stub-jitter-ms', type=float, default=0)
+    parser.add_argument('--stub-error-rate', type=float, default=0)
+    parser.add_argument('--stub-malformed-rate', type=float, default=0)
+    parser.add_argument('--stub-tail-rate', type=float, default=0, help='Share of stub calls that take --stub-tail-ms instead.')
+    parser.add_argument('--stub-tail-ms', type=float, default=1000)
+    parser.add_argument('--max-error-gap', type=float, default=0.01,
+                        help='With --mode both, exit with status 1 when the error rates differ by more than this.')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Runs the load test and prints its report. Returns the exit status: 1 when a comparison is not comparable."""
+    args = parse_args(argv)
+    if args.url and args.mode == 'asgi':
+        args.mode = 'sync'  # over HTTP the server decides; the client side is the same
+    modes = ['sync', 'asgi'] if args.mode == 'both' and not args.url else [args.mode]
+    reports = {}
+    for run_index, mode in enumerate(modes):
+        # Each mode gets its own payloads so the second run is not answered from the cache.
+        samples, wall = run(args, mode, offset=run_index * args.requests)
+        reports[mode] = summarize(samples, wall)
+    if args.json:
+        print(json.dumps(reports if len(modes) > 1 else reports[modes[0]], indent=2))
+    else:
+        for mode, report in reports.items():
+            print_table(report, args, mode)
+        if len(modes) > 1:
+            print_comparison(reports, args)
+    if len(modes) > 1:
+        error_rates = [reports[mode]["_overall"]["errorRate"] for mode in modes]
+        if abs(error_rates[0] - error_rates[1]) > args.max_error_gap:
+            print(f"Error rates differ too much to compare ({error_rates[0]:.1%} sync, {error_rates[1]:.1%} asgi; "
+                  f"--max-error-gap {args.max_error_gap:.1%}).", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Micro-benchmark of the per-request hot path: parse_gemini_json() and each route's validation.
+
+For every response type it times parsing and validating a set of reply variants the
+model is known to produce: plain and pretty-printed JSON, markdown fences, prose
+before the JSON, bullets whose newlines were escaped twice, trailing commas and a
+truncated reply. The variants are built from the stub backend's schema-valid
+replies. With --cassette, every recorded reply in a cassette (cassettes.py) is
+timed as well, so CPU per request can be tracked as the recorded corpus grows.
+
+Each cell is the best of --repeat runs of --number calls, in microseconds per call.
+The result column shows whether the reply survived: ok, repaired (the JSON repair
+parser was needed), parse (no JSON) or invalid (the route's validation rejected it).
+
+Usage:
+    python benchmarks/parse_validate.py
+    python benchmarks/parse_validate.py --routes enhance-experience review-section --number 5000
+    python benchmarks/parse_validate.py --cassette cassettes/recorded.jsonl --json
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+ROUTES = ['generate-summary', 'enhance-experience', 'enhance-project', 'suggest-skills', 'review-section',
+          'analyze-experience', 'analyze-projects']
+GROUP_PROMPT = '[{"id": "1"}, {"id": "2"}, {"id": "3"}]'  # the stub echoes these ids back
+
+
+def load_app():
+    os.environ.setdefault('LLM_BACKEND', 'stub')
+    os.environ.setdefault('CACHE_DB_PATH', 'none')
+    os.environ.setdefault('JOBS_DB_PATH', 'none')
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as app_module
+    return app_module
+
+
+def validators(app_module):
+    """route -> validate(result_json), as each route (or /api/analyze-resume, per entry) applies it."""
+    def group(kind):
+        def validate(result_json):
+            entries = result_json.get('entries') if isinstance(result_json, dict) else None
+            if not isinstance(entries, list):
+                return None, "missing entries"
+            results = [kind.finalize({key: value for key, value in entry.items() if key != 'id'})
+                       for entry in entries if isinstance(entry, dict)]
+            errors = [error for _, error in results if error]
+            return (None, errors[0]) if errors or not results else ([body for body, _ in results], None)
+        return validate
+
+    return {
+        'generate-summary': app_module.finalize_summary_result,
+        'enhance-experience': app_module.finalize_experience_result,
+        'enhance-project': app_module.finalize_project_result,
+        'suggest-skills': lambda result_json: app_module.finalize_skills_result(result_json, ['Excel', 'SQL']),
+        'review-section': lambda result_json: app_module.finalize_review_result(result_json, 'Summary'),
+        'analyze-experience': group(app_module.ENTRY_KINDS['experience']),
+        'analyze-projects': group(app_module.ENTRY_KINDS['projects']),
+    }
+
+
+def variants(text):
+    """The reply variants timed for one schema-valid reply text."""
+    pretty = json.dumps(json.loads(text), indent=2, ensure_ascii=False)
+    return {
+        'plain': text,
+        'pretty': pretty,
+        'fenced': f"```json\n{pretty}\n```",
+        'leading-prose': f"Here is the improved content in the requested JSON format:\n\n{pretty}",
+        'double-escaped': text.replace('\\n', '\\\\n'),
+        'trailing-comma': text[:-1].rstrip() + ',\n}',
+        'truncated': text[:int(len(text) * 0.8)],
+    }
+
+
+def corpus(args):
+    """[(route, variant, reply_text)] for the selected routes."""
+    from llm_backends import StubBackend
+
+    stub = StubBackend(latency=0)
+    samples = []
+    for route in args.routes:
+        prompt = GROUP_PROMPT if route.startswith('analyze-') else f"benchmark prompt for {route}"
+        for name, text in variants(stub.generate(prompt, route=route).text).items():
+            samples.append((route, name, text))
+    if args.cassette:
+        from cassettes import Cassette
+
+        index = 0
+        for record in Cassette(args.cassette).calls():
+            if record.get('route') in args.routes and record.get('text') is not None:
+                index += 1
+                samples.append((record['route'], f"recorded-{index}", record['text']))
+    return samples
+
+
+def best_us(fn, number, repeat):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def run(args):
+    app_module = load_app()
+    validate = validators(app_module)
+    rows = []
+    for route, variant, text in corpus(args):
+        repairs_before = app_module.JSON_REPAIRS.value(route)
+        result_json = app_module.parse_gemini_json(text, route)
+        if result_json is None:
+            outcome = 'parse'
+        elif validate[route](result_json)[1]:
+            outcome = 'invalid'
+        else:
+            outcome = 'repaired' if app_module.JSON_REPAIRS.value(route) > repairs_before else 'ok'
+        parse_us = best_us(lambda: app_module.parse_gemini_json(text, route), args.number, args.repeat)
+        validate_us = best_us(lambda: validate[route](result_json), args.number, args.repeat) \
+            if result_json is not None else None
+        rows.append({"route": route, "variant": variant, "chars": len(text), "parseUs": round(parse_us, 2),
+                     "validateUs": round(validate_us, 2) if validate_us is not None else None, "result": outcome})
+    return rows
+
+
+def print_table(rows, args):
+    print(f"\nParse/validate: best of {args.repeat} x {args.number} calls, microseconds per call")
+    print(f"{'route':<20}{'variant':<16}{'chars':>7}{'parse us':>10}{'validate us':>13}  result")
+    for row in rows:
+        validate_us = '-' if row['validateUs'] is None else f"{row['validateUs']:.2f}"
+        print(f"{row['route']:<20}{row['variant']:<16}{row['chars']:>7}{row['parseUs']:>10.2f}{validate_us:>13}"
+              f"  {row['result']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', nargs='*', choices=ROUTES, default=ROUTES)
+    parser.add_argument('--number', type=int, default=2000, help='Calls per timing run.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing runs per cell; the fastest counts.')
+    parser.add_argument('--cassette', help='Also time every recorded reply in this cassette.')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = run(args)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, args)
+
+
+if __name__ == '__main__':
+    main()
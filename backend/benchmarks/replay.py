@@ -0,0 +1,137 @@
+"""
+Replays a recorded session (cassettes.py) against the Flask app, offline and deterministically.
+
+Every API request in the cassette is sent again, in recording order, to the app loaded
+in-process with LLM_BACKEND=replay, which answers each model call from the same cassette
+with its recorded latency (scaled by --speed). Each response is compared with the one
+recorded, so a change to prompts, parsing or validation that alters an answer shows up
+as a mismatch (exit status 1). The table compares server-side latency per route with
+the recording; with --speed 0 it shows the server's own CPU time per request.
+
+Record a session first; with CACHE_DB_PATH=none every request reaches the upstream:
+    CASSETTE_RECORD=true CACHE_DB_PATH=none python app.py
+
+Usage:
+    python benchmarks/replay.py
+    python benchmarks/replay.py --cassette cassettes/recorded.jsonl --speed 0
+    python benchmarks/replay.py --speed 0 --concurrency 8 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(args):
+    os.environ['LLM_BACKEND'] = 'replay'
+    os.environ['CASSETTE_PATH'] = os.path.abspath(args.cassette)
+    os.environ['CASSETTE_RECORD'] = 'false'
+    os.environ['REPLAY_SPEED'] = str(args.speed)
+    os.environ.setdefault('CACHE_DB_PATH', 'none')
+    os.environ.setdefault('JOBS_DB_PATH', 'none')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Keep the governor out of the way unless the caller configured it explicitly.
+    os.environ.setdefault('GEMINI_RPM', '0')
+    os.environ.setdefault('GEMINI_TPM', '0')
+    os.environ.setdefault('GEMINI_MAX_CONCURRENCY', str(max(args.concurrency, 8)))
+    sys.path.insert(0, BACKEND_DIR)
+    import app as app_module
+    return app_module
+
+
+def replay(app_module, args):
+    """Sends every recorded request. Returns [(record, status, body, seconds)] in recording order."""
+    local = threading.local()
+
+    def send(record):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app_module.app.test_client()
+        started = time.perf_counter()
+        response = client.post(record['path'], json=record['body'])
+        return record, response.status_code, response.get_json(silent=True), time.perf_counter() - started
+
+    requests = app_module.cassette.requests[:args.limit] if args.limit else app_module.cassette.requests
+    if args.concurrency <= 1:
+        return [send(record) for record in requests]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(send, requests))
+
+
+def median_ms(values):
+    values = [value for value in values if value is not None]
+    return round(statistics.median(values) * 1000, 1) if values else None
+
+
+def summarize(results):
+    routes = {}
+    for record, status, body, seconds in results:
+        row = routes.setdefault(record['path'], {"requests": 0, "mismatches": 0, "recorded": [], "replayed": []})
+        row["requests"] += 1
+        row["mismatches"] += status != record['status'] or body != record['response']
+        row["recorded"].append(record.get('seconds'))
+        row["replayed"].append(seconds)
+    return {path: {"requests": row["requests"], "mismatches": row["mismatches"],
+                   "recordedP50Ms": median_ms(row["recorded"]), "replayedP50Ms": median_ms(row["replayed"])}
+            for path, row in routes.items()}
+
+
+def mismatches(results, limit):
+    found = []
+    for index, (record, status, body, _) in enumerate(results):
+        if status != record['status'] or body != record['response']:
+            found.append({"index": index, "path": record['path'], "recordedStatus": record['status'], "status": status,
+                          "recorded": json.dumps(record['response'])[:200], "replayed": json.dumps(body)[:200]})
+    return found[:limit]
+
+
+def print_report(report, diffs, args, wall):
+    print(f"\nReplay: {args.cassette}, speed={args.speed}, concurrency={args.concurrency}, wall {wall:.2f} s")
+    print(f"{'route':<32}{'reqs':>6}{'diff':>6}{'recorded p50 ms':>17}{'replayed p50 ms':>17}")
+    for path, row in report.items():
+        recorded = '-' if row['recordedP50Ms'] is None else f"{row['recordedP50Ms']:.1f}"
+        print(f"{path:<32}{row['requests']:>6}{row['mismatches']:>6}{recorded:>17}{row['replayedP50Ms']:>17.1f}")
+    for diff in diffs:
+        print(f"\n#{diff['index']} {diff['path']}: {diff['recordedStatus']} -> {diff['status']}")
+        print(f"  recorded: {diff['recorded']}")
+        print(f"  replayed: {diff['replayed']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cassette', default=os.getenv('CASSETTE_PATH', os.path.join(BACKEND_DIR, 'cassettes', 'recorded.jsonl')))
+    parser.add_argument('--speed', type=float, default=1.0, help='Divides recorded upstream latencies (0: no delay).')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Requests in flight. Above 1, repeated prompts may be answered in a different order.')
+    parser.add_argument('--limit', type=int, help='Only replay the first N recorded requests.')
+    parser.add_argument('--show-diffs', type=int, default=5, help='Mismatches to print in full.')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.cassette):
+        sys.exit(f"No cassette at {args.cassette}. Record one with CASSETTE_RECORD=true first.")
+    app_module = load_app(args)
+    if not app_module.cassette.requests:
+        sys.exit(f"{args.cassette} holds no recorded API requests.")
+    started = time.perf_counter()
+    results = replay(app_module, args)
+    wall = time.perf_counter() - started
+    report, diffs = summarize(results), mismatches(results, args.show_diffs)
+    if args.json:
+        print(json.dumps({"routes": report, "mismatches": diffs, "wallSeconds": round(wall, 3)}, indent=2))
+    else:
+        print_report(report, diffs, args, wall)
+    sys.exit(1 if any(row['mismatches'] for row in report.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
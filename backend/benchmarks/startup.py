@@ -0,0 +1,110 @@
+"""
+Startup benchmark: import time and time-to-first-request of the Flask app.
+
+Each sample is a fresh interpreter, so nothing is shared between runs. For every
+warm-up level it measures how long `import app` takes, how long the first
+/api/review-section request (hybrid mode: local pre-review plus one model call)
+takes after that, and, for background warm-ups, how long until /readyz first
+answers 200. The stub backend is used unless --backend gemini is given.
+
+Usage:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 7 --warmup none client --blocking
+    python benchmarks/startup.py --backend gemini --warmup none client
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WARMUP_LEVELS = ['none', 'local', 'client', 'upstream']
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {backend_dir!r})
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+ready = None
+while time.perf_counter() - imported < {ready_timeout}:
+    if client.get('/readyz').status_code == 200:
+        ready = time.perf_counter() - imported
+        break
+    time.sleep(0.005)
+request_started = time.perf_counter()
+response = client.post('/api/review-section', json={{"sectionName": "Summary", "reviewMode": "hybrid",
+                       "text": "I helped the team and was responsible for reporting."}})
+done = time.perf_counter()
+print(json.dumps({{"importSeconds": imported - started, "readySeconds": ready,
+                  "firstRequestSeconds": done - request_started, "status": response.status_code}}))
+"""
+
+
+def sample(args, level):
+    env = dict(os.environ, LLM_BACKEND=args.backend, WARMUP=level, WARMUP_BLOCKING=str(args.blocking).lower(),
+               CACHE_DB_PATH='none', JOBS_DB_PATH='none', LOG_LEVEL='WARNING', STUB_LATENCY_MS=str(args.stub_latency_ms))
+    started = time.perf_counter()
+    child = CHILD.format(backend_dir=BACKEND_DIR, ready_timeout=args.ready_timeout)
+    output = subprocess.run([sys.executable, '-c', child], env=env, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["processSeconds"] = time.perf_counter() - started
+    return result
+
+
+def median_ms(results, key):
+    values = [result[key] for result in results if result[key] is not None]
+    return round(statistics.median(values) * 1000, 1) if values else None
+
+
+def run(args):
+    report = {}
+    for level in args.warmup:
+        results = [sample(args, level) for _ in range(args.runs)]
+        report[level] = {
+            "importMs": median_ms(results, "importSeconds"),
+            "readyMs": median_ms(results, "readySeconds"),
+            "firstRequestMs": median_ms(results, "firstRequestSeconds"),
+            "processMs": median_ms(results, "processSeconds"),
+            "statuses": sorted({result["status"] for result in results}),
+        }
+    return report
+
+
+def print_table(report, args):
+    mode = "blocking" if args.blocking else "background"
+    print(f"\nStartup: {args.backend} backend, {mode} warm-up, median of {args.runs} runs")
+    print(f"{'warmup':<10}{'import ms':>11}{'ready ms':>10}{'1st req ms':>12}{'process ms':>12}  status")
+    for level, row in report.items():
+        ready = '-' if row['readyMs'] is None else f"{row['readyMs']:.1f}"
+        print(f"{level:<10}{row['importMs']:>11.1f}{ready:>10}{row['firstRequestMs']:>12.1f}{row['processMs']:>12.1f}"
+              f"  {','.join(map(str, row['statuses']))}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh processes per warm-up level.')
+    parser.add_argument('--warmup', nargs='*', choices=WARMUP_LEVELS, default=WARMUP_LEVELS)
+    parser.add_argument('--blocking', action='store_true', help='Warm up inside create_app() instead of in the background.')
+    parser.add_argument('--ready-timeout', type=float, default=10, help='Seconds to wait for /readyz before the first request.')
+    parser.add_argument('--backend', choices=['stub', 'gemini'], default='stub')
+    parser.add_argument('--stub-latency-ms', type=float, default=50)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(report, args)
+
+
+if __name__ == '__main__':
+    main()
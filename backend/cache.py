@@ -0,0 +1,229 @@
+"""
+Two-tier response cache for the Gemini-backed routes.
+
+The first tier is an in-process LRU with a TTL and size-based eviction. The
+second tier is a local SQLite file, so cached answers survive restarts and are
+shared between all gunicorn workers running on the same host.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("resume_ai.cache")
+
+
+def normalize_input(value):
+    """Collapses whitespace in strings (recursively for lists) so trivial edits still hit."""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(v) for v in value]
+    return value
+
+
+def make_cache_key(route, inputs, model_name, prompt_version):
+    """Builds a stable key from the route name, its normalized inputs, the model and the prompt version."""
+    payload = json.dumps(
+        {
+            "route": route,
+            "model": model_name,
+            "promptVersion": prompt_version,
+            "inputs": {k: normalize_input(v) for k, v in inputs.items()},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache in memory, backed by an optional SQLite file.
+
+    Values must be JSON-serializable (they are the parsed route responses).
+    Set db_path to None to run with the memory tier only.
+    """
+
+    def __init__(self, db_path=None, max_entries=512, max_bytes=8 * 1024 * 1024,
+                 ttl_seconds=7 * 24 * 3600, max_disk_entries=50000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._current_bytes = 0
+        self._local = threading.local()
+        self._writes_since_prune = 0
+        self._stats = {
+            "memoryHits": 0,
+            "diskHits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expired": 0,
+            "bypassed": 0,
+            "diskErrors": 0,
+        }
+
+        # The SQLite file is opened on first use, so building a cache (e.g. at import) touches no file.
+        self._disk_checked = False
+
+    # --- SQLite tier ---
+
+    def _disk_enabled(self):
+        """Opens the SQLite file on first use; one that cannot be opened turns the disk tier off."""
+        if self.db_path and not self._disk_checked:
+            try:
+                self._connection()
+            except sqlite3.Error as e:
+                logger.warning("cache_db_unavailable", extra={"fields": {"path": self.db_path, "error": str(e)}})
+                self.db_path = None
+            self._disk_checked = True
+        return bool(self.db_path)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses (created_at)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, key, now):
+        if not self._disk_enabled():
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._count("diskErrors")
+            logger.warning("cache_read_failed", extra={"fields": {"error": str(e)}})
+            return None
+        if row is None:
+            return None
+        value_text, expires_at = row
+        if expires_at <= now:
+            return None
+        return value_text, expires_at
+
+    def _disk_set(self, key, value_text, now, expires_at):
+        if not self._disk_enabled():
+            return
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, value_text, now, expires_at),
+            )
+            conn.commit()
+            with self._lock:
+                self._writes_since_prune += 1
+                should_prune = self._writes_since_prune >= 100
+                if should_prune:
+                    self._writes_since_prune = 0
+            if should_prune:
+                self._disk_prune(conn, now)
+        except sqlite3.Error as e:
+            self._count("diskErrors")
+            logger.warning("cache_write_failed", extra={"fields": {"error": str(e)}})
+
+    def _disk_prune(self, conn, now):
+        conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+        conn.commit()
+
+    # --- Memory tier ---
+
+    def _memory_put(self, key, value, size, expires_at):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._current_bytes -= old[1]
+            self._entries[key] = (expires_at, size, value)
+            self._current_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._current_bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._current_bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    # --- Public API ---
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, size, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["memoryHits"] += 1
+                    return value
+                del self._entries[key]
+                self._current_bytes -= size
+                self._stats["expired"] += 1
+
+        disk_entry = self._disk_get(key, now)
+        if disk_entry is not None:
+            value_text, expires_at = disk_entry
+            value = json.loads(value_text)
+            self._memory_put(key, value, len(value_text), expires_at)
+            self._count("diskHits")
+            return value
+
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        """Stores a JSON-serializable value in both tiers."""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        value_text = json.dumps(value, ensure_ascii=False)
+        self._memory_put(key, value, len(value_text), expires_at)
+        self._disk_set(key, value_text, now, expires_at)
+        self._count("sets")
+
+    def record_bypass(self):
+        """Counts a request that explicitly skipped the cache."""
+        self._count("bypassed")
+
+    def stats(self):
+        """Returns a snapshot of the hit/miss counters and current memory usage."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["memoryEntries"] = len(self._entries)
+            snapshot["memoryBytes"] = self._current_bytes
+        lookups = snapshot["memoryHits"] + snapshot["diskHits"] + snapshot["misses"]
+        snapshot["hitRate"] = round((snapshot["memoryHits"] + snapshot["diskHits"]) / lookups, 4) if lookups else 0.0
+        snapshot["diskEnabled"] = bool(self.db_path)
+        return snapshot
@@ -0,0 +1,260 @@
+"""
+Record/replay of upstream model calls.
+
+With CASSETTE_RECORD=true every model call (prompt, route, model, reply text, token
+usage, latency and, for streams, when each chunk arrived) is appended to a cassette:
+a JSON-lines file at CASSETTE_PATH. The Flask app also appends each JSON API request
+with the response it got, so a recorded session can be sent again.
+
+LLM_BACKEND=replay answers from a cassette instead of the upstream. Replies are looked
+up by route, system instruction and prompt and served with their recorded latency (scaled by REPLAY_SPEED;
+0 answers at once), recorded failures included. A prompt recorded several times is
+answered with each recording in turn. benchmarks/replay.py drives a whole recorded
+session against the replay backend to check and time the server deterministically
+offline. Record with CACHE_DB_PATH=none, so every request reaches the upstream.
+
+Cassettes contain resume text as sent by users; keep them out of version control.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "total_token_count", "cached_content_token_count")
+
+
+def call_key(route, prompt, system_instruction=None):
+    """Identifies interchangeable upstream calls: the same route, instruction and prompt (model ignored)."""
+    if system_instruction is None:
+        return hashlib.sha256(f"{route}\0{prompt}".encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{route}\0{system_instruction}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class CassetteMissError(Exception):
+    """The replayed cassette holds no recording for a prompt. Not retryable."""
+
+
+class ReplayedUpstreamError(Exception):
+    """A recorded upstream failure, re-raised with its original status code so retry decisions match."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class Cassette:
+    """
+    A JSON-lines corpus of recorded upstream calls and API requests. Thread-safe appends.
+    With load=False (recording) the file is only appended to; nothing is kept in memory.
+    """
+
+    def __init__(self, path, load=True):
+        self.path = path
+        self.loaded = load
+        self._lock = threading.Lock()
+        self._calls = {}  # call_key -> list of upstream records, in recording order
+        self._next = {}   # call_key -> index of the recording replayed next
+        self.requests = []
+        if load and os.path.exists(path):
+            with open(path, encoding="utf-8") as cassette_file:
+                for line in cassette_file:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, record):
+        if record.get("type") == "request":
+            self.requests.append(record)
+        else:
+            self._calls.setdefault(record["key"], []).append(record)
+
+    def append(self, record):
+        """Adds a record to the file and to the in-memory index."""
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as cassette_file:
+                cassette_file.write(line + "\n")
+            if self.loaded:
+                self._index(record)
+
+    def next_call(self, route, prompt, system_instruction=None):
+        """The next recording for this route, instruction and prompt, cycling through repeats. Raises CassetteMissError."""
+        key = call_key(route, prompt, system_instruction)
+        with self._lock:
+            records = self._calls.get(key)
+            if not records:
+                raise CassetteMissError(f"No recorded reply for this {route} prompt in {self.path}.")
+            index = self._next.get(key, 0)
+            self._next[key] = index + 1
+            return records[index % len(records)]
+
+    def calls(self):
+        """Every upstream record, grouped by prompt in recording order."""
+        with self._lock:
+            return [record for records in self._calls.values() for record in records]
+
+    def rewind(self):
+        """Starts every prompt's recordings from the first again."""
+        with self._lock:
+            self._next.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"calls": sum(len(records) for records in self._calls.values()), "prompts": len(self._calls),
+                    "requests": len(self.requests)}
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {field: getattr(usage, field, 0) or 0 for field in USAGE_FIELDS}
+
+
+def _error_dict(error):
+    code = getattr(error, "code", None)
+    return {"type": type(error).__name__, "message": str(error), "code": code if isinstance(code, int) else None}
+
+
+class RecordingBackend:
+    """Passes every call through to backend and appends what happened to the cassette."""
+
+    def __init__(self, backend, cassette):
+        self.backend = backend
+        self.cassette = cassette
+        self.name = backend.name
+        self.model_name = backend.model_name
+
+    def _record(self, route, prompt, model_name, started, system_instruction=None, **outcome):
+        self.cassette.append(dict({
+            "type": "upstream", "key": call_key(route, prompt, system_instruction), "route": route,
+            "model": model_name or self.model_name, "prompt": prompt,
+            "recordedAt": round(time.time(), 3), "seconds": round(time.perf_counter() - started, 4),
+        }, **outcome))
+
+    def _record_response(self, route, prompt, model_name, started, system_instruction, response):
+        try:
+            text = response.text
+        except Exception:
+            return  # e.g. a blocked reply without text; nothing replayable
+        self._record(route, prompt, model_name, started, system_instruction, text=text,
+                     usage=_usage_dict(getattr(response, "usage_metadata", None)))
+
+    def _record_stream(self, route, prompt, model_name, started, system_instruction, response):
+        chunks, usage = [], None
+        try:
+            for chunk in response:
+                chunks.append([round(time.perf_counter() - started, 4), getattr(chunk, "text", "")])
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                yield chunk
+        except Exception as e:
+            self._record(route, prompt, model_name, started, system_instruction, stream=True, chunks=chunks,
+                         error=_error_dict(e))
+            raise
+        self._record(route, prompt, model_name, started, system_instruction, stream=True, chunks=chunks,
+                     text="".join(text for _, text in chunks), usage=_usage_dict(usage))
+
+    def generate(self, prompt, route=None, stream=False, timeout=None, response_schema=None, model_name=None,
+                 system_instruction=None):
+        started = time.perf_counter()
+        try:
+            response = self.backend.generate(prompt, route=route, stream=stream, timeout=timeout,
+                                             response_schema=response_schema, model_name=model_name,
+                                             system_instruction=system_instruction)
+        except Exception as e:
+            self._record(route, prompt, model_name, started, system_instruction, stream=stream, error=_error_dict(e))
+            raise
+        if stream:
+            return self._record_stream(route, prompt, model_name, started, system_instruction, response)
+        self._record_response(route, prompt, model_name, started, system_instruction, response)
+        return response
+
+    async def generate_async(self, prompt, route=None, timeout=None, response_schema=None, model_name=None,
+                             system_instruction=None):
+        started = time.perf_counter()
+        try:
+            response = await self.backend.generate_async(prompt, route=route, timeout=timeout,
+                                                         response_schema=response_schema, model_name=model_name,
+                                                         system_instruction=system_instruction)
+        except Exception as e:
+            self._record(route, prompt, model_name, started, system_instruction, error=_error_dict(e))
+            raise
+        self._record_response(route, prompt, model_name, started, system_instruction, response)
+        return response
+
+    def ping(self, timeout=None):
+        return self.backend.ping(timeout)
+
+
+class ReplayBackend:
+    """
+    Serves replies from a cassette with their recorded latency divided by speed (0: no delay).
+    A recorded stream is replayed chunk by chunk at the recorded offsets, also for non-streaming
+    calls of the same prompt (which then take as long as the whole stream did).
+    """
+
+    name = "replay"
+
+    def __init__(self, cassette, speed=1.0, model_name="replay"):
+        self.cassette = cassette
+        self.speed = speed
+        self.model_name = model_name
+
+    def _scaled(self, seconds):
+        return seconds / self.speed if self.speed > 0 else 0.0
+
+    @staticmethod
+    def _response(text, usage):
+        return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(**usage) if usage else None)
+
+    @staticmethod
+    def _raise_recorded(record):
+        error = record["error"]
+        if error["type"] in ("TimeoutError", "DeadlineExceeded"):
+            raise TimeoutError(error["message"])
+        raise ReplayedUpstreamError(error["message"], error.get("code"))
+
+    def _chunks(self, record):
+        started = time.perf_counter()
+        for offset, text in record.get("chunks", []):
+            delay = self._scaled(offset) - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            yield self._response(text, record.get("usage"))
+        if record.get("error"):
+            self._raise_recorded(record)
+
+    def generate(self, prompt, route=None, stream=False, timeout=None, response_schema=None, model_name=None,
+                 system_instruction=None):
+        record = self.cassette.next_call(route, prompt, system_instruction)
+        delay = self._scaled(record["seconds"])
+        if stream and record.get("stream"):
+            return self._chunks(record)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("Replayed call took longer than the timeout.")
+        time.sleep(delay)
+        if record.get("error"):
+            self._raise_recorded(record)
+        if stream:
+            return iter([self._response(record["text"], record.get("usage"))])
+        return self._response(record["text"], record.get("usage"))
+
+    async def generate_async(self, prompt, route=None, timeout=None, response_schema=None, model_name=None,
+                             system_instruction=None):
+        record = self.cassette.next_call(route, prompt, system_instruction)
+        delay = self._scaled(record["seconds"])
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError("Replayed call took longer than the timeout.")
+        await asyncio.sleep(delay)
+        if record.get("error"):
+            self._raise_recorded(record)
+        return self._response(record["text"], record.get("usage"))
+
+    def ping(self, timeout=None):
+        return None
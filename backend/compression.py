@@ -0,0 +1,54 @@
+"""
+Content-Encoding negotiation for JSON responses.
+
+Review results and batch or analysis bodies can run to tens of kilobytes of
+repetitive JSON, which compresses several times over. Brotli is used when the
+client accepts it and the optional brotli package is installed, gzip otherwise.
+Streaming responses are never compressed: the compressor would buffer the events
+the client is waiting for.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional dependency; gzip is always available
+    brotli = None
+
+
+def accepted_encodings(accept_encoding):
+    """Content codings the client accepts (q > 0), lowercased, from an Accept-Encoding header."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    """Returns 'br', 'gzip' or None for the given Accept-Encoding header."""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding, level=None):
+    """
+    Compresses bytes with the given coding.
+    level is the brotli quality (0-11, default 5) or gzip level (1-9, default 6); the
+    defaults favour latency over ratio, since every response is compressed on the fly.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=5 if level is None else level)
+    return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
@@ -0,0 +1,145 @@
+"""
+Near-duplicate lookup for cached rewrites.
+
+Users often change one word or a trailing period and re-run "enhance", which the
+exact-match cache misses. This index finds an earlier input that is nearly the
+same. Each text becomes a set of word unigram and bigram features, is fingerprinted
+with a 64-bit SimHash, and is bucketed by bands of that fingerprint (LSH), so only
+texts sharing a band are compared. Candidates are scored by the Jaccard similarity
+of their feature sets. Texts whose numbers differ never match, because a rewrite
+quoting "20%" must not be reused for an input that now says "35%".
+
+The index only keeps fingerprints and the exact cache key of each answer, not the
+answer itself, and evicts the least recently used entries beyond max_entries.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[+#.'][a-z0-9+#]+)*")
+_BITS = 64
+
+
+def text_features(text):
+    """Returns (features, numbers): word unigrams and bigrams of the lowercased text, and its numeric tokens."""
+    tokens = _TOKEN.findall((text or "").lower())
+    features = set(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    numbers = frozenset(token for token in tokens if any(ch.isdigit() for ch in token))
+    return frozenset(features), numbers
+
+
+def simhash(features):
+    """64-bit SimHash of a feature set: each bit is the majority vote of the features' hashes."""
+    votes = [0] * _BITS
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(_BITS):
+            votes[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, vote in enumerate(votes) if vote > 0)
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class FuzzyIndex:
+    """
+    SimHash/LSH index from (scope, text) to a value, typically the exact cache key of an answer.
+    scope must match exactly (route, model and the inputs that are not compared fuzzily);
+    only the text is matched approximately. With bands=8, texts whose fingerprints differ
+    in at most 7 bits are always found.
+    """
+
+    def __init__(self, max_entries=2000, bands=8, min_words=5):
+        self.max_entries = max_entries
+        self.bands = bands
+        self.min_words = min_words
+        self._band_bits = _BITS // bands
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # entry id -> (scope, fingerprint, features, numbers, value)
+        self._buckets = {}             # (scope, band, band value) -> set of entry ids
+        self._ids = {}                 # (scope, features) -> entry id
+        self._by_value = {}            # value -> entry id
+        self._next_id = 0
+        self._stats = {"hits": 0, "misses": 0, "candidatesChecked": 0, "evictions": 0}
+
+    def _band_keys(self, scope, fingerprint):
+        mask = (1 << self._band_bits) - 1
+        return [(scope, band, fingerprint >> (band * self._band_bits) & mask) for band in range(self.bands)]
+
+    def _remove(self, entry_id):
+        scope, fingerprint, features, _, value = self._entries.pop(entry_id)
+        for key in self._band_keys(scope, fingerprint):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+        self._ids.pop((scope, features), None)
+        if self._by_value.get(value) == entry_id:
+            del self._by_value[value]
+
+    def add(self, scope, text, value):
+        """Indexes text under scope. Texts shorter than min_words are ignored."""
+        features, numbers = text_features(text)
+        if self.max_entries <= 0 or len(features) < self.min_words:
+            return
+        fingerprint = simhash(features)
+        with self._lock:
+            existing = self._ids.get((scope, features))
+            if existing is not None:
+                self._remove(existing)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, fingerprint, features, numbers, value)
+            self._ids[(scope, features)] = entry_id
+            self._by_value[value] = entry_id
+            for key in self._band_keys(scope, fingerprint):
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def find(self, scope, text, threshold):
+        """Returns (value, similarity) of the most similar indexed text at or above threshold, or (None, best similarity)."""
+        features, numbers = text_features(text)
+        if len(features) < self.min_words:
+            return None, 0.0
+        fingerprint = simhash(features)
+        best_id, best_similarity = None, 0.0
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(scope, fingerprint):
+                candidates.update(self._buckets.get(key, ()))
+            self._stats["candidatesChecked"] += len(candidates)
+            for entry_id in candidates:
+                _, _, entry_features, entry_numbers, _ = self._entries[entry_id]
+                if entry_numbers != numbers:
+                    continue
+                similarity = jaccard(features, entry_features)
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None or best_similarity < threshold:
+                self._stats["misses"] += 1
+                return None, best_similarity
+            self._entries.move_to_end(best_id)
+            self._stats["hits"] += 1
+            return self._entries[best_id][4], best_similarity
+
+    def discard(self, value):
+        """Drops the entry pointing at value, e.g. once its answer has left the response cache."""
+        with self._lock:
+            entry_id = self._by_value.get(value)
+            if entry_id is not None:
+                self._remove(entry_id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), buckets=len(self._buckets))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hitRate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,559 @@
+"""
+Concurrency and quota governor for upstream Gemini calls.
+
+Every model call goes through one shared GeminiGovernor, which applies (in order):
+  1. a circuit breaker that fails fast while the upstream is unhealthy,
+  2. token-bucket limits for requests per minute and tokens per minute, waited
+     for before a slot is taken, so a call short of quota never holds a slot,
+  3. a bounded concurrency limit with a wait queue and a queue timeout; queued
+     callers get slots in weighted fair order across tenants (see below),
+  4. exponential backoff with full jitter on retryable errors (429/5xx/timeouts),
+     within the call's deadline when one is given.
+Rejections raise a GovernorError carrying the HTTP status and Retry-After to return.
+A blocking caller may pass a `cancelled` threading.Event (set when its client went
+away): queueing, quota waits and retry back-off stop as soon as it is set.
+The async variants (async_slot, acall) share the same limits, counters and breaker and
+wait without blocking the event loop.
+
+The wait queue is a weighted fair queue. Each call is tagged on arrival with a
+virtual finish time, start + estimated_tokens / weight, where start is the later of
+the queue's virtual time and the finish tag of the tenant's previous call; a freed
+slot goes to the queued call with the smallest tag. A tenant sending many or large
+calls therefore only queues behind its own earlier calls, while others keep getting
+slots in proportion to their weights. Calls without a tenant share one default tenant.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+logger = logging.getLogger("resume_ai.governor")
+
+# How often a blocking caller waiting for a slot checks its cancelled event (seconds).
+CANCEL_POLL_SECONDS = 0.05
+# Fair-queue tenant of calls made without one.
+DEFAULT_TENANT = "default"
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "GatewayTimeout",
+}
+
+
+class GovernorError(Exception):
+    """Raised when a call is rejected before or after reaching the upstream."""
+
+    status_code = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class UpstreamBusyError(GovernorError):
+    """The wait queue is full, or the call could not get a slot or quota in time."""
+
+
+class CircuitOpenError(GovernorError):
+    """The circuit breaker is open because recent upstream calls kept failing."""
+
+
+class UpstreamUnavailableError(GovernorError):
+    """Retryable upstream errors persisted after every retry."""
+
+
+class UpstreamTimeoutError(GovernorError):
+    """The call's deadline passed before the upstream answered (including queueing and retries)."""
+
+    status_code = 504
+
+
+class RequestCancelledError(GovernorError):
+    """The caller no longer wants the result (its client disconnected); 499, the nginx 'client closed request'."""
+
+    status_code = 499
+
+
+def is_retryable(error):
+    """True for rate-limit, server-side and timeout errors that are worth retrying."""
+    if isinstance(error, GovernorError):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token) used for the TPM budget."""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at per_minute / 60 tokens per second."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount):
+        """Takes amount tokens if available. Returns 0 on success, else the seconds to wait."""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def debit(self, amount):
+        """Charges extra usage discovered after the fact; the balance may go negative."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+
+    def refund(self, amount):
+        """Gives back tokens taken for work that never ran, up to capacity."""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; lets one probe through after reset_timeout."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        with self._lock:
+            if self._state == "closed":
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if self._state == "open" and remaining > 0:
+                raise CircuitOpenError("The AI service is temporarily unavailable. Please try again shortly.", remaining)
+            if self._probe_in_flight:
+                raise CircuitOpenError("The AI service is recovering. Please try again shortly.", 1)
+            self._state = "half-open"
+            self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == "half-open" or self._failures >= self.failure_threshold:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def release_probe(self):
+        """Ends a half-open probe that neither succeeded nor failed in a way that counts."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+
+class _SlotWaiter:
+    """A call queued for a slot. A blocking caller waits on event, an async one on future; grant() wakes it."""
+
+    __slots__ = ("tenant", "start", "enqueued_at", "event", "loop", "future", "granted")
+
+    def __init__(self, tenant, start, loop=None):
+        self.tenant = tenant
+        self.start = start
+        self.enqueued_at = time.monotonic()
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.granted = False
+
+    def grant(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.future.set_result, None)
+
+
+class GeminiGovernor:
+    """Shared gate in front of the model client. Thread-safe; one instance per process."""
+
+    def __init__(self, requests_per_minute=60, tokens_per_minute=1_000_000, max_concurrency=8,
+                 max_queue=64, queue_timeout=10.0, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 breaker_threshold=5, breaker_reset=30.0):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = []  # heap of (finish tag, arrival number, _SlotWaiter)
+        self._arrivals = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish = {}  # tenant -> finish tag of its latest call
+        self._tenant_stats = {}  # tenant -> {"calls": slots granted, "waitSeconds": time spent queued}
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "rejectedQueueFull": 0,
+            "rejectedQueueTimeout": 0,
+            "rejectedRateLimit": 0,
+            "rejectedCircuitOpen": 0,
+            "upstreamFailures": 0,
+            "deadlineExceeded": 0,
+            "cancelled": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _check_cancelled(self, cancelled):
+        if cancelled is not None and cancelled.is_set():
+            self._count("cancelled")
+            raise RequestCancelledError("The request was cancelled before the AI service answered.")
+
+    def _enqueue(self, tenant, weight, cost, loop=None):
+        """
+        Takes a free slot and returns None, or queues the call and returns its _SlotWaiter.
+        Raises UpstreamBusyError when the queue is full. Call with self._lock held.
+        """
+        free = self._active < self.max_concurrency and not self._queue
+        if not free and len(self._queue) >= self.max_queue:
+            self._count("rejectedQueueFull")
+            raise UpstreamBusyError("The AI service is at capacity. Please try again shortly.", self.queue_timeout)
+        start = max(self._virtual_time, self._last_finish.get(tenant, 0.0))
+        finish = start + max(cost, 1) / weight
+        self._last_finish[tenant] = finish
+        self._tenant_stats.setdefault(tenant, {"calls": 0, "waitSeconds": 0.0})
+        if free:
+            self._active += 1
+            self._dispatched(tenant, start, 0.0)
+            return None
+        waiter = _SlotWaiter(tenant, start, loop)
+        heapq.heappush(self._queue, (finish, next(self._arrivals), waiter))
+        return waiter
+
+    def _dispatched(self, tenant, start, waited):
+        """Advances the virtual time to a call that got a slot. Call with self._lock held."""
+        self._virtual_time = max(self._virtual_time, start)
+        stats = self._tenant_stats[tenant]
+        stats["calls"] += 1
+        stats["waitSeconds"] += waited
+
+    def _leave_queue(self, waiter):
+        """Removes a waiter that gave up. Returns True when it had been granted a slot meanwhile, which it must release."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+            heapq.heapify(self._queue)
+            return False
+
+    def _acquire_slot(self, deadline, cancelled=None, tenant=DEFAULT_TENANT, weight=1.0, cost=0):
+        with self._lock:
+            waiter = self._enqueue(tenant, weight, cost)
+        if waiter is None:
+            return
+        try:
+            # _release_slot hands the slot over directly, so _active already counts us once the event is set.
+            while True:
+                self._check_cancelled(cancelled)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count("rejectedQueueTimeout")
+                    raise UpstreamBusyError("Timed out waiting for the AI service. Please try again shortly.", self.queue_timeout)
+                if waiter.event.wait(remaining if cancelled is None else min(remaining, CANCEL_POLL_SECONDS)):
+                    return
+        except BaseException:
+            # Timed out or cancelled: leave the queue, or pass on a slot handed over meanwhile.
+            if self._leave_queue(waiter):
+                self._release_slot()
+            raise
+
+    async def _acquire_slot_async(self, deadline, tenant=DEFAULT_TENANT, weight=1.0, cost=0):
+        with self._lock:
+            waiter = self._enqueue(tenant, weight, cost, asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(deadline - time.monotonic(), 0))
+        except BaseException as e:
+            # Timed out or cancelled (e.g. the client went away): leave the queue, or pass on a slot handed over meanwhile.
+            if self._leave_queue(waiter):
+                self._release_slot()
+            if isinstance(e, asyncio.CancelledError):
+                self._count("cancelled")
+            if not isinstance(e, asyncio.TimeoutError):
+                raise
+            self._count("rejectedQueueTimeout")
+            raise UpstreamBusyError("Timed out waiting for the AI service. Please try again shortly.", self.queue_timeout)
+
+    def _release_slot(self):
+        """Hands the slot to the queued call with the smallest finish tag, or frees it."""
+        with self._lock:
+            if not self._queue:
+                self._active -= 1
+                return
+            _, _, waiter = heapq.heappop(self._queue)
+            waiter.granted = True
+            self._dispatched(waiter.tenant, waiter.start, time.monotonic() - waiter.enqueued_at)
+        waiter.grant()
+
+    def _sleep(self, seconds, cancelled=None):
+        """time.sleep(), cut short by RequestCancelledError when cancelled is set meanwhile."""
+        if cancelled is None:
+            time.sleep(seconds)
+        elif cancelled.wait(seconds):
+            self._check_cancelled(cancelled)
+
+    def _acquire_quota(self, estimated_tokens, deadline, cancelled=None):
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, estimated_tokens)):
+            if bucket is None:
+                continue
+            while True:
+                wait = bucket.try_acquire(amount)
+                if wait == 0:
+                    break
+                if time.monotonic() + wait > deadline:
+                    self._count("rejectedRateLimit")
+                    raise UpstreamBusyError("AI request quota exceeded. Please try again shortly.", wait)
+                self._sleep(wait, cancelled)
+
+    def _refund_quota(self, estimated_tokens):
+        """Returns the quota of a call that got it but then no slot (queue full, timed out or cancelled)."""
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, estimated_tokens)):
+            if bucket is not None:
+                bucket.refund(amount)
+
+    async def _acquire_quota_async(self, estimated_tokens, deadline):
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, estimated_tokens)):
+            if bucket is None:
+                continue
+            while True:
+                wait = bucket.try_acquire(amount)
+                if wait == 0:
+                    break
+                if time.monotonic() + wait > deadline:
+                    self._count("rejectedRateLimit")
+                    raise UpstreamBusyError("AI request quota exceeded. Please try again shortly.", wait)
+                await asyncio.sleep(wait)
+
+    def _check_breaker(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("rejectedCircuitOpen")
+            raise
+
+    def _record_failure(self, error):
+        if is_retryable(error):
+            self._count("upstreamFailures")
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def _queue_deadline(self, deadline):
+        """When waiting for a slot or quota has to stop: queue_timeout, or earlier if the call's deadline is sooner."""
+        queue_deadline = time.monotonic() + self.queue_timeout
+        return queue_deadline if deadline is None else min(queue_deadline, deadline)
+
+    @contextmanager
+    def slot(self, estimated_tokens=0, deadline=None, cancelled=None, tenant=None, weight=1.0):
+        """
+        Holds one concurrency slot (and the matching quota) for the duration of the block.
+        The quota is taken first, so a call waiting for tokens does not hold a slot meanwhile;
+        it is refunded if no slot follows. While slots are contended, tenant's queued calls are
+        served in proportion to weight. Used directly by streaming calls; call() adds retries on top.
+        """
+        self._check_cancelled(cancelled)
+        self._check_breaker()
+        deadline = self._queue_deadline(deadline)
+        try:
+            self._acquire_quota(estimated_tokens, deadline, cancelled)
+            try:
+                self._acquire_slot(deadline, cancelled, DEFAULT_TENANT if tenant is None else tenant, weight,
+                                   estimated_tokens)
+            except BaseException:
+                self._refund_quota(estimated_tokens)
+                raise
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        try:
+            self._count("calls")
+            yield
+        except GovernorError:
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        except BaseException:
+            # Cancelled, or a stream closed by its client: neither a success nor an upstream failure.
+            self.breaker.release_probe()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._release_slot()
+
+    @asynccontextmanager
+    async def async_slot(self, estimated_tokens=0, deadline=None, tenant=None, weight=1.0):
+        """Async counterpart of slot(): waits for quota, then a slot, without blocking the event loop."""
+        self._check_breaker()
+        deadline = self._queue_deadline(deadline)
+        try:
+            await self._acquire_quota_async(estimated_tokens, deadline)
+            try:
+                await self._acquire_slot_async(deadline, DEFAULT_TENANT if tenant is None else tenant, weight,
+                                               estimated_tokens)
+            except BaseException:
+                self._refund_quota(estimated_tokens)
+                raise
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        try:
+            self._count("calls")
+            yield
+        except GovernorError:
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        except BaseException:
+            # Cancelled, or a stream closed by its client: neither a success nor an upstream failure.
+            self.breaker.release_probe()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._release_slot()
+
+    def _retry_delay(self, error, attempt, deadline=None):
+        """
+        Seconds to back off before retry number attempt + 1. Raises once retries are
+        exhausted, or UpstreamTimeoutError when the retry would start after the deadline.
+        """
+        if attempt >= self.max_retries:
+            raise UpstreamUnavailableError(f"The AI service is unavailable after {attempt + 1} attempts: {error}",
+                                           self.backoff_max) from error
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            self._count("deadlineExceeded")
+            logger.warning("gemini_deadline_exceeded", extra={"fields": {"error": str(error) or type(error).__name__, "attempt": attempt + 1}})
+            raise UpstreamTimeoutError("The AI service did not answer in time. Please try again shortly.", self.backoff_base) from error
+        self._count("retries")
+        logger.warning("gemini_retry", extra={"fields": {"error": str(error), "attempt": attempt + 1, "max_retries": self.max_retries, "delay_seconds": round(delay, 2)}})
+        return delay
+
+    def call(self, fn, estimated_tokens=0, deadline=None, cancelled=None, tenant=None, weight=1.0):
+        """
+        Runs fn() inside a slot, retrying retryable errors with exponential backoff and full jitter.
+        deadline (time.monotonic()) bounds queueing and retries; fn should bound its own call with it.
+        Once cancelled is set, no further slot, quota or retry is waited for (RequestCancelledError).
+        tenant and weight place the call in the fair queue (see slot()).
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.slot(estimated_tokens, deadline, cancelled, tenant, weight):
+                    return fn()
+            except GovernorError:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                delay = self._retry_delay(e, attempt, deadline)
+                attempt += 1
+                self._sleep(delay, cancelled)
+
+    async def acall(self, fn, estimated_tokens=0, deadline=None, tenant=None, weight=1.0):
+        """Async counterpart of call(): awaits fn() inside a slot with the same retry policy and deadline."""
+        attempt = 0
+        while True:
+            try:
+                async with self.async_slot(estimated_tokens, deadline, tenant, weight):
+                    return await fn()
+            except GovernorError:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                delay = self._retry_delay(e, attempt, deadline)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def has_spare_capacity(self):
+        """True when a slot is free and nobody is queued, i.e. an extra (hedge) call would not delay anyone."""
+        with self._lock:
+            return self._active < self.max_concurrency and not self._queue
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Charges the TPM bucket for tokens used beyond the up-front estimate."""
+        if self.token_bucket is not None and actual_tokens > estimated_tokens:
+            self.token_bucket.debit(actual_tokens - estimated_tokens)
+
+    def stats(self):
+        """Returns counters, queue depth, breaker state and per-tenant slot usage ("tenants")."""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        with self._lock:
+            snapshot["active"] = self._active
+            snapshot["queued"] = len(self._queue)
+            tenants = {tenant: {"calls": stats["calls"], "queued": 0, "waitSeconds": round(stats["waitSeconds"], 3)}
+                       for tenant, stats in self._tenant_stats.items()}
+            for _, _, waiter in self._queue:
+                tenants[waiter.tenant]["queued"] += 1
+        snapshot["tenants"] = tenants
+        snapshot["maxConcurrency"] = self.max_concurrency
+        snapshot["circuitState"] = self.breaker.state
+        if self.request_bucket is not None:
+            snapshot["requestBudgetRemaining"] = round(self.request_bucket.available(), 2)
+        if self.token_bucket is not None:
+            snapshot["tokenBudgetRemaining"] = round(self.token_bucket.available(), 2)
+        return snapshot
@@ -0,0 +1,135 @@
+"""
+Latency tracking and hedged upstream calls.
+
+Gemini latency has a long tail: most generations finish close to the median, a
+few take several times longer for reasons unrelated to the prompt. A hedged call
+sends a second, identical request once the first has been running for longer
+than the route's recent p90 and keeps whichever answer arrives first, so only
+about one call in ten is duplicated while the slowest tail is cut off.
+
+LatencyTracker keeps a sliding window of recent upstream latencies per key (route
+and model) to derive that delay. hedged_call() runs blocking calls on an executor;
+a loser that has already started cannot be interrupted and finishes in the
+background with its result dropped. hedged_call_async() cancels the losing task.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class LatencyTracker:
+    """Recent latencies per key, for percentile-based hedge delays. Thread-safe."""
+
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples = {}  # key -> deque of seconds
+
+    def observe(self, key, seconds):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, key, q):
+        """The q-quantile (0-1) of the recent latencies of key, or None with fewer than min_samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(self.min_samples, 1):
+            return None
+        return samples[min(len(samples) - 1, math.ceil(q * len(samples)) - 1)]
+
+    def stats(self):
+        """{"route/model": {"samples": n, "p50": s, "p90": s, "p99": s}} for every tracked key."""
+        with self._lock:
+            keys = list(self._samples)
+        stats = {}
+        for key in keys:
+            name = "/".join(key) if isinstance(key, tuple) else str(key)
+            with self._lock:
+                samples = len(self._samples[key])
+            stats[name] = {"samples": samples}
+            for label, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+                value = self.percentile(key, q) if samples >= self.min_samples else None
+                stats[name][label] = round(value, 4) if value is not None else None
+        return stats
+
+
+def _remaining(deadline):
+    return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+
+def hedged_call(fn, hedge_delay, executor, deadline=None, may_hedge=None):
+    """
+    Runs fn('primary') on executor and, if it has not finished within hedge_delay seconds,
+    fn('hedge') as well; the first success wins. may_hedge() is checked before hedging, so
+    a saturated upstream is not sent extra load. Returns (result, outcome) with outcome one
+    of 'unhedged', 'skipped', 'primary_won' or 'hedge_won'. Raises the last error when every
+    attempt fails, or TimeoutError once deadline (time.monotonic()) passes.
+    """
+    primary = executor.submit(fn, 'primary')
+    delay = hedge_delay if deadline is None else min(hedge_delay, _remaining(deadline))
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result(), 'unhedged'
+    if may_hedge is not None and not may_hedge():
+        done, _ = wait([primary], timeout=_remaining(deadline))
+        if not done:
+            raise TimeoutError("The model call did not finish before its deadline.")
+        return primary.result(), 'skipped'
+
+    hedge = executor.submit(fn, 'hedge')
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=_remaining(deadline), return_when=FIRST_COMPLETED)
+        if not done:
+            for future in pending:
+                future.cancel()
+            raise TimeoutError("The model call did not finish before its deadline.")
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    loser.cancel()  # only stops a call that has not started yet
+                return future.result(), 'primary_won' if future is primary else 'hedge_won'
+            error = future.exception()
+    raise error
+
+
+async def hedged_call_async(fn, hedge_delay, deadline=None, may_hedge=None):
+    """Async counterpart of hedged_call(): fn(attempt) returns an awaitable; the losing task is cancelled."""
+    primary = asyncio.ensure_future(fn('primary'))
+    hedge = None
+    delay = hedge_delay if deadline is None else min(hedge_delay, _remaining(deadline))
+    try:
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result(), 'unhedged'
+        if may_hedge is not None and not may_hedge():
+            done, _ = await asyncio.wait([primary], timeout=_remaining(deadline))
+            if not done:
+                raise TimeoutError("The model call did not finish before its deadline.")
+            return primary.result(), 'skipped'
+
+        hedge = asyncio.ensure_future(fn('hedge'))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=_remaining(deadline), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("The model call did not finish before its deadline.")
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), 'primary_won' if task is primary else 'hedge_won'
+                error = task.exception()
+        raise error
+    finally:
+        # Cancels the loser, or both attempts when the caller itself was cancelled or timed out.
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
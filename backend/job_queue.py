@@ -0,0 +1,341 @@
+"""
+Persistent job queue for bulk resume processing.
+
+A job is a list of route-style tasks (e.g. hundreds of stored resumes to enhance
+overnight). Jobs and tasks live in a local SQLite file, so queued work survives
+restarts. A pool of worker threads claims tasks in priority order ('interactive'
+before 'normal' before 'bulk', then oldest first).
+
+Tasks are idempotent: a task is identified by (job id, index), and a claimed task
+holds a lease. If the process dies mid-task the lease expires (or, on restart, the
+dead process's tasks are released at once) and the task is simply run again; a
+result is only recorded by the worker that currently holds the lease. A task the
+runner asks to retry later (RetryLater) is deferred without using up an attempt, up
+to max_deferrals times; then it fails instead of waiting forever. Submitting
+a job twice with the same idempotency key returns the first job. A job records the
+tenant that submitted it, and its tasks run on that tenant's quotas.
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("resume_ai.jobs")
+
+PRIORITIES = {"interactive": 0, "normal": 1, "bulk": 2}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+
+class RetryLater(Exception):
+    """Raised by a task runner to put the task back in the queue for retry_after seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite tables for jobs and their tasks; safe to share between threads and worker processes on one host."""
+
+    def __init__(self, db_path, lease_seconds=600, max_attempts=3, retention_seconds=7 * 24 * 3600, max_deferrals=20):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_deferrals = max_deferrals
+        self.retention_seconds = retention_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()  # the SQLite file is opened on first use, per thread
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited across fork() must not be used by the child.
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " idempotency_key TEXT UNIQUE,"
+                " priority INTEGER NOT NULL,"
+                " total INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " tenant TEXT)"
+            )
+            if "tenant" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                try:
+                    conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT")  # created before jobs had tenants
+                except sqlite3.OperationalError:
+                    pass  # another process added it first
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " job_id TEXT NOT NULL,"
+                " idx INTEGER NOT NULL,"
+                " task_id TEXT NOT NULL,"
+                " route TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " priority INTEGER NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " deferrals INTEGER NOT NULL DEFAULT 0,"
+                " available_at REAL NOT NULL,"
+                " enqueued_at REAL NOT NULL,"
+                " lease_owner TEXT,"
+                " lease_expires_at REAL,"
+                " status_code INTEGER,"
+                " result TEXT,"
+                " finished_at REAL,"
+                " PRIMARY KEY (job_id, idx))"
+            )
+            if "deferrals" not in {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}:
+                try:
+                    # created before deferrals were counted
+                    conn.execute("ALTER TABLE tasks ADD COLUMN deferrals INTEGER NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError:
+                    pass  # another process added it first
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks (status, priority, enqueued_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create_job(self, tasks, priority="bulk", idempotency_key=None, tenant=None):
+        """
+        Stores a job of tasks ({"id", "route", "payload"} dicts) submitted by tenant (an id) and returns (job_id, created).
+        created is False when a job with the same idempotency_key already exists.
+        """
+        conn = self._connection()
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        level = PRIORITIES[priority]
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO jobs (id, idempotency_key, priority, total, created_at, tenant) VALUES (?, ?, ?, ?, ?, ?)",
+                         (job_id, idempotency_key, level, len(tasks), now, tenant))
+            conn.executemany(
+                "INSERT INTO tasks (job_id, idx, task_id, route, payload, priority, status, available_at, enqueued_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                [(job_id, index, task["id"], task["route"], json.dumps(task["payload"], ensure_ascii=False), level, now, now)
+                 for index, task in enumerate(tasks)],
+            )
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK")
+            row = conn.execute("SELECT id FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+            return row[0], False
+        self._prune(conn, now)
+        return job_id, True
+
+    def _prune(self, conn, now):
+        """Deletes finished jobs older than the retention period."""
+        cutoff = now - self.retention_seconds
+        conn.execute(
+            "DELETE FROM tasks WHERE job_id IN (SELECT id FROM jobs WHERE created_at < ? AND NOT EXISTS ("
+            " SELECT 1 FROM tasks WHERE tasks.job_id = jobs.id AND status IN ('queued', 'running')))", (cutoff,))
+        conn.execute("DELETE FROM jobs WHERE created_at < ? AND NOT EXISTS (SELECT 1 FROM tasks WHERE tasks.job_id = jobs.id)",
+                     (cutoff,))
+
+    def release_dead_owners(self):
+        """Requeues tasks leased by processes on this host that no longer exist (e.g. after a crash and restart)."""
+        conn = self._connection()
+        host = self.owner.split(":")[0]
+        rows = conn.execute("SELECT DISTINCT lease_owner FROM tasks WHERE status = 'running' AND lease_owner LIKE ?",
+                            (f"{host}:%",)).fetchall()
+        dead = [owner for (owner,) in rows if not _pid_alive(int(owner.rsplit(":", 1)[1]))]
+        for owner in dead:
+            conn.execute("UPDATE tasks SET status = 'queued', lease_owner = NULL, lease_expires_at = NULL"
+                         " WHERE status = 'running' AND lease_owner = ?", (owner,))
+        if dead:
+            logger.warning("job_tasks_released", extra={"fields": {"owners": dead}})
+
+    def claim(self):
+        """Leases the next runnable task. Returns (job_id, index, route, payload, tenant) or None when the queue is idle."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases belong to workers that died or hung: give up after max_attempts, else run again.
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', status_code = 500, result = ?, finished_at = ?, lease_owner = NULL"
+                " WHERE (status = 'queued' OR status = 'running' AND lease_expires_at < ?) AND attempts >= ?",
+                (json.dumps({"error": f"Task did not finish after {self.max_attempts} attempts."}), now, now, self.max_attempts),
+            )
+            conn.execute("UPDATE tasks SET status = 'queued', lease_owner = NULL WHERE status = 'running' AND lease_expires_at < ?",
+                         (now,))
+            row = conn.execute(
+                "SELECT job_id, idx, route, payload, (SELECT tenant FROM jobs WHERE jobs.id = tasks.job_id) FROM tasks"
+                " WHERE status = 'queued' AND available_at <= ?"
+                " ORDER BY priority, enqueued_at, idx LIMIT 1", (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE tasks SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?"
+                    " WHERE job_id = ? AND idx = ?", (self.owner, now + self.lease_seconds, row[0], row[1]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job_id, index, route, payload, tenant = row
+        return job_id, index, route, json.loads(payload), tenant
+
+    def complete(self, job_id, index, body, status_code):
+        """Records a task's result; ignored unless this process still holds the task's lease."""
+        self._connection().execute(
+            "UPDATE tasks SET status = ?, status_code = ?, result = ?, finished_at = ?, lease_owner = NULL"
+            " WHERE job_id = ? AND idx = ? AND status = 'running' AND lease_owner = ?",
+            ("done" if status_code == 200 else "failed", status_code, json.dumps(body, ensure_ascii=False), time.time(),
+             job_id, index, self.owner),
+        )
+
+    def defer(self, job_id, index, delay, reason=""):
+        """
+        Puts a leased task back in the queue for delay seconds without counting the attempt. After
+        max_deferrals deferrals the task fails (503) instead. Returns True when the task was requeued.
+        """
+        conn = self._connection()
+        requeued = conn.execute(
+            "UPDATE tasks SET status = 'queued', attempts = attempts - 1, deferrals = deferrals + 1, available_at = ?,"
+            " lease_owner = NULL WHERE job_id = ? AND idx = ? AND status = 'running' AND lease_owner = ? AND deferrals < ?",
+            (time.time() + delay, job_id, index, self.owner, self.max_deferrals),
+        ).rowcount
+        if requeued:
+            return True
+        error = f"Task was deferred {self.max_deferrals} times without finding upstream capacity; giving up."
+        if reason:
+            error = f"{error} Last reason: {reason}"
+        conn.execute(
+            "UPDATE tasks SET status = 'failed', status_code = 503, result = ?, finished_at = ?, lease_owner = NULL"
+            " WHERE job_id = ? AND idx = ? AND status = 'running' AND lease_owner = ?",
+            (json.dumps({"error": error}), time.time(), job_id, index, self.owner),
+        )
+        return False
+
+    def get_job(self, job_id):
+        """Returns the job's submitting tenant, progress and per-task results, or None for an unknown id."""
+        conn = self._connection()
+        job = conn.execute("SELECT priority, total, created_at, tenant FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        priority, total, created_at, tenant = job
+        tasks = []
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for task_id, route, status, status_code, result, attempts in conn.execute(
+                "SELECT task_id, route, status, status_code, result, attempts FROM tasks WHERE job_id = ? ORDER BY idx",
+                (job_id,)):
+            counts[status] += 1
+            task = {"id": task_id, "route": route, "status": status, "attempts": attempts}
+            if status in ("done", "failed"):
+                task["statusCode"] = status_code
+                body = json.loads(result)
+                if status == "done":
+                    task["result"] = body
+                else:
+                    task.update(body)
+            tasks.append(task)
+        finished = counts["done"] + counts["failed"]
+        if finished == total:
+            state = "done"
+        elif counts["running"] or finished:
+            state = "running"
+        else:
+            state = "queued"
+        return {
+            "jobId": job_id,
+            "tenant": tenant,
+            "status": state,
+            "priority": PRIORITY_NAMES.get(priority, priority),
+            "createdAt": created_at,
+            "total": total,
+            "completed": finished,
+            "succeeded": counts["done"],
+            "failed": counts["failed"],
+            "progress": round(finished / total, 4) if total else 1.0,
+            "tasks": tasks,
+        }
+
+    def stats(self):
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+
+class JobWorkers:
+    """
+    Worker threads that claim tasks from a JobStore and run them with run_task(route, payload, tenant),
+    which returns (body, status_code) or raises RetryLater. While should_yield() is true
+    (interactive requests are waiting upstream) the workers pause, so bulk work only uses
+    spare capacity.
+    """
+
+    def __init__(self, store, run_task, workers=2, should_yield=None, idle_poll=1.0):
+        self.store = store
+        self.run_task = run_task
+        self.workers = workers
+        self.should_yield = should_yield or (lambda: False)
+        self.idle_poll = idle_poll
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_started(self):
+        """Starts the pool once per process (threads do not survive a fork)."""
+        if self.workers <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.store.owner = f"{socket.gethostname()}:{self._pid}"
+            self.store.release_dead_owners()
+            for number in range(self.workers):
+                threading.Thread(target=self._loop, name=f"job-worker-{number}", daemon=True).start()
+
+    def notify(self):
+        """Wakes idle workers after new tasks were queued."""
+        self._wakeup.set()
+
+    def _loop(self):
+        while True:
+            if self.should_yield():
+                time.sleep(0.05)
+                continue
+            try:
+                claimed = self.store.claim()
+            except sqlite3.Error as e:
+                logger.warning("job_claim_failed", extra={"fields": {"error": str(e)}})
+                claimed = None
+            if claimed is None:
+                self._wakeup.wait(self.idle_poll)
+                self._wakeup.clear()
+                continue
+            job_id, index, route, payload, tenant = claimed
+            try:
+                body, status_code = self.run_task(route, payload, tenant)
+            except RetryLater as e:
+                if not self.store.defer(job_id, index, e.retry_after, str(e)):
+                    logger.error("job_task_deferral_limit",
+                                 extra={"fields": {"job_id": job_id, "task": index, "error": str(e)}})
+                continue
+            except Exception as e:
+                logger.error("job_task_failed", extra={"fields": {"job_id": job_id, "task": index, "error": str(e)}})
+                body, status_code = {"error": f"An unexpected error occurred while processing this task: {e}"}, 500
+            self.store.complete(job_id, index, body, status_code)
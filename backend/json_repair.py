@@ -0,0 +1,91 @@
+"""
+Tolerant JSON repair for model output that json.loads rejects.
+
+Handles the failure modes seen in practice: prose or a ```json fence around the
+object, trailing commas, raw newlines/tabs inside strings and output cut off by
+the token limit. A truncated reply is cut back to the last complete value and
+its open brackets are closed, so a half-written bullet or sentence is dropped
+rather than returned.
+"""
+import json
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _strip_trailing_comma(out):
+    """Removes a dangling ',' (and the whitespace after it) from the end of out."""
+    i = len(out) - 1
+    while i >= 0 and out[i] in " \t\r\n":
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i:]
+
+
+def _close(out, stack):
+    _strip_trailing_comma(out)
+    return "".join(out) + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def repair_json(text):
+    """Returns the parsed value of a damaged JSON object or array, or None if nothing usable is left."""
+    if not text:
+        return None
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None
+
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    safe_point = None  # (len(out), stack copy) after the last complete value
+
+    for ch in text[min(starts):]:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            elif ch == "\r":
+                ch = "\\r"
+            elif ch == "\t":
+                ch = "\\t"
+            out.append(ch)
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if not stack or _CLOSERS[stack[-1]] != ch:
+                break
+            _strip_trailing_comma(out)
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            safe_point = (len(out), list(stack))
+            continue
+        elif ch == ",":
+            safe_point = (len(out), list(stack))
+        out.append(ch)
+
+    if not stack:
+        candidates = ["".join(out)]
+    else:
+        candidates = [_close(list(out), stack)] if not in_string else []
+        if safe_point is not None:
+            length, saved_stack = safe_point
+            candidates.append(_close(out[:length], saved_stack))
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
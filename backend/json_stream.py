@@ -0,0 +1,144 @@
+"""
+Incremental JSON parser for streamed Gemini output.
+
+Gemini streams the JSON object a few tokens at a time. This parser is fed each
+chunk as it arrives and reports values as soon as they are complete, so the
+streaming routes can forward them before the whole object has been generated.
+Anything before the first '{' (e.g. a ```json fence) is ignored.
+"""
+import json
+
+_WHITESPACE = " \t\r\n"
+_DELIMITERS = ",:}]"
+
+
+class IncrementalJSONParser:
+    """
+    Emits events for a top-level JSON object:
+      {"type": "field", "key": k, "value": v}                 - a top-level value finished
+      {"type": "item", "key": k, "index": i, "value": v}      - an element of a top-level array finished
+      {"type": "bullet", "key": k, "index": i, "text": t}     - a line of a top-level string in bullet_fields finished
+    """
+
+    def __init__(self, bullet_fields=()):
+        self.bullet_fields = set(bullet_fields)
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._root_seen = False
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._primitive_start = None
+        self._bullet_key = None
+        self._bullet_start = 0
+        self._bullet_index = 0
+
+    def feed(self, chunk):
+        """Consumes the next chunk of text and returns the list of events it completed."""
+        self._text += chunk
+        events = []
+        text = self._text
+        while self._pos < len(text) and not self.done:
+            ch = text[self._pos]
+
+            if not self._root_seen:
+                if ch == '{':
+                    self._root_seen = True
+                    self._push('object')
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                self._scan_string_char(ch, events)
+                self._pos += 1
+                continue
+
+            frame = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+                self._string_is_key = frame['kind'] == 'object' and frame['expect_key']
+                if not self._string_is_key and len(self._stack) == 1 and frame['key'] in self.bullet_fields:
+                    self._bullet_key = frame['key']
+                    self._bullet_start = self._pos + 1
+                    self._bullet_index = 0
+            elif ch in '{[':
+                self._push('object' if ch == '{' else 'array')
+            elif ch in _DELIMITERS:
+                self._finish_primitive(events)
+                if ch == ',':
+                    if frame['kind'] == 'object':
+                        frame['expect_key'] = True
+                    else:
+                        frame['index'] += 1
+                elif ch in '}]':
+                    closed = self._stack.pop()
+                    if not self._stack:
+                        self.done = True
+                    else:
+                        self._value_done(text[closed['start']:self._pos + 1], events)
+            elif ch not in _WHITESPACE and self._primitive_start is None:
+                self._primitive_start = self._pos
+            self._pos += 1
+        return events
+
+    # --- internals ---
+
+    def _push(self, kind):
+        self._stack.append({'kind': kind, 'start': self._pos, 'key': None, 'index': 0, 'expect_key': kind == 'object'})
+
+    def _scan_string_char(self, ch, events):
+        if self._escape:
+            self._escape = False
+            if ch == 'n' and self._bullet_key is not None:
+                # Flush the line that ends just before the backslash of this "\n" escape.
+                self._flush_bullet(self._pos - 1, events)
+                self._bullet_start = self._pos + 1
+        elif ch == '\\':
+            self._escape = True
+        elif ch == '"':
+            self._in_string = False
+            if self._bullet_key is not None:
+                self._flush_bullet(self._pos, events)
+                self._bullet_key = None
+            raw = self._text[self._string_start:self._pos + 1]
+            if self._string_is_key:
+                frame = self._stack[-1]
+                frame['key'] = json.loads(raw, strict=False)
+                frame['expect_key'] = False
+            else:
+                self._value_done(raw, events)
+        elif ch == '\n' and self._bullet_key is not None:
+            # A raw newline is invalid JSON but the model produces it often enough to handle.
+            self._flush_bullet(self._pos, events)
+            self._bullet_start = self._pos + 1
+
+    def _flush_bullet(self, end, events):
+        segment = self._text[self._bullet_start:end]
+        try:
+            line = json.loads(f'"{segment}"', strict=False).strip()
+        except json.JSONDecodeError:
+            line = segment.strip()
+        if line:
+            events.append({'type': 'bullet', 'key': self._bullet_key, 'index': self._bullet_index, 'text': line})
+            self._bullet_index += 1
+
+    def _finish_primitive(self, events):
+        if self._primitive_start is None:
+            return
+        raw = self._text[self._primitive_start:self._pos].strip()
+        self._primitive_start = None
+        self._value_done(raw, events)
+
+    def _value_done(self, raw, events):
+        try:
+            value = json.loads(raw, strict=False)
+        except json.JSONDecodeError:
+            return
+        if len(self._stack) == 1:
+            events.append({'type': 'field', 'key': self._stack[0]['key'], 'value': value})
+        elif len(self._stack) == 2 and self._stack[1]['kind'] == 'array':
+            events.append({'type': 'item', 'key': self._stack[0]['key'], 'index': self._stack[1]['index'], 'value': value})
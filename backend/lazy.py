@@ -0,0 +1,53 @@
+"""
+Per-process lazy initialization.
+
+Expensive objects (the Gemini client and its import chain, the spelling index) are
+built on first use instead of at import, so importing app.py stays fast. Each
+process builds its own instance: a pre-forked worker never reuses a client created
+in the parent, whose connections and threads do not survive the fork.
+"""
+import os
+import threading
+import time
+
+
+class Lazy:
+    """Holds the result of factory(), built on the first get() in each process."""
+
+    def __init__(self, factory, name):
+        self._factory = factory
+        self.name = name
+        self._lock = threading.Lock()
+        self._value = None
+        self._pid = None
+        self.error = None
+        self.init_seconds = None
+        if hasattr(os, "register_at_fork"):
+            # A lock held by another thread at fork time would never be released in the child.
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._pid = None
+
+    @property
+    def initialized(self):
+        return self._pid == os.getpid()
+
+    def get(self):
+        """Returns the instance for this process, building it first if needed. Factory errors propagate."""
+        if self._pid == os.getpid():
+            return self._value
+        with self._lock:
+            if self._pid != os.getpid():
+                started = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.error = None
+                self.init_seconds = time.perf_counter() - started
+                self._pid = os.getpid()
+        return self._value
@@ -0,0 +1,345 @@
+"""
+LLM backends used by the AI routes.
+
+The routes only talk to a backend through generate(prompt, route, stream, timeout,
+response_schema, model_name, system_instruction), which returns an object with a .text
+attribute (or an iterable of such chunks when streaming) and, when available,
+.usage_metadata. The ASGI app uses the awaitable generate_async() with the same
+arguments (without stream) instead, and the readiness check calls ping(timeout) to
+see whether the upstream is reachable. system_instruction is a task's static
+instruction (tasks.py); prompt is the part rendered for the request.
+
+  - GeminiBackend calls Google's Gemini API.
+  - StubBackend answers locally with schema-valid JSON after a configurable delay,
+    so the server can be load-tested offline without spending quota.
+  - ReplayBackend (cassettes.py) serves replies recorded from either one, with
+    their original timings; RecordingBackend records them.
+  - LazyBackend defers building any of them (and the google.generativeai import)
+    until the first call in each process.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from functools import partial
+from types import SimpleNamespace
+
+from cassettes import RecordingBackend, ReplayBackend
+from governor import estimate_tokens
+from lazy import Lazy
+
+logger = logging.getLogger("resume_ai.llm_backends")
+
+
+class GeminiBackend:
+    """
+    Thin wrapper around google.generativeai.GenerativeModel.
+
+    A call's system instruction is served from an explicit context cache (CachedContent) once it
+    reaches context_cache_min_tokens, so its tokens are billed at the cached rate instead of in
+    full on every call. Caches live context_cache_ttl seconds and are replaced shortly before they
+    expire; one that cannot be created (e.g. below the model's minimum size) is not tried again
+    for a TTL, and those calls send the instruction uncached. Shorter instructions are sent as the
+    model's system instruction, an identical prefix on every call of a task, which models with
+    implicit caching reuse on their own. The default minimum, 1024 tokens, is the smallest cache the
+    API accepts; the current tasks' instructions are all shorter, so for them this path is inert
+    until an instruction grows past it.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key, model_name, context_cache_ttl=3600, context_cache_min_tokens=1024):
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables.")
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.context_cache_ttl = context_cache_ttl
+        self.context_cache_min_tokens = context_cache_min_tokens
+        # (model_name, system_instruction) -> model; other tiers' and tasks' models are built on first use.
+        self._models = {(model_name, None): self.model}
+        self._models_lock = threading.Lock()
+        # (model_name, system_instruction) -> (model or None when creation failed, refresh at time.monotonic())
+        self._context_caches = {}
+        self._context_cache_lock = threading.Lock()
+
+    def _model(self, model_name, system_instruction=None):
+        key = (model_name or self.model_name, system_instruction)
+        if system_instruction and self.context_cache_ttl > 0 and \
+                estimate_tokens(system_instruction) >= self.context_cache_min_tokens:
+            cached = self._context_cached_model(key)
+            if cached is not None:
+                return cached
+        model = self._models.get(key)
+        if model is None:
+            with self._models_lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = self._models[key] = self._genai.GenerativeModel(key[0], system_instruction=system_instruction)
+        return model
+
+    def _context_cached_model(self, key):
+        """A model bound to a context cache holding the system instruction, or None to send it uncached."""
+        entry = self._context_caches.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        # One creation at a time; the others keep using the previous cache (valid until its TTL) meanwhile.
+        if not self._context_cache_lock.acquire(blocking=entry is None):
+            return entry[0]
+        try:
+            entry = self._context_caches.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                return entry[0]
+            model_name, system_instruction = key
+            try:
+                cached_content = self._genai.caching.CachedContent.create(
+                    model=model_name if model_name.startswith("models/") else f"models/{model_name}",
+                    display_name="resume-ai-instruction", system_instruction=system_instruction,
+                    ttl=f"{int(self.context_cache_ttl)}s")
+                model = self._genai.GenerativeModel.from_cached_content(cached_content)
+                # Replaced before it expires, so in-flight calls never reference an expired cache.
+                refresh_at = time.monotonic() + self.context_cache_ttl * 0.9
+                logger.info("context_cache_created", extra={"fields": {
+                    "model": model_name, "cache": cached_content.name, "instructionTokens": estimate_tokens(system_instruction)}})
+            except Exception as e:
+                model, refresh_at = None, time.monotonic() + self.context_cache_ttl
+                logger.warning("context_cache_unavailable", extra={"fields": {"model": model_name, "error": str(e)}})
+            self._context_caches[key] = (model, refresh_at)
+            return model
+        finally:
+            self._context_cache_lock.release()
+
+    @staticmethod
+    def _options(timeout, response_schema):
+        request_options = {"timeout": timeout} if timeout else None
+        generation_config = None
+        if response_schema is not None:
+            # Structured output: the model is constrained to JSON matching the schema.
+            generation_config = {"response_mime_type": "application/json", "response_schema": response_schema}
+        return generation_config, request_options
+
+    def generate(self, prompt, route=None, stream=False, timeout=None, response_schema=None, model_name=None,
+                 system_instruction=None):
+        generation_config, request_options = self._options(timeout, response_schema)
+        return self._model(model_name, system_instruction).generate_content(
+            prompt, stream=stream, generation_config=generation_config, request_options=request_options)
+
+    async def generate_async(self, prompt, route=None, timeout=None, response_schema=None, model_name=None,
+                             system_instruction=None):
+        generation_config, request_options = self._options(timeout, response_schema)
+        return await self._model(model_name, system_instruction).generate_content_async(
+            prompt, generation_config=generation_config, request_options=request_options)
+
+    def ping(self, timeout=None):
+        """Fetches the model's metadata; raises if the API is unreachable or the key is rejected. Costs no tokens."""
+        self._genai.get_model(f"models/{self.model_name}", request_options={"timeout": timeout} if timeout else None)
+
+
+class StubUpstreamError(Exception):
+    """Simulated upstream failure; code mirrors a Gemini 503 so it is treated as retryable."""
+
+    code = 503
+
+
+_STUB_SKILLS = [
+    "Python", "SQL", "Docker", "Kubernetes", "AWS", "Git", "REST APIs", "CI/CD",
+    "Communication", "Agile/Scrum", "Data Analysis", "TypeScript", "Problem Solving",
+    "Unit Testing", "Linux", "Stakeholder Management",
+]
+
+# Entry ids in the grouped prompts of /api/analyze-resume, which the stub echoes back.
+_STUB_ENTRY_ID = re.compile(r'"id": "([^"]*)"')
+_STUB_GROUP_ROUTES = {"analyze-experience": ("enhance-experience", "enhancedSummary"),
+                      "analyze-projects": ("enhance-project", "enhancedDescription")}
+
+
+class StubBackend:
+    """
+    Deterministic local stand-in for Gemini.
+
+    The response body depends only on the route and a hash of the prompt. Latency,
+    jitter, error rate and malformed-output rate are configurable, and tail_rate of
+    the calls take tail_latency instead (a long-tail upstream); pass a seed to make
+    those random draws reproducible too. model_name is accepted and ignored.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, malformed_rate=0.0, seed=None,
+                 model_name="stub", tail_rate=0.0, tail_latency=1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.model_name = model_name
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            return self._random.random(), self._random.uniform(-self.jitter, self.jitter), self._random.random()
+
+    def _payload(self, route, digest, prompt=""):
+        pick = int(digest[:8], 16)
+        if route in _STUB_GROUP_ROUTES:
+            entry_route, field = _STUB_GROUP_ROUTES[route]
+            return {"entries": [{"id": entry_id, field: self._payload(entry_route, digest)[field]}
+                                for entry_id in _STUB_ENTRY_ID.findall(prompt)]}
+        if route == "generate-summary":
+            return {
+                "refinedSummary": f"Results-driven professional with a record of shipping measurable improvements (ref {digest[:6]}).",
+                "suggestions": [
+                    {"level": "Mid-Level", "text": "Experienced professional who increased team delivery speed by 20% across 3 product lines."},
+                    {"level": "Junior-Level", "text": "Motivated early-career professional with hands-on project experience and strong fundamentals."},
+                ],
+            }
+        if route == "enhance-experience":
+            return {"enhancedSummary": "\n".join([
+                f"• Led a cross-functional initiative that reduced processing time by {10 + pick % 30}%.",
+                "• Developed internal tooling adopted by 4 teams, improving release cadence.",
+                "• Mentored 3 junior engineers and standardized code review practices.",
+            ])}
+        if route == "enhance-project":
+            return {"enhancedDescription": "\n".join([
+                "• Built a web application to streamline resume creation for job seekers.",
+                "• Implemented a REST API and responsive UI to support real-time editing.",
+                "• Deployed the project to the cloud, demonstrating end-to-end delivery skills.",
+            ])}
+        if route == "suggest-skills":
+            start = pick % len(_STUB_SKILLS)
+            return {"suggestedSkills": [_STUB_SKILLS[(start + i) % len(_STUB_SKILLS)] for i in range(6)]}
+        if route == "review-section":
+            return {"suggestions": [{
+                "type": "Tone",
+                "original": "helped",
+                "suggestion": "Replace 'helped' with a stronger verb such as 'drove'.",
+                "explanation": "Weak verb reduces impact.",
+            }]}
+        return {}
+
+    def _body(self, prompt, route, malformed):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        text = json.dumps(self._payload(route, digest, prompt), ensure_ascii=False)
+        if malformed:
+            text = text[: len(text) // 2]
+        return text
+
+    def _prepare(self, prompt, route, system_instruction=None):
+        """Draws the outcome of one call: (delay, failed, text, usage). The instruction only counts as prompt tokens."""
+        roll, jitter, tail_roll = self._draw()
+        delay = max(0.0, (self.tail_latency if tail_roll < self.tail_rate else self.latency) + jitter)
+        failed = roll < self.error_rate
+        malformed = not failed and roll < self.error_rate + self.malformed_rate
+        text = self._body(prompt, route, malformed)
+        prompt_chars = len(prompt) + len(system_instruction or "")
+        usage = SimpleNamespace(
+            prompt_token_count=prompt_chars // 4,
+            candidates_token_count=len(text) // 4,
+            total_token_count=(prompt_chars + len(text)) // 4,
+        )
+        return delay, failed, text, usage
+
+    def generate(self, prompt, route=None, stream=False, timeout=None, response_schema=None, model_name=None,
+                 system_instruction=None):
+        delay, failed, text, usage = self._prepare(prompt, route, system_instruction)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("Stub backend timed out.")
+
+        if not stream:
+            time.sleep(delay)
+            if failed:
+                raise StubUpstreamError("Simulated upstream failure.")
+            return SimpleNamespace(text=text, usage_metadata=usage)
+
+        def chunks():
+            pieces = [text[i:i + 24] for i in range(0, len(text), 24)] or [""]
+            for index, piece in enumerate(pieces):
+                time.sleep(delay / len(pieces))
+                if failed and index == len(pieces) // 2:
+                    raise StubUpstreamError("Simulated upstream failure mid-stream.")
+                yield SimpleNamespace(text=piece, usage_metadata=usage)
+
+        return chunks()
+
+    async def generate_async(self, prompt, route=None, timeout=None, response_schema=None, model_name=None,
+                             system_instruction=None):
+        delay, failed, text, usage = self._prepare(prompt, route, system_instruction)
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError("Stub backend timed out.")
+        await asyncio.sleep(delay)
+        if failed:
+            raise StubUpstreamError("Simulated upstream failure.")
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def ping(self, timeout=None):
+        return None
+
+
+class LazyBackend:
+    """Builds the real backend on its first call in each process; model_name is known up front for cache keys."""
+
+    def __init__(self, factory, name, model_name):
+        self._backend = Lazy(factory, f"{name} backend")
+        self.name = name
+        self.model_name = model_name
+
+    @property
+    def initialized(self):
+        return self._backend.initialized
+
+    @property
+    def init_error(self):
+        return self._backend.error
+
+    def get(self):
+        return self._backend.get()
+
+    def generate(self, prompt, route=None, stream=False, timeout=None, response_schema=None, model_name=None,
+                 system_instruction=None):
+        return self.get().generate(prompt, route=route, stream=stream, timeout=timeout, response_schema=response_schema,
+                                   model_name=model_name, system_instruction=system_instruction)
+
+    async def generate_async(self, prompt, route=None, timeout=None, response_schema=None, model_name=None,
+                             system_instruction=None):
+        return await self.get().generate_async(prompt, route=route, timeout=timeout, response_schema=response_schema,
+                                               model_name=model_name, system_instruction=system_instruction)
+
+    def ping(self, timeout=None):
+        return self.get().ping(timeout)
+
+
+def create_backend(name, api_key=None, model_name="gemini-1.5-flash", lazy=False, cassette=None, record=False,
+                   replay_speed=1.0, context_cache_ttl=3600, context_cache_min_tokens=1024, **stub_options):
+    """
+    Builds the backend selected by LLM_BACKEND ('gemini', 'stub' or 'replay'). stub_options only apply to the stub,
+    context_cache_* only to gemini.
+    'replay' answers from cassette; with record=True the gemini or stub backend records every call into it.
+    With lazy=True a LazyBackend is returned, so a missing API key only surfaces on the first call.
+    """
+    if lazy:
+        if name not in ("gemini", "stub", "replay"):
+            raise ValueError(f"Unknown LLM backend '{name}'. Expected 'gemini', 'stub' or 'replay'.")
+        factory = partial(create_backend, name, api_key=api_key, model_name=model_name, cassette=cassette,
+                          record=record, replay_speed=replay_speed, context_cache_ttl=context_cache_ttl,
+                          context_cache_min_tokens=context_cache_min_tokens, **stub_options)
+        return LazyBackend(factory, name, model_name if name == "gemini" else f"{name}:{model_name}")
+    if name == "replay":
+        return ReplayBackend(cassette, speed=replay_speed, model_name=f"replay:{model_name}")
+    if name == "stub":
+        backend = StubBackend(model_name=f"stub:{model_name}", **stub_options)
+    elif name == "gemini":
+        backend = GeminiBackend(api_key, model_name, context_cache_ttl, context_cache_min_tokens)
+    else:
+        raise ValueError(f"Unknown LLM backend '{name}'. Expected 'gemini', 'stub' or 'replay'.")
+    return RecordingBackend(backend, cassette) if record else backend
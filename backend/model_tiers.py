@@ -0,0 +1,64 @@
+"""
+Model tiering: which Gemini model answers a given call.
+
+Short, formulaic generations (skill lists, a two-sentence summary) do not need the
+strongest model, and long reviews benefit from it. Rules map a route, optionally
+bounded by the prompt's estimated token count, to a tier; each tier names a model.
+A tier without a configured model falls back to the default model, so tiering is
+a no-op until GEMINI_FAST_MODEL or GEMINI_STRONG_MODEL is set.
+
+Rule syntax (comma separated, first match wins):
+    suggest-skills=fast            every call of the route
+    generate-summary<700=fast      prompts under 700 estimated tokens
+    review-section>3000=strong     prompts over 3000 estimated tokens
+"""
+import re
+from collections import namedtuple
+
+TierRule = namedtuple("TierRule", ["route", "op", "tokens", "tier"])
+
+_RULE = re.compile(r"^\s*([\w-]+)\s*(?:([<>])\s*(\d+))?\s*=\s*(\w+)\s*$")
+
+
+def parse_tier_rules(spec):
+    """Parses the rule syntax above. Raises ValueError on a malformed rule."""
+    rules = []
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        match = _RULE.match(item)
+        if match is None:
+            raise ValueError(f"Invalid model tier rule '{item.strip()}'. Expected route[<tokens|>tokens]=tier.")
+        route, op, tokens, tier = match.groups()
+        rules.append(TierRule(route, op, int(tokens) if tokens else None, tier))
+    return rules
+
+
+class ModelTiering:
+    """Chooses (tier, model_name) for a call from the route and its prompt size."""
+
+    def __init__(self, rules, tier_models, default_model):
+        self.rules = rules
+        self.tier_models = {tier: model for tier, model in tier_models.items() if model}
+        self.default_model = default_model
+
+    def route_models(self, route):
+        """
+        The models route's calls can use: the default model, plus tier=model for each tier its rules
+        can pick. Cached answers are keyed on it, so changing any of those models misses the cache.
+        """
+        tiers = sorted({rule.tier for rule in self.rules if rule.route == route and rule.tier in self.tier_models})
+        return ";".join([self.default_model] + [f"{tier}={self.tier_models[tier]}" for tier in tiers])
+
+    def choose(self, route, prompt_tokens):
+        for rule in self.rules:
+            if rule.route != route:
+                continue
+            if rule.op == "<" and not prompt_tokens < rule.tokens:
+                continue
+            if rule.op == ">" and not prompt_tokens > rule.tokens:
+                continue
+            model = self.tier_models.get(rule.tier)
+            if model:
+                return rule.tier, model
+        return "default", self.default_model
@@ -0,0 +1,256 @@
+"""
+Structured logging and Prometheus-style metrics for the backend.
+
+Logging: records are JSON lines written by a background QueueListener, so request
+threads only enqueue and never block on stdout. The listener thread starts with the
+first record each process logs, so configuring logging at import starts no thread and
+a forked worker gets a writer of its own. Request/response payloads are only attached
+to a configurable sample of records (LOG_PAYLOAD_SAMPLE_RATE).
+
+Metrics: a minimal in-process registry of counters and histograms rendered in
+the Prometheus text exposition format by the /metrics route. No extra dependency.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger("resume_ai")
+
+_handler = None
+_payload_sample_rate = 0.0
+_payload_max_chars = 2000
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event and any structured fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable variant for local development."""
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        extras = " ".join(f"{k}={v!r}" for k, v in fields.items())
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {record.getMessage()} {extras}".rstrip()
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Enqueues records for a QueueListener writing to target, started on the first record in each process."""
+
+    def __init__(self, target):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self._stop)
+        if hasattr(os, "register_at_fork"):
+            # A lock held by another thread at fork time would never be released in the child.
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # In a forked child the parent's writer thread does not exist: start over with a fresh queue.
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def _stop(self):
+        """Writes out what is still queued (at exit)."""
+        if self._pid == os.getpid():
+            self.listener.stop()
+            self._pid = None
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        super().enqueue(record)
+
+
+def setup_logging(level="INFO", payload_sample_rate=0.0, payload_max_chars=2000, log_format="json"):
+    """
+    Routes the 'resume_ai' logger tree through a non-blocking queue. Safe to call more than once;
+    the writer thread starts with the first record logged.
+    """
+    global _handler, _payload_sample_rate, _payload_max_chars
+    _payload_sample_rate = payload_sample_rate
+    _payload_max_chars = payload_max_chars
+    logger.setLevel(level)
+    if _handler is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+    _handler = _LazyQueueHandler(stream_handler)
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+
+def log_event(level, event, **fields):
+    """Logs an event name with structured fields on the 'resume_ai' logger."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+def log_payload(level, event, payload, **fields):
+    """Like log_event, but attaches (a truncated copy of) payload to a sample of records only."""
+    if not logger.isEnabledFor(level):
+        return
+    if payload and _payload_sample_rate > 0 and random.random() < _payload_sample_rate:
+        fields["payload"] = payload[:_payload_max_chars]
+    logger.log(level, event, extra={"fields": fields})
+
+
+# --- Metrics ---
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for i, bound in enumerate(self.buckets):
+                    lines.append(f"{self.name}_bucket{_format_labels(names, label_values + (bound,))} {series[i]}")
+                lines.append(f"{self.name}_bucket{_format_labels(names, label_values + ('+Inf',))} {series[-1]}")
+                labels = _format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {round(series[-2], 6)}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+def _snake_case(name):
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+class MetricsRegistry:
+    """Holds counters/histograms plus collectors that export existing stats() dicts as gauges."""
+
+    def __init__(self, prefix="resume_ai"):
+        self.prefix = prefix
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(f"{self.prefix}_{name}", help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(f"{self.prefix}_{name}", help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, name, stats_fn):
+        """Exports every numeric value of stats_fn() as a gauge named <prefix>_<name>_<key>."""
+        self._collectors.append((f"{self.prefix}_{name}", stats_fn))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, stats_fn in self._collectors:
+            for key, value in stats_fn().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                gauge = f"{name}_{_snake_case(key)}"
+                lines.append(f"# TYPE {gauge} gauge")
+                lines.append(f"{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Timer:
+    """Context manager measuring elapsed seconds into .elapsed."""
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._started
+        return False
@@ -0,0 +1,316 @@
+"""
+Local rule-based pre-review for /api/review-section.
+
+Catches the mechanical issues without an LLM call, in the same
+{"type", "original", "suggestion", "explanation"} shape Gemini returns:
+  - Spelling: symmetric-delete index over data/review_words.txt (plus derived verb forms);
+              words in data/review_skip_words.txt (tools, technologies, names) are never flagged
+  - Grammar:  doubled words ("the the")
+  - Tone:     weak verbs ("helped", "worked on") and passive phrasing ("was responsible for")
+  - Tense:    bullets of one entry that mix past and present lead verbs
+
+Spelling is deliberately conservative: only lowercase words (or a capitalized first word
+of a line, after any bullet marker) that are unknown *and* close to exactly one best dictionary word with the same
+first letter are flagged. Extending data/review_words.txt reduces false positives.
+"""
+import re
+
+# Action verbs that typically open a resume bullet, with irregular past forms.
+_ACTION_VERBS = (
+    "achieve", "administer", "analyze", "architect", "assess", "automate", "boost", "build:built", "collaborate",
+    "communicate", "compile", "conduct", "consolidate", "coordinate", "create", "cut:cut", "debug", "decrease",
+    "define", "deliver", "deploy", "design", "develop", "direct", "document", "drive:drove", "educate", "eliminate",
+    "enable", "engineer", "enhance", "ensure", "establish", "evaluate", "execute", "expand", "facilitate",
+    "forecast:forecast", "generate", "grow:grew", "guide", "handle", "identify", "implement", "improve", "increase",
+    "initiate", "integrate", "introduce", "launch", "lead:led", "maintain", "manage", "mentor", "migrate",
+    "modernize", "monitor", "negotiate", "optimize", "orchestrate", "organize", "oversee:oversaw", "own",
+    "perform", "pioneer", "plan", "prepare", "present", "prioritize", "produce", "program", "provide", "publish",
+    "recruit", "redesign", "reduce", "refactor", "research", "resolve", "review", "revamp", "run:ran", "scale",
+    "schedule", "secure", "sell:sold", "serve", "ship", "simplify", "spearhead", "standardize", "streamline",
+    "supervise", "support", "teach:taught", "test", "train", "transform", "troubleshoot", "upgrade", "write:wrote",
+)
+# Participles that read as adjectives (or as positive passives) on a resume; not flagged as passive voice.
+_PASSIVE_EXCEPTIONS = {
+    "based", "located", "interested", "dedicated", "motivated", "skilled", "experienced", "qualified", "required",
+    "involved", "excited", "certified", "focused", "detailed", "advanced", "talented", "promoted", "selected",
+    "awarded", "recognized", "nominated", "invited", "hired", "named", "organized", "used", "supposed",
+}
+_WEAK_PHRASES = (
+    (r"\b(?:was|were|am|is|are)\s+responsible\s+for\b|\bresponsible\s+for\b",
+     "Start with an action verb (e.g., 'Managed', 'Led', 'Owned') instead of '{0}'.",
+     "Passive phrasing describes duties instead of achievements."),
+    (r"\b(?:was|were)\s+involved\s+in\b|\binvolved\s+in\b|\bparticipated\s+in\b|\bwas\s+part\s+of\b|\bworked\s+on\b",
+     "Replace '{0}' with a verb that states your contribution (e.g., 'Built', 'Delivered', 'Drove').",
+     "Vague phrasing hides what you actually did."),
+    (r"\b(?:helped|assisted)(?:\s+(?:with|in))?\b",
+     "Replace '{0}' with a stronger verb such as 'Drove', 'Enabled' or 'Supported'.",
+     "Weak verb reduces impact."),
+    (r"\btasked\s+with\b|\bduties\s+included\b|\bin\s+charge\s+of\b|\btried\s+to\b",
+     "Rephrase '{0}' to lead with the action and its result.",
+     "Duty-oriented phrasing sounds passive."),
+)
+_PASSIVE = re.compile(
+    r"\b(?:was|were|is|are|been|being)\s+(?:\w+ly\s+)?"
+    r"(\w+ed|built|led|made|done|given|taken|written|shown|run|chosen|sent|held|brought|kept|won)\b(\s+by\b)?",
+    re.IGNORECASE,
+)
+_DOUBLED_WORD = re.compile(r"\b([A-Za-z]+)\s+(\1)\b", re.IGNORECASE)
+_ALLOWED_DOUBLES = {"that", "had"}
+_ENTRY_SEPARATOR = re.compile(r"\n[ \t]*-{3,}[ \t]*\n")
+_BULLET_PREFIX = re.compile(r"^[ \t]*(?:[-*•▪◦‣]|\d+[.)])?[ \t]*")
+_TOKEN = re.compile(r"\S+")
+_EDGE_PUNCTUATION = ".,;:!?()[]{}\"'`•*-–—"
+
+
+def _osa_distance(a, b, limit):
+    """Optimal string alignment distance (edits incl. adjacent transpositions), or limit + 1 if larger."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _deletes(word, max_distance):
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {candidate[:i] + candidate[i + 1:] for candidate in frontier for i in range(len(candidate))}
+        results |= frontier
+    return results
+
+
+class SymmetricDeleteIndex:
+    """Spelling candidates via precomputed deletes (SymSpell); words earlier in the list win ties."""
+
+    def __init__(self, words, max_distance=2):
+        self.max_distance = max_distance
+        self.rank = {}
+        self._deletes = {}
+        for word in words:
+            if word in self.rank:
+                continue
+            self.rank[word] = len(self.rank)
+            for delete in _deletes(word, max_distance):
+                self._deletes.setdefault(delete, []).append(word)
+
+    def __contains__(self, word):
+        return word in self.rank
+
+    def lookup(self, word, max_distance):
+        """Returns (correction, distance) for the closest word, or None if none or several tie for best."""
+        best = []
+        best_distance = max_distance + 1
+        seen = set()
+        for delete in _deletes(word, max_distance):
+            for candidate in self._deletes.get(delete, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = _osa_distance(word, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                if distance < best_distance:
+                    best, best_distance = [candidate], distance
+                elif distance == best_distance:
+                    best.append(candidate)
+        if not best:
+            return None
+        # Prefer words ending like the input ('skils' -> 'skills', not 'skill'), then more frequent words.
+        best.sort(key=lambda candidate: (candidate[-1] != word[-1], self.rank[candidate]))
+        # Several equally close, equally plausible words of similar frequency: too ambiguous to suggest one.
+        if len(best) > 1 and (best[1][-1] == word[-1]) == (best[0][-1] == word[-1]) \
+                and self.rank[best[1]] - self.rank[best[0]] < 200:
+            return None
+        return best[0], best_distance
+
+
+def _verb_forms(spec):
+    """(base, third person, past) for an entry of _ACTION_VERBS."""
+    base, _, irregular_past = spec.partition(":")
+    if irregular_past:
+        past = irregular_past
+    elif base.endswith("e"):
+        past = base + "d"
+    elif base.endswith("y") and base[-2] not in "aeiou":
+        past = base[:-1] + "ied"
+    elif base in ("plan", "ship", "scrap"):
+        past = base + base[-1] + "ed"
+    else:
+        past = base + "ed"
+    if base.endswith(("s", "sh", "ch", "x", "z")):
+        third = base + "es"
+    elif base.endswith("y") and base[-2] not in "aeiou":
+        third = base[:-1] + "ies"
+    else:
+        third = base + "s"
+    return base, third, past
+
+
+def _stems(word):
+    """Candidate base forms of an inflected word (plural, past, -ing, -ly, -er, -ment, -ness)."""
+    for suffix, replacements in (("ies", ("y",)), ("ied", ("y",)), ("ing", ("", "e")), ("ed", ("", "e")),
+                                 ("es", ("", "e")), ("s", ("",)), ("ly", ("",)), ("ers", ("", "e")),
+                                 ("er", ("", "e")), ("ments", ("",)), ("ment", ("",)), ("ness", ("",))):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stem = word[:-len(suffix)]
+            for replacement in replacements:
+                yield stem + replacement
+            if len(stem) > 3 and stem[-1] == stem[-2]:
+                yield stem[:-1]
+
+
+def _read_words(path):
+    """The lowercased words of a word list file, skipping # comment lines."""
+    words = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.startswith("#"):
+                words.extend(word.lower() for word in line.split())
+    return words
+
+
+class PreReviewer:
+    """Runs all local checks over a section's text."""
+
+    def __init__(self, words_path=None, skip_words_path=None):
+        self._verbs = {}  # lowercased form -> (base, third person, past, tense)
+        self._skip_words = set(_read_words(skip_words_path)) if skip_words_path else set()
+        words = []
+        for spec in _ACTION_VERBS:
+            base, third, past = _verb_forms(spec)
+            self._verbs[base] = (base, third, past, "present")
+            self._verbs[third] = (base, third, past, "present")
+            self._verbs[past] = (base, third, past, "past")
+        if words_path:
+            words.extend(_read_words(words_path))
+        words.extend(self._verbs)
+        self._spelling = SymmetricDeleteIndex(words)
+        self._weak_phrases = [(re.compile(pattern, re.IGNORECASE), suggestion, explanation)
+                              for pattern, suggestion, explanation in _WEAK_PHRASES]
+
+    def analyze(self, text):
+        """Returns [(position, suggestion), ...] sorted by position in text."""
+        found = []
+        found.extend(self._check_phrases(text))
+        found.extend(self._check_doubled_words(text))
+        found.extend(self._check_spelling(text))
+        found.extend(self._check_tense(text))
+        found.sort(key=lambda entry: entry[0])
+        return found
+
+    def _check_phrases(self, text):
+        taken = []
+        for pattern, suggestion, explanation in self._weak_phrases:
+            for match in pattern.finditer(text):
+                if any(match.start() < end and start < match.end() for start, end in taken):
+                    continue
+                taken.append(match.span())
+                yield match.start(), {"type": "Tone", "original": match.group(0),
+                                      "suggestion": suggestion.format(match.group(0)), "explanation": explanation}
+        for match in _PASSIVE.finditer(text):
+            if match.group(1).lower() in _PASSIVE_EXCEPTIONS:
+                continue
+            if any(match.start() < end and start < match.end() for start, end in taken):
+                continue
+            yield match.start(), {
+                "type": "Tone",
+                "original": match.group(0),
+                "suggestion": f"Rewrite in active voice, leading with the verb (e.g., '{match.group(1).capitalize()} ...').",
+                "explanation": "Passive voice detected, suggest active.",
+            }
+
+    def _check_doubled_words(self, text):
+        for match in _DOUBLED_WORD.finditer(text):
+            if match.group(1).lower() in _ALLOWED_DOUBLES:
+                continue
+            yield match.start(), {
+                "type": "Grammar",
+                "original": match.group(0),
+                "suggestion": f"Remove the repeated word: '{match.group(1)}'.",
+                "explanation": "Doubled word.",
+            }
+
+    def _is_known(self, word):
+        return word in self._spelling or word in self._skip_words or any(stem in self._spelling for stem in _stems(word))
+
+    def _check_spelling(self, text):
+        for match in _TOKEN.finditer(text):
+            raw = match.group(0)
+            # The first word of a line may be capitalized, also behind a bullet marker ('• Recieved').
+            line = text[text.rfind("\n", 0, match.start()) + 1:match.start()]
+            at_line_start = _BULLET_PREFIX.fullmatch(line) is not None
+            core = raw.strip(_EDGE_PUNCTUATION)
+            if not core.isalpha() or not core.isascii() or len(core) < 3:
+                continue
+            if not (core.islower() or (at_line_start and core[0].isupper() and core[1:].islower())):
+                continue
+            word = core.lower()
+            if self._is_known(word):
+                continue
+            max_distance = 1 if len(word) < 7 else 2
+            result = self._spelling.lookup(word, max_distance)
+            if result is None:
+                continue
+            correction, distance = result
+            if correction[0] != word[0] and (distance > 1 or correction[:2] != word[1::-1]):
+                continue  # typos rarely change the first letter; allow only 'hte' -> 'the' style swaps
+            if len(word) == 3 and sorted(correction) != sorted(word):
+                continue  # short words: only transpositions such as 'teh' are reliable
+            if core[0].isupper():
+                correction = correction.capitalize()
+            yield match.start() + raw.index(core), {
+                "type": "Spelling",
+                "original": core,
+                "suggestion": f"Did you mean '{correction}'?",
+                "explanation": "Potential typo found.",
+            }
+
+    def _check_tense(self, text):
+        entry_start = 0
+        boundaries = [m for m in _ENTRY_SEPARATOR.finditer(text)] + [None]
+        for boundary in boundaries:
+            entry_end = boundary.start() if boundary else len(text)
+            yield from self._check_entry_tense(text, entry_start, entry_end)
+            if boundary:
+                entry_start = boundary.end()
+
+    def _check_entry_tense(self, text, start, end):
+        leads = []
+        position = start
+        for line in text[start:end].split("\n"):
+            prefix = _BULLET_PREFIX.match(line).end()
+            word_match = re.match(r"[A-Za-z]+", line[prefix:])
+            if word_match:
+                verb = self._verbs.get(word_match.group(0).lower())
+                if verb is not None:
+                    leads.append((position + prefix, word_match.group(0), verb))
+            position += len(line) + 1
+
+        past = sum(1 for _, _, verb in leads if verb[3] == "past")
+        present = len(leads) - past
+        if not past or not present:
+            return
+        majority = "past" if past >= present else "present"
+        for offset, word, (base, third, past_form, tense) in leads:
+            if tense == majority:
+                continue
+            replacement = past_form if majority == "past" else base
+            if word[0].isupper():
+                replacement = replacement.capitalize()
+            yield offset, {
+                "type": "Tense",
+                "original": word,
+                "suggestion": f"Use '{replacement}' to match the {majority} tense used in the other bullets.",
+                "explanation": "Inconsistent verb tense within one entry; use past tense for completed work and present tense only for a current role.",
+            }
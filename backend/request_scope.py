@@ -0,0 +1,193 @@
+"""
+Per-request deadlines and cancellation.
+
+A RequestScope carries one API request's overall deadline and whether it has been
+cancelled. The deadline is the route's default, or sooner when the client sends an
+X-Request-Timeout header (seconds); every model call the request makes is bounded
+by it, including governor queueing, retries and hedges. A request is cancelled when
+its client disconnects or its deadline passes; work still queued or not yet started
+for it is then dropped, and the thread waiting on it is released at once.
+
+A busy Flask worker never reads from its connection again, so it cannot notice a
+closed one by itself. DisconnectMonitor watches the sockets of in-flight requests
+from one background thread instead: once the request body has been read, a socket
+that turns readable but yields no data has been closed by the client. The Werkzeug
+server and gunicorn expose the socket in the WSGI environ; under other servers
+requests are simply not watched. The ASGI app gets http.disconnect from the server.
+"""
+import logging
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
+
+from governor import RequestCancelledError, UpstreamTimeoutError
+
+logger = logging.getLogger("resume_ai.request_scope")
+
+TIMEOUT_HEADER = "X-Request-Timeout"
+WSGI_SOCKET_KEYS = ("gunicorn.socket", "werkzeug.socket")
+
+
+def request_deadline(header_value, default_seconds):
+    """
+    The request's deadline (time.monotonic()): default_seconds from now, or the X-Request-Timeout
+    value when that is sooner. A client cannot extend the route's default; invalid values are ignored.
+    """
+    seconds = default_seconds
+    try:
+        requested = float(header_value) if header_value else None
+    except ValueError:
+        requested = None
+    if requested is not None and 0 < requested < seconds:
+        seconds = requested
+    return time.monotonic() + seconds
+
+
+class RequestScope:
+    """
+    Deadline and cancellation state of one API request, and the tenant (tenants.py) its model
+    calls are charged to and queued as. cancel() may be called from any thread.
+    """
+
+    def __init__(self, route, deadline, tenant=None):
+        self.route = route
+        self.deadline = deadline
+        self.tenant = tenant
+        self.reason = None
+        # A threading.Event, so the governor can wait on it directly.
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._wakeups = set()
+
+    def cancel(self, reason):
+        """Marks the request as abandoned ('disconnected' or 'deadline'). Returns False when it already was."""
+        with self._lock:
+            if self.cancelled.is_set():
+                return False
+            self.reason = reason
+            self.cancelled.set()
+            wakeups, self._wakeups = self._wakeups, set()
+        for wakeup in wakeups:
+            wakeup.set_result(None)
+        return True
+
+    def error(self):
+        """The GovernorError a cancelled request's pending work ends with: 504 past the deadline, 499 otherwise."""
+        if self.reason == 'deadline':
+            return UpstreamTimeoutError("The request did not finish before its deadline.", 1)
+        return RequestCancelledError("The request was cancelled because the client disconnected.")
+
+    def check(self):
+        """Raises error() once the request has been cancelled."""
+        if self.cancelled.is_set():
+            raise self.error()
+
+    def wait(self, future):
+        """
+        Returns future.result(), unless the request is cancelled first: then error() is raised at
+        once, and the future is cancelled if it has not started (a running one finishes unobserved).
+        """
+        wakeup = Future()
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._wakeups.add(wakeup)
+        if not self.cancelled.is_set():
+            wait([future, wakeup], return_when=FIRST_COMPLETED)
+            with self._lock:
+                self._wakeups.discard(wakeup)
+        if future.done():
+            return future.result()
+        future.cancel()
+        raise self.error()
+
+
+def wsgi_socket(environ):
+    """The client socket of a WSGI request, or None when the server does not expose it."""
+    for key in WSGI_SOCKET_KEYS:
+        sock = environ.get(key)
+        if isinstance(sock, socket.socket):
+            return sock
+    return None
+
+
+class DisconnectMonitor:
+    """
+    Cancels the RequestScope of a watched WSGI request as soon as its client closes the connection.
+    One daemon thread serves every watched socket; it is started on first use.
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._selector = None
+        self._thread = None
+        self._watched = 0
+
+    @contextmanager
+    def watch(self, environ, scope):
+        """Watches the request's socket for the duration of the block. Call it after reading the body."""
+        sock = wsgi_socket(environ) if self.interval > 0 else None
+        if sock is None or not self._register(sock, scope):
+            yield
+            return
+        try:
+            yield
+        finally:
+            self._unregister(sock)
+
+    def _register(self, sock, scope):
+        with self._lock:
+            if self._selector is None:
+                self._selector = selectors.DefaultSelector()
+                self._thread = threading.Thread(target=self._run, name="disconnect-monitor", daemon=True)
+                self._thread.start()
+            try:
+                self._selector.register(sock, selectors.EVENT_READ, scope)
+            except (KeyError, ValueError, OSError):
+                return False  # already watched (pipelined request) or not a selectable socket
+            self._watched += 1
+            return True
+
+    def _unregister(self, sock, scope=None):
+        """Stops watching sock; with scope, only while sock is still watched for that request. Returns True if it was."""
+        with self._lock:
+            try:
+                if scope is not None and self._selector.get_key(sock).data is not scope:
+                    return False  # the request finished and the connection already carries the next one
+                self._selector.unregister(sock)
+            except (KeyError, ValueError, OSError):
+                return False  # the other side already dropped it
+            self._watched -= 1
+            return True
+
+    def _closed_by_client(self, sock):
+        try:
+            return sock.recv(1, socket.MSG_PEEK | getattr(socket, "MSG_DONTWAIT", 0)) == b''
+        except (BlockingIOError, InterruptedError):
+            return False
+        except ValueError:
+            return False  # TLS sockets cannot peek; treat as still connected
+        except OSError:
+            return True  # reset by peer
+
+    def _run(self):
+        while True:
+            try:
+                ready = self._selector.select(timeout=self.interval)
+            except OSError:
+                time.sleep(self.interval)  # a socket was closed while being selected on
+                continue
+            for key, _ in ready:
+                sock, scope = key.fileobj, key.data
+                closed = self._closed_by_client(sock)
+                # Readable with data is a pipelined next request, not a disconnect; either way
+                # the socket would stay readable, so it is not watched any longer.
+                if self._unregister(sock, scope) and closed and scope.cancel('disconnected'):
+                    logger.info("client_disconnected", extra={"fields": {"route": scope.route}})
+
+    def stats(self):
+        with self._lock:
+            return {"watchedRequests": self._watched}
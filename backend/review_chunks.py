@@ -0,0 +1,109 @@
+"""
+Map-reduce helpers for reviewing long resume sections.
+
+The frontend reviews "Experience (All Entries)" and "Projects (All Entries)" as one
+text with the entries joined by '---' lines. Long sections are split on those entry
+boundaries into token-bounded chunks that are reviewed in parallel. The suggestions
+are then merged back in document order, and overlapping ones are dropped.
+"""
+import re
+
+from governor import estimate_tokens
+
+_ENTRY_SEPARATOR = re.compile(r"\n[ \t]*-{3,}[ \t]*\n")
+
+
+def _entry_spans(text):
+    """(start, end) of each entry between '---' separator lines."""
+    spans = []
+    start = 0
+    for match in _ENTRY_SEPARATOR.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+    return [(s, e) for s, e in spans if text[s:e].strip()]
+
+
+def _split_oversized(text, start, end, max_tokens):
+    """Splits one entry that is too large on its own at line boundaries."""
+    spans = []
+    piece_start = start
+    position = start
+    for line in text[start:end].splitlines(keepends=True):
+        line_end = position + len(line)
+        if position > piece_start and estimate_tokens(text[piece_start:line_end]) > max_tokens:
+            spans.append((piece_start, position))
+            piece_start = position
+        position = line_end
+    spans.append((piece_start, end))
+    return spans
+
+
+def split_review_text(text, max_chunk_tokens):
+    """
+    Packs consecutive entries into chunks of at most max_chunk_tokens (estimated).
+    Returns a list of (offset, chunk_text); a short text comes back as a single chunk.
+    """
+    if max_chunk_tokens <= 0 or estimate_tokens(text) <= max_chunk_tokens:
+        return [(0, text)]
+
+    pieces = []
+    for start, end in _entry_spans(text):
+        if estimate_tokens(text[start:end]) > max_chunk_tokens:
+            pieces.extend(_split_oversized(text, start, end, max_chunk_tokens))
+        else:
+            pieces.append((start, end))
+
+    chunks = []
+    chunk_start, chunk_end = pieces[0]
+    for start, end in pieces[1:]:
+        if estimate_tokens(text[chunk_start:end]) > max_chunk_tokens:
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = start
+        chunk_end = end
+    chunks.append((chunk_start, chunk_end))
+    return [(start, text[start:end]) for start, end in chunks]
+
+
+def _normalize(snippet):
+    return " ".join(snippet.split()).lower()
+
+
+def merge_review_suggestions(text, chunk_results):
+    """
+    Merges per-chunk suggestion lists into one list in document order.
+
+    chunk_results is a list of (offset, suggestions). Each suggestion is placed by where
+    its 'original' snippet occurs in text (falling back to the chunk offset). A suggestion
+    of the same type whose snippet overlaps one already kept is treated as a duplicate, as
+    is a repeated suggestion whose snippet could not be located.
+    """
+    placed = []
+    for chunk_index, (offset, suggestions) in enumerate(chunk_results):
+        for item_index, item in enumerate(suggestions):
+            original = item.get('original', '')
+            position = text.find(original, offset) if original else -1
+            if position == -1:
+                start, end = offset, offset
+            else:
+                start, end = position, position + len(original)
+            placed.append((start, chunk_index, item_index, end, item))
+    placed.sort(key=lambda entry: entry[:3])
+
+    merged = []
+    kept_spans = []
+    unplaced = set()
+    for start, _, _, end, item in placed:
+        kind = item.get('type')
+        if end > start:
+            if any(kept_kind == kind and start < kept_end and kept_start < end
+                   for kept_kind, kept_start, kept_end in kept_spans):
+                continue
+            kept_spans.append((kind, start, end))
+        else:
+            identity = (kind, _normalize(item.get('original', '')), _normalize(item.get('suggestion', '')))
+            if identity in unplaced:
+                continue
+            unplaced.add(identity)
+        merged.append(item)
+    return merged
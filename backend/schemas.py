@@ -0,0 +1,96 @@
+"""
+Response schemas of the AI routes.
+
+Each route declares the JSON shape it expects exactly once. The schema is sent to
+Gemini as its structured-output configuration (response_mime_type + response_schema),
+so the model is constrained to emit that shape instead of being asked to in prose.
+The route validators in app.py still check the parsed result.
+"""
+
+_STRING = {"type": "string"}
+
+RESPONSE_SCHEMAS = {
+    "generate-summary": {
+        "type": "object",
+        "properties": {
+            "refinedSummary": _STRING,
+            "suggestions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "level": {"type": "string", "enum": ["Mid-Level", "Junior-Level"]},
+                        "text": _STRING,
+                    },
+                    "required": ["level", "text"],
+                },
+            },
+        },
+        "required": ["refinedSummary", "suggestions"],
+    },
+    "enhance-experience": {
+        "type": "object",
+        "properties": {"enhancedSummary": _STRING},
+        "required": ["enhancedSummary"],
+    },
+    "enhance-project": {
+        "type": "object",
+        "properties": {"enhancedDescription": _STRING},
+        "required": ["enhancedDescription"],
+    },
+    "analyze-experience": {
+        "type": "object",
+        "properties": {
+            "entries": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"id": _STRING, "enhancedSummary": _STRING},
+                    "required": ["id", "enhancedSummary"],
+                },
+            },
+        },
+        "required": ["entries"],
+    },
+    "analyze-projects": {
+        "type": "object",
+        "properties": {
+            "entries": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"id": _STRING, "enhancedDescription": _STRING},
+                    "required": ["id", "enhancedDescription"],
+                },
+            },
+        },
+        "required": ["entries"],
+    },
+    "suggest-skills": {
+        "type": "object",
+        "properties": {"suggestedSkills": {"type": "array", "items": _STRING}},
+        "required": ["suggestedSkills"],
+    },
+    "review-section": {
+        "type": "object",
+        "properties": {
+            "suggestions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "type": {
+                            "type": "string",
+                            "enum": ["Grammar", "Spelling", "Punctuation", "Tense", "Tone", "Clarity"],
+                        },
+                        "original": _STRING,
+                        "suggestion": _STRING,
+                        "explanation": _STRING,
+                    },
+                    "required": ["type", "original", "suggestion", "explanation"],
+                },
+            },
+        },
+        "required": ["suggestions"],
+    },
+}
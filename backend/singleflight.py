@@ -0,0 +1,136 @@
+"""
+Single-flight coalescing for duplicate upstream calls.
+
+Double-clicks, frontend retries and several open tabs often send the same
+payload within a second. When a call with the same key is already running on
+another thread, later callers wait for it and share its result instead of
+starting their own Gemini request. do_async() does the same for coroutines
+running on one event loop.
+
+When a leader gives up because of its own caller (the caller went away, or its
+deadline passed before the answer came), the followers still want the answer
+within their own time: they get FlightAbandoned and can simply call again, one
+of them becoming the new leader.
+"""
+import asyncio
+import copy
+import hashlib
+import threading
+
+
+def fingerprint(*parts):
+    """Hashes the parts that make two upstream calls interchangeable (model, prompt, ...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class FlightAbandoned(Exception):
+    """The shared call was given up on behalf of its leader's caller, not because it failed."""
+
+
+def _abandons(abandoned, error):
+    return abandoned is not None and isinstance(error, Exception) and abandoned(error)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with that key share the outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self._leaders = 0
+        self._followers = 0
+
+    def do(self, key, fn, abandoned=None):
+        """
+        Calls fn() unless a call for key is already in flight, in which case it waits for that one.
+        Followers get a deep copy of the leader's result, and re-raise the leader's exception;
+        FlightAbandoned instead when abandoned(exception) is true, i.e. the error was the
+        leader caller's own rather than the call's.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+                self._leaders += 1
+            else:
+                self._followers += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = FlightAbandoned("The call was given up by its leader.") if _abandons(abandoned, e) else e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, fn, abandoned=None):
+        """
+        Async counterpart of do(): awaits fn() unless an awaited call for key is already in flight.
+        A leader cancelled while awaiting fn() always abandons the call.
+        """
+        with self._lock:
+            future = self._async_calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = asyncio.get_running_loop().create_future()
+                self._async_calls[key] = future
+                self._leaders += 1
+            else:
+                self._followers += 1
+
+        if not is_leader:
+            return copy.deepcopy(await asyncio.shield(future))
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.set_exception(FlightAbandoned("The call was cancelled by its leader."))
+            elif _abandons(abandoned, e):
+                future.set_exception(FlightAbandoned("The call was given up by its leader."))
+            else:
+                future.set_exception(e)
+            # Mark the exception as retrieved so an unawaited future does not log it again.
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+
+    def stats(self):
+        """Returns leader/follower counts and the share of calls that were deduplicated."""
+        with self._lock:
+            leaders, followers = self._leaders, self._followers
+            in_flight = len(self._calls) + len(self._async_calls)
+        total = leaders + followers
+        return {
+            "upstreamCalls": leaders,
+            "coalescedCalls": followers,
+            "inFlight": in_flight,
+            "dedupeRatio": round(followers / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,224 @@
+"""
+Local job-title -> skills index for /api/suggest-skills.
+
+Most skill suggestions are for a few hundred common titles, so they are answered
+from a precomputed file instead of Gemini. Titles are normalized (case, punctuation,
+abbreviations, seniority words) and matched fuzzily with a character-trigram index.
+Candidate skills are ranked by how often they appear with the title, boosted by how
+often they co-occur with skills the user already has.
+
+File format (JSON):
+    {"version": 1,
+     "titles": [{"title": "Data Analyst", "aliases": ["bi analyst"],
+                 "skills": {"SQL": 95, "Excel": 90, "Tableau": 60}}]}
+Skill weights are relative frequencies (0-100) for the title. Titles learned from
+Gemini are kept in a separate file of the same format (learned_path), so the
+shipped index is never rewritten. Several worker processes may learn titles at
+once: each save re-reads the file under a lock (learned_path + ".lock") and
+writes the union, so no worker drops another's titles.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks; the re-read before each save still merges most titles.
+    fcntl = None
+
+logger = logging.getLogger("resume_ai.skill_index")
+
+_ABBREVIATIONS = {
+    "sr": "senior", "jr": "junior", "swe": "software engineer", "sde": "software engineer",
+    "dev": "developer", "devs": "developer", "eng": "engineer", "engr": "engineer",
+    "mgr": "manager", "mgmt": "management", "admin": "administrator", "qa": "quality assurance",
+    "ml": "machine learning", "ai": "artificial intelligence",
+    "fe": "frontend", "be": "backend", "front-end": "frontend", "back-end": "backend",
+    "full-stack": "full stack", "fullstack": "full stack", "hr": "human resources",
+    "pm": "product manager", "assoc": "associate", "asst": "assistant",
+}
+# Seniority and level words do not change which skills a role needs.
+_IGNORED_WORDS = {
+    "senior", "junior", "lead", "principal", "staff", "head", "chief", "intern", "internship",
+    "entry", "level", "associate", "trainee", "graduate", "i", "ii", "iii", "iv", "1", "2", "3",
+    "remote", "contract", "freelance", "of", "the", "and", "&",
+}
+
+
+def normalize_title(title):
+    """Lowercases a job title, expands abbreviations and drops seniority words."""
+    words = re.findall(r"[a-z0-9+#&\-]+", (title or "").lower())
+    expanded = []
+    for word in words:
+        expanded.extend(_ABBREVIATIONS.get(word, word).split())
+    kept = [word for word in expanded if word not in _IGNORED_WORDS]
+    return " ".join(kept or expanded)
+
+
+@contextmanager
+def _file_lock(path):
+    """Holds an exclusive lock on path (created if missing) across processes; without fcntl, none."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SkillIndex:
+    """In-memory index over the skills file plus any learned titles; add() writes new titles back."""
+
+    def __init__(self, path=None, learned_path=None):
+        self.learned_path = learned_path
+        self._learned = []
+        self._titles = []        # [{"title": str, "skills": {skill: weight}}]
+        self._names = []         # (normalized name, title id) for titles and aliases
+        self._exact = {}         # normalized name -> title id
+        self._postings = {}      # trigram -> set of name ids
+        self._name_grams = []
+        self._cooccurrence = {}  # lowercased skill -> {lowercased skill: titles listing both}
+        self._lock = threading.Lock()
+        for source, learned in ((path, False), (learned_path, True)):
+            if source and os.path.exists(source):
+                self.load(source, learned=learned)
+
+    def load(self, path, learned=False):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            for entry in data.get("titles", []):
+                self._add_entry(entry["title"], entry.get("aliases", []), entry.get("skills", {}))
+                if learned:
+                    self._learned.append(self._titles[-1])
+        logger.info("skill_index_loaded", extra={"fields": {"path": path, "titles": len(self._titles)}})
+
+    def __len__(self):
+        return len(self._titles)
+
+    def _add_entry(self, title, aliases, skills):
+        title_id = len(self._titles)
+        self._titles.append({"title": title, "aliases": list(aliases), "skills": dict(skills)})
+        for name in [title, *aliases]:
+            normalized = normalize_title(name)
+            if not normalized or normalized in self._exact:
+                continue
+            name_id = len(self._names)
+            self._names.append((normalized, title_id))
+            self._exact[normalized] = title_id
+            grams = _trigrams(normalized)
+            self._name_grams.append(grams)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(name_id)
+        lowered = [skill.lower() for skill in skills]
+        for skill in lowered:
+            related = self._cooccurrence.setdefault(skill, {})
+            for other in lowered:
+                if other != skill:
+                    related[other] = related.get(other, 0) + 1
+
+    def match(self, job_title):
+        """Returns (title_id, similarity in [0, 1]) of the closest known title, or (None, 0.0)."""
+        normalized = normalize_title(job_title)
+        if not normalized:
+            return None, 0.0
+        title_id = self._exact.get(normalized)
+        if title_id is not None:
+            return title_id, 1.0
+
+        query = _trigrams(normalized)
+        shared = {}
+        for gram in query:
+            for name_id in self._postings.get(gram, ()):
+                shared[name_id] = shared.get(name_id, 0) + 1
+        best_id, best_score = None, 0.0
+        for name_id, count in shared.items():
+            score = count / (len(query) + len(self._name_grams[name_id]) - count)
+            if score > best_score:
+                best_id, best_score = name_id, score
+        if best_id is None:
+            return None, 0.0
+        return self._names[best_id][1], best_score
+
+    def suggest(self, job_title, existing_skills, limit=7, min_confidence=0.6, min_results=5):
+        """
+        Ranks skills for job_title that the user does not already have.
+        Returns (skills, confidence), or (None, confidence) when the match is too weak
+        or too few skills are left to make a good answer.
+        """
+        with self._lock:
+            title_id, confidence = self.match(job_title)
+            if title_id is None or confidence < min_confidence:
+                return None, confidence
+            skills = self._titles[title_id]["skills"]
+            existing_lower = {skill.lower().strip() for skill in existing_skills}
+
+            def score(skill):
+                related = self._cooccurrence.get(skill.lower(), {})
+                boost = sum(related.get(existing, 0) for existing in existing_lower)
+                return skills[skill] + 2 * boost
+
+            candidates = [skill for skill in skills if skill.lower() not in existing_lower]
+            ranked = sorted(candidates, key=lambda skill: (-score(skill), skill))[:limit]
+        if len(ranked) < min_results:
+            return None, confidence
+        return ranked, confidence
+
+    def add(self, job_title, skills):
+        """
+        Adds a title learned from Gemini (rank order becomes the weight) and persists it to learned_path,
+        along with the titles other processes saved there meanwhile. skills should be the title's full
+        answer, not one filtered for a user: every later request for the title is answered from it.
+        """
+        if not job_title or not skills:
+            return
+        with self._lock:
+            if normalize_title(job_title) in self._exact:
+                return
+            weights = {skill: max(100 - 10 * rank, 10) for rank, skill in enumerate(skills)}
+            self._add_entry(job_title.strip(), [], weights)
+            self._learned.append(self._titles[-1])
+            if self.learned_path:
+                self._merge_and_save()
+
+    def _merge_and_save(self):
+        """Adopts titles other processes wrote to learned_path, then writes all learned titles. Call with _lock held."""
+        try:
+            with _file_lock(self.learned_path + ".lock"):
+                for entry in self._read_learned():
+                    if normalize_title(entry["title"]) not in self._exact:
+                        self._add_entry(entry["title"], entry.get("aliases", []), entry.get("skills", {}))
+                        self._learned.append(self._titles[-1])
+                self._save({"version": 1, "titles": self._learned})
+        except OSError as e:
+            logger.warning("skill_index_save_failed", extra={"fields": {"path": self.learned_path, "error": str(e)}})
+
+    def _read_learned(self):
+        if not os.path.exists(self.learned_path):
+            return []
+        try:
+            with open(self.learned_path, encoding="utf-8") as f:
+                return json.load(f).get("titles", [])
+        except ValueError as e:
+            logger.warning("skill_index_learned_unreadable", extra={"fields": {"path": self.learned_path, "error": str(e)}})
+            return []
+
+    def _save(self, snapshot):
+        """Writes the file atomically so a crash never leaves a half-written index. Raises OSError."""
+        directory = os.path.dirname(os.path.abspath(self.learned_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.learned_path)
@@ -0,0 +1,183 @@
+"""
+Declarative registry of the AI tasks behind the routes.
+
+Each task declares once what a route sends to the model and what it does with the
+answer: its input fields (read from the request body, rendered for the prompt and
+bounded in tokens), a static instruction, a context template compiled once at import,
+its response schema and its post-processing (validation and normalization of the
+parsed reply, e.g. bullet formatting or dropping skills the user already has).
+
+The instruction never depends on the request. It is sent as the model's system
+instruction, apart from the rendered context, so every call of a task starts with the
+same tokens and the backend can serve that prefix from a context cache instead of
+having it billed and processed again (see GeminiBackend in llm_backends.py).
+
+Input budgets are enforced before anything is sent upstream. A field past its
+max_tokens is cut at a word boundary, or rejected with InputBudgetError (413) when the
+field says so, e.g. text whose review would be silently incomplete if cut. A rendered
+context past the task's max_input_tokens is rejected as a whole.
+"""
+import string
+import textwrap
+from collections import namedtuple
+
+from governor import estimate_tokens
+
+TRUNCATION_MARK = " …"
+
+
+class InputBudgetError(Exception):
+    """An input is over its token budget and may not be truncated. Answered 413."""
+
+    status_code = 413
+
+    def __init__(self, message, field, tokens, limit):
+        super().__init__(message)
+        self.field = field
+        self.tokens = tokens
+        self.limit = limit
+
+
+def text_or(placeholder):
+    """Formatter rendering an empty value as placeholder, e.g. a missing job title as 'Not Provided'."""
+    def format_value(value):
+        return str(value) if value else placeholder
+    return format_value
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cuts text to about max_tokens (estimate_tokens), at the last word boundary when there is one nearby."""
+    limit = max(0, max_tokens * 4 - len(TRUNCATION_MARK))
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    boundary = cut.rfind(" ")
+    if boundary > limit * 0.8:
+        cut = cut[:boundary]
+    return cut.rstrip() + TRUNCATION_MARK
+
+
+class InputField(namedtuple("InputField", ["name", "default", "format", "max_tokens", "over_budget"])):
+    """
+    One declared input: data[name] (default when missing), rendered for the template by format(value).
+    Past max_tokens the rendered text is truncated (over_budget='truncate') or rejected ('reject').
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, name, default="", format=str, max_tokens=None, over_budget="truncate"):
+        if over_budget not in ("truncate", "reject"):
+            raise ValueError(f"Input '{name}': over_budget must be 'truncate' or 'reject', not '{over_budget}'.")
+        return super().__new__(cls, name, default, format, max_tokens, over_budget)
+
+
+class PromptTemplate:
+    """A str.format-style template ('{field}', '{{' for a literal brace) parsed once; render() only joins."""
+
+    def __init__(self, source):
+        self.source = source
+        parts = []
+        for literal, field, format_spec, conversion in string.Formatter().parse(source):
+            if field is not None and (format_spec or conversion or not field.isidentifier()):
+                raise ValueError(f"Unsupported placeholder '{{{field}}}' in prompt template; use plain '{{name}}'.")
+            parts.append((literal, field))
+        self._parts = tuple(parts)
+        self.fields = frozenset(field for _, field in parts if field is not None)
+
+    def render(self, values):
+        return "".join(literal if field is None else literal + values[field] for literal, field in self._parts)
+
+
+class TaskPrompt(namedtuple("TaskPrompt", ["task", "text", "inputs", "values", "input_tokens", "truncated"])):
+    """
+    One prepared call of a task: the rendered context (text), the raw inputs it was built from,
+    their rendered values, the context's estimated tokens and the names of truncated fields.
+    """
+
+    __slots__ = ()
+
+    @property
+    def instruction(self):
+        return self.task.instruction
+
+    @property
+    def tokens(self):
+        """Estimated prompt tokens of the whole call, instruction included."""
+        return self.task.instruction_tokens + self.input_tokens
+
+    def finalize(self, result_json):
+        """The task's post-processing: (body, None) for a usable reply, otherwise (None, error)."""
+        return self.task.finalize(result_json, self.inputs)
+
+
+class Task:
+    """
+    What one kind of model call sends and how its reply is used.
+    finalize(result_json, inputs) validates and normalizes the parsed reply, returning (body, None)
+    or (None, error), where error is a message or a complete error body. route names the call in
+    metrics, model tiering and the response schema; several tasks may share one (review modes).
+    """
+
+    def __init__(self, name, instruction, template, inputs, finalize, failure_message, route=None, schema=None,
+                 max_input_tokens=None):
+        self.name = name
+        self.route = route or name
+        self.instruction = textwrap.dedent(instruction).strip()
+        self.template = PromptTemplate(textwrap.dedent(template).strip())
+        self.inputs = tuple(inputs)
+        self.finalize = finalize
+        self.failure_message = failure_message
+        self.schema = schema
+        self.max_input_tokens = max_input_tokens
+        self.instruction_tokens = estimate_tokens(self.instruction)
+        undeclared = self.template.fields - {field.name for field in self.inputs}
+        if undeclared:
+            raise ValueError(f"Task '{name}': template uses undeclared inputs {sorted(undeclared)}.")
+
+    def prepare(self, data):
+        """Renders the context for one request body. Raises InputBudgetError for an over-budget input."""
+        inputs, values, truncated = {}, {}, []
+        for field in self.inputs:
+            value = data.get(field.name)
+            value = inputs[field.name] = field.default if value is None else value
+            text = field.format(value)
+            if field.max_tokens and estimate_tokens(text) > field.max_tokens:
+                if field.over_budget == "reject":
+                    tokens = estimate_tokens(text)
+                    raise InputBudgetError(f"'{field.name}' is too long (about {tokens} tokens, limit {field.max_tokens}). "
+                                           "Please shorten it.", field.name, tokens, field.max_tokens)
+                text = truncate_to_tokens(text, field.max_tokens)
+                truncated.append(field.name)
+            values[field.name] = text
+        text = self.template.render(values)
+        input_tokens = estimate_tokens(text)
+        if self.max_input_tokens and input_tokens > self.max_input_tokens:
+            raise InputBudgetError(f"The request is too long (about {input_tokens} tokens, limit {self.max_input_tokens}). "
+                                   "Please shorten it.", None, input_tokens, self.max_input_tokens)
+        return TaskPrompt(self, text, inputs, values, input_tokens, tuple(truncated))
+
+
+class TaskRegistry:
+    """The tasks by name, registered once at import."""
+
+    def __init__(self):
+        self._tasks = {}
+
+    def register(self, task):
+        if task.name in self._tasks:
+            raise ValueError(f"Task '{task.name}' is already registered.")
+        self._tasks[task.name] = task
+        return task
+
+    def __getitem__(self, name):
+        return self._tasks[name]
+
+    def __contains__(self, name):
+        return name in self._tasks
+
+    def __iter__(self):
+        return iter(self._tasks.values())
+
+    def stats(self):
+        return {task.name: {"route": task.route, "instructionTokens": task.instruction_tokens,
+                            "inputs": [field.name for field in task.inputs]} for task in self}
@@ -0,0 +1,250 @@
+"""
+API consumers (tenants): identification, per-tenant quotas and usage.
+
+Every /api/* request is attributed to a tenant by its API key, sent as an X-API-Key
+header or as Authorization: Bearer <key>. A request without a key belongs to the
+anonymous tenant unless keys are required; an unknown key is refused (401). Keys are
+only kept as SHA-256 hashes.
+
+Each tenant has token-bucket quotas for requests and for estimated model tokens per
+minute. A spent quota answers 429 with a Retry-After header instead of waiting, so
+one busy consumer cannot use up the upstream quota all of them share. A tenant's
+weight is its share of the upstream slots while several tenants are queued for them
+(the governor's weighted fair queue).
+
+Tenant syntax (comma separated; options default to TENANT_DEFAULT_*):
+    web:weight=3:rpm=120:tpm=400000    weight 3, 120 requests and 400k tokens a minute
+    reports:rpm=30                     30 requests a minute
+
+TenantStore keeps tenants and their usage in memory. With a path it also loads and
+saves them (weights, quotas, key hashes and cumulative usage) as a JSON file: a local
+stand-in for a shared store, written by one process. With several worker processes
+each counts its own usage and the last one to save wins.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from governor import GovernorError, TokenBucket
+from hedging import LatencyTracker
+
+logger = logging.getLogger("resume_ai.tenants")
+
+ANONYMOUS_TENANT = "anonymous"
+API_KEY_HEADER = "X-API-Key"
+USAGE_FIELDS = ("requests", "errors", "quotaRejections", "modelCalls", "tokens")
+
+_SPEC_OPTIONS = {"weight": float, "rpm": int, "tpm": int}
+
+
+class TenantQuotaError(GovernorError):
+    """A tenant spent its request or token quota (quota is 'requests' or 'tokens'). Answered 429."""
+
+    status_code = 429
+
+    def __init__(self, message, retry_after, tenant_id, quota):
+        super().__init__(message, retry_after)
+        self.tenant_id = tenant_id
+        self.quota = quota
+
+
+def hash_api_key(api_key):
+    return "sha256:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def api_key_from_headers(headers):
+    """The API key of a request (X-API-Key, or an Authorization: Bearer token), or None without one."""
+    api_key = headers.get(API_KEY_HEADER)
+    if not api_key:
+        scheme, _, token = (headers.get("Authorization") or "").partition(" ")
+        api_key = token if scheme.lower() == "bearer" else None
+    return (api_key.strip() or None) if api_key else None
+
+
+def parse_tenant_specs(spec):
+    """Parses the tenant syntax above into {tenant_id: {option: value}}. Raises ValueError on a malformed entry."""
+    tenants = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        tenant_id, *options = [part.strip() for part in item.split(":")]
+        settings = {}
+        for option in options:
+            name, _, value = option.partition("=")
+            try:
+                settings[name] = _SPEC_OPTIONS[name](value)
+            except (KeyError, ValueError):
+                raise ValueError(f"Invalid tenant option '{option}' in '{item.strip()}'. "
+                                 "Expected weight=<number>, rpm=<integer> or tpm=<integer>.") from None
+        if not tenant_id:
+            raise ValueError(f"Invalid tenant '{item.strip()}': missing tenant id.")
+        tenants[tenant_id] = settings
+    return tenants
+
+
+class Tenant:
+    """One API consumer: its fair-queue weight, per-minute quotas (0: unlimited) and usage counters. Thread-safe."""
+
+    def __init__(self, tenant_id, weight=1.0, requests_per_minute=0, tokens_per_minute=0):
+        if weight <= 0:
+            raise ValueError(f"Tenant '{tenant_id}': weight must be positive, not {weight}.")
+        self.id = tenant_id
+        self.weight = float(weight)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._lock = threading.Lock()
+        self.usage = dict.fromkeys(USAGE_FIELDS, 0)
+
+    def _add(self, field, amount=1):
+        with self._lock:
+            self.usage[field] += amount
+
+    def _take(self, bucket, amount, quota, unit):
+        wait = bucket.try_acquire(amount) if bucket is not None else 0
+        if wait:
+            self._add("quotaRejections")
+            limit = self.requests_per_minute if quota == "requests" else self.tokens_per_minute
+            raise TenantQuotaError(f"Quota of {limit} {unit} per minute exceeded. Please try again shortly.",
+                                   wait, self.id, quota)
+
+    def acquire_request(self):
+        """Takes one request from the quota. Raises TenantQuotaError when it is spent."""
+        self._take(self.request_bucket, 1, "requests", "requests")
+
+    def acquire_tokens(self, estimated_tokens):
+        """Takes a model call's estimated tokens from the quota. Raises TenantQuotaError when they are not left."""
+        self._take(self.token_bucket, estimated_tokens, "tokens", "AI tokens")
+        with self._lock:
+            self.usage["modelCalls"] += 1
+            self.usage["tokens"] += estimated_tokens
+
+    def record_tokens(self, estimated_tokens, actual_tokens):
+        """Charges tokens the upstream reported beyond the up-front estimate."""
+        if actual_tokens > estimated_tokens:
+            if self.token_bucket is not None:
+                self.token_bucket.debit(actual_tokens - estimated_tokens)
+            self._add("tokens", actual_tokens - estimated_tokens)
+
+    def record_request(self, status_code):
+        with self._lock:
+            self.usage["requests"] += 1
+            if status_code >= 500:
+                self.usage["errors"] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self.usage)
+        snapshot.update(weight=self.weight, requestsPerMinute=self.requests_per_minute,
+                        tokensPerMinute=self.tokens_per_minute)
+        if self.request_bucket is not None:
+            snapshot["requestBudgetRemaining"] = round(self.request_bucket.available(), 2)
+        if self.token_bucket is not None:
+            snapshot["tokenBudgetRemaining"] = round(self.token_bucket.available(), 2)
+        return snapshot
+
+
+class TenantStore:
+    """
+    Tenants by id and by API key hash, with recent request latencies per tenant. Thread-safe.
+    With path, tenants are loaded from that JSON file and saved back at most every save_interval
+    seconds while requests are recorded (and on save()).
+    """
+
+    def __init__(self, path=None, require_key=False, save_interval=30.0, latency_window=200):
+        self.path = path
+        self.require_key = require_key
+        self.save_interval = save_interval
+        self.latency = LatencyTracker(window=latency_window, min_samples=1)
+        self._lock = threading.Lock()
+        self._tenants = {}
+        self._keys = {}  # API key hash -> tenant id
+        self._saved_at = time.monotonic()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as store_file:
+                records = json.load(store_file).get("tenants", [])
+            for record in records:
+                tenant = self.register(Tenant(record["id"], record.get("weight", 1.0), record.get("requestsPerMinute", 0),
+                                              record.get("tokensPerMinute", 0)), key_hashes=record.get("keyHashes", ()))
+                for field in USAGE_FIELDS:
+                    tenant.usage[field] = record.get("usage", {}).get(field, 0)
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.warning("tenant_store_load_failed", extra={"fields": {"path": self.path, "error": str(e)}})
+
+    def register(self, tenant, api_keys=(), key_hashes=()):
+        """
+        Adds tenant and maps its API keys (plain, or already hashed) to it. A tenant registered again
+        under the same id replaces the earlier one's settings, keeping its usage and keys. Returns the tenant.
+        """
+        with self._lock:
+            previous = self._tenants.get(tenant.id)
+            if previous is not None:
+                tenant.usage = previous.usage
+            self._tenants[tenant.id] = tenant
+            for key_hash in list(key_hashes) + [hash_api_key(api_key) for api_key in api_keys]:
+                self._keys[key_hash] = tenant.id
+        return tenant
+
+    def get(self, tenant_id):
+        with self._lock:
+            return self._tenants.get(tenant_id)
+
+    def identify(self, api_key):
+        """The tenant of an API key; None for an unknown key, or for a missing one when keys are required."""
+        with self._lock:
+            if api_key is None:
+                return None if self.require_key else self._tenants.get(ANONYMOUS_TENANT)
+            tenant_id = self._keys.get(hash_api_key(api_key))
+            return self._tenants.get(tenant_id) if tenant_id is not None else None
+
+    def record_request(self, tenant, seconds, status_code):
+        """Counts one answered request of tenant and its latency."""
+        tenant.record_request(status_code)
+        self.latency.observe(tenant.id, seconds)
+        if self.path and time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """Writes every tenant (settings, key hashes and usage) to path, replacing the file atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            self._saved_at = time.monotonic()
+            tenants = list(self._tenants.values())
+            key_hashes = {}
+            for key_hash, tenant_id in self._keys.items():
+                key_hashes.setdefault(tenant_id, []).append(key_hash)
+        records = []
+        for tenant in tenants:
+            stats = tenant.stats()
+            usage = {field: stats[field] for field in USAGE_FIELDS}
+            records.append({"id": tenant.id, "weight": tenant.weight, "requestsPerMinute": tenant.requests_per_minute,
+                            "tokensPerMinute": tenant.tokens_per_minute, "keyHashes": sorted(key_hashes.get(tenant.id, [])),
+                            "usage": usage})
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as store_file:
+                json.dump({"tenants": records}, store_file, indent=2)
+            os.replace(temporary_path, self.path)
+        except OSError as e:
+            logger.warning("tenant_store_save_failed", extra={"fields": {"path": self.path, "error": str(e)}})
+
+    def stats(self):
+        """{tenant_id: {usage counters, quotas, remaining budgets, "latency": {"samples", "p50", "p90", "p99"}}}."""
+        with self._lock:
+            tenants = list(self._tenants.values())
+        latency = self.latency.stats()
+        return {tenant.id: dict(tenant.stats(),
+                                latency=latency.get(tenant.id, {"samples": 0, "p50": None, "p90": None, "p99": None}))
+                for tenant in tenants}
@@ -0,0 +1,17 @@
+"""
+Test setup: the backend modules are imported flat (as app.py does), and app is configured
+to run without its disk cache, job database or a real upstream before anything imports it.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Tests never reach Gemini, whatever the developer's .env says.
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["CACHE_DB_PATH"] = "none"
+os.environ["JOBS_DB_PATH"] = "none"
+os.environ["STUB_LATENCY_MS"] = "0"
+os.environ.setdefault("LOG_LEVEL", "ERROR")
@@ -0,0 +1,29 @@
+"""Importing app (as gunicorn's preloading master does) must not open data files or start threads."""
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, threading
+opened = []
+def audit(event, args):
+    if event == 'open' and isinstance(args[0], str) and args[0].startswith(sys.argv[1]) \\
+            and not args[0].endswith(('.py', '.pyc', '.env')):
+        opened.append(args[0])
+sys.addaudithook(audit)
+sys.path.insert(0, sys.argv[1])
+import app
+print(opened)
+print([thread.name for thread in threading.enumerate()])
+"""
+
+
+def test_import_opens_no_data_files_and_starts_no_threads():
+    env = dict(os.environ, LLM_BACKEND="stub", LOG_LEVEL="INFO")
+    for name in ("CACHE_DB_PATH", "JOBS_DB_PATH", "SKILL_INDEX_PATH", "WARMUP"):
+        env.pop(name, None)
+    output = subprocess.run([sys.executable, "-c", PROBE, BACKEND_DIR], env=env, cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True).stdout.splitlines()
+    assert output[-2:] == ["[]", "['MainThread']"]
@@ -0,0 +1,90 @@
+"""GeminiGovernor: weighted fair queueing across tenants, and quota taken before (and refunded without) a slot."""
+import threading
+import time
+
+import pytest
+
+from governor import GeminiGovernor, TokenBucket, UpstreamBusyError
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "condition not reached in time"
+        time.sleep(0.005)
+
+
+def test_token_bucket_refund_is_capped_at_capacity():
+    bucket = TokenBucket(60)
+    assert bucket.try_acquire(60) == 0
+    assert bucket.try_acquire(30) == pytest.approx(30, abs=0.5)
+    bucket.refund(20)
+    assert bucket.available() == pytest.approx(20, abs=0.5)
+    bucket.refund(1000)
+    assert bucket.available() == 60
+
+
+def test_slots_go_to_tenants_in_proportion_to_their_weights():
+    governor = GeminiGovernor(requests_per_minute=0, tokens_per_minute=0, max_concurrency=1, queue_timeout=10)
+    order = []
+    release = threading.Event()
+
+    def hold():
+        with governor.slot(100, tenant="holder"):
+            release.wait(5)
+
+    def call(tenant, weight):
+        with governor.slot(100, tenant=tenant, weight=weight):
+            order.append(tenant)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    wait_for(lambda: governor.stats()["active"] == 1)
+    threads = []
+    # The light tenant floods the queue first; the heavy one arrives after it.
+    for tenant, weight in [("light", 1.0)] * 8 + [("heavy", 3.0)] * 8:
+        thread = threading.Thread(target=call, args=(tenant, weight))
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda: governor.stats()["queued"] == len(threads))
+    release.set()
+    for thread in [holder] + threads:
+        thread.join(5)
+    assert len(order) == 16
+    assert order[:8].count("heavy") >= 5
+    tenants = governor.stats()["tenants"]
+    assert tenants["heavy"]["calls"] == tenants["light"]["calls"] == 8
+
+
+def test_call_short_of_quota_never_holds_or_queues_for_a_slot():
+    governor = GeminiGovernor(requests_per_minute=1, tokens_per_minute=0, max_concurrency=1)
+    with governor.slot():
+        with pytest.raises(UpstreamBusyError) as raised:
+            with governor.slot(deadline=time.monotonic() + 1):
+                pass
+        stats = governor.stats()
+        assert stats["active"] == 1 and stats["queued"] == 0
+        assert stats["rejectedRateLimit"] == 1
+    assert raised.value.retry_after > 1
+
+
+def test_quota_is_refunded_when_no_slot_follows():
+    governor = GeminiGovernor(requests_per_minute=10, tokens_per_minute=1000, max_concurrency=1, max_queue=0)
+    with governor.slot(100):
+        with pytest.raises(UpstreamBusyError):
+            with governor.slot(200):
+                pass
+        assert governor.stats()["rejectedQueueFull"] == 1
+        assert governor.request_bucket.available() == pytest.approx(9, abs=0.1)
+        assert governor.token_bucket.available() == pytest.approx(900, abs=1)
+
+
+def test_quota_is_refunded_when_the_queue_wait_times_out():
+    governor = GeminiGovernor(requests_per_minute=10, tokens_per_minute=0, max_concurrency=1, queue_timeout=0.1)
+    with governor.slot():
+        with pytest.raises(UpstreamBusyError):
+            with governor.slot():
+                pass
+        stats = governor.stats()
+        assert stats["rejectedQueueTimeout"] == 1 and stats["queued"] == 0
+        assert governor.request_bucket.available() == pytest.approx(9, abs=0.1)
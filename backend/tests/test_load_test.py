@@ -0,0 +1,42 @@
+"""The load-test benchmark's in-process senders, which must measure answered requests rather than cancelled ones."""
+import asyncio
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+from benchmarks import load_test
+
+
+def test_asgi_sender_gets_answers_rather_than_disconnects():
+    args = load_test.parse_args(["--mode", "asgi", "--stub-latency-ms", "20"])
+    with mock.patch.dict(os.environ):
+        send = load_test.make_asgi_sender(args)
+
+    async def main():
+        return await asyncio.gather(*(send(route, load_test.build_payload(route, index, True))
+                                      for index, route in enumerate(load_test.ROUTES)))
+
+    assert asyncio.run(main()) == [200] * len(load_test.ROUTES)
+
+
+def test_comparison_refuses_a_speedup_when_a_run_had_errors(capsys):
+    def report(rps, error_rate):
+        return {"_overall": {"throughputRps": rps, "errorRate": error_rate}}
+
+    args = SimpleNamespace(concurrency=8)
+    load_test.print_comparison({"sync": report(100, 0.0), "asgi": report(250, 1.0)}, args)
+    assert "no speedup computed" in capsys.readouterr().out
+    load_test.print_comparison({"sync": report(100, 0.0), "asgi": report(250, 0.0)}, args)
+    assert "(2.50x)" in capsys.readouterr().out
+
+
+def test_throughput_counts_successful_responses_only():
+    report = load_test.summarize({"suggest-skills": [(0.01, 200)] * 6 + [(0.01, 499)] * 4}, 2.0)
+    assert report["suggest-skills"]["throughputRps"] == 3.0
+    assert report["_overall"] == {"requests": 10, "errorRate": 0.4, "wallSeconds": 2.0, "throughputRps": 3.0}
+
+
+def test_comparison_fails_when_one_mode_errs_much_more(monkeypatch):
+    reports = iter([({"suggest-skills": [(0.01, 200)] * 10}, 1.0), ({"suggest-skills": [(0.01, 499)] * 10}, 1.0)])
+    monkeypatch.setattr(load_test, "run", lambda args, mode, offset: next(reports))
+    assert load_test.main(["--mode", "both", "--json"]) == 1
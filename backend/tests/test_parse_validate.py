@@ -0,0 +1,95 @@
+"""
+Replays the fixture cassette's recorded replies through parse_gemini_json and each route's
+finalize_* validator. The fixture holds the reply shapes Gemini actually sends besides plain
+JSON: fenced ```json blocks, prose before the object, and bullets joined with escaped \\n.
+Every variant of a route must validate to the same response body.
+"""
+import os
+
+import pytest
+
+import app as A
+from cassettes import Cassette
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "replies.jsonl")
+
+EXISTING_SKILLS = ["SQL", "Excel"]
+
+VALIDATORS = {
+    "generate-summary": A.finalize_summary_result,
+    "enhance-experience": A.finalize_experience_result,
+    "enhance-project": A.finalize_project_result,
+    "suggest-skills": lambda result_json: A.finalize_skills_result(result_json, EXISTING_SKILLS),
+    "review-section": lambda result_json: A.finalize_review_result(result_json, "Summary"),
+}
+
+EXPECTED = {
+    "generate-summary": {
+        "refinedSummary": "Data engineer who cut pipeline costs by 30% while scaling ingestion to 2B events a day.",
+        "suggestions": [
+            {"level": "Mid-Level",
+             "text": "Data engineer with 5 years of building reliable batch and streaming pipelines."},
+            {"level": "Junior-Level",
+             "text": "Early-career data engineer with hands-on Spark and SQL project experience."},
+        ],
+    },
+    "enhance-experience": {
+        "enhancedSummary": "• Migrated 40 nightly jobs to Airflow, cutting failures by 60%.\n"
+                           "• Built a Kafka ingestion service handling 2B events a day.\n"
+                           "• Mentored 2 interns on testing data pipelines.",
+    },
+    "enhance-project": {
+        "enhancedDescription": "• Built a resume builder with React and Flask used by 300 students.\n"
+                               "• Added AI-assisted bullet rewriting with cached model responses.",
+    },
+    "suggest-skills": {"suggestedSkills": ["Airflow", "Spark", "dbt", "Kafka"]},
+    "review-section": {
+        "suggestions": [
+            {"type": "Tense", "original": "manages the team", "suggestion": "managed the team",
+             "explanation": "Use past tense for a completed role."},
+        ],
+    },
+}
+
+RECORDS = Cassette(FIXTURE).calls()
+
+
+def test_fixture_covers_every_reply_shape():
+    variants = {record["variant"] for record in RECORDS}
+    assert {"fenced", "leading-prose", "escaped-newlines"} <= variants
+    assert {record["route"] for record in RECORDS} == set(VALIDATORS)
+
+
+@pytest.mark.parametrize("record", RECORDS, ids=lambda record: f"{record['route']}-{record['variant']}")
+def test_recorded_reply_validates(record):
+    replayed = Cassette(FIXTURE).next_call(record["route"], record["prompt"])
+    result_json = A.parse_gemini_json(replayed["text"], record["route"])
+    body, error = VALIDATORS[record["route"]](result_json)
+    assert error is None
+    assert body == EXPECTED[record["route"]]
+
+
+@pytest.mark.parametrize("route, field", [("enhance-experience", "enhancedSummary"),
+                                          ("enhance-project", "enhancedDescription")])
+def test_bullets_use_real_newlines(route, field):
+    for record in RECORDS:
+        if record["route"] != route:
+            continue
+        body, _ = VALIDATORS[route](A.parse_gemini_json(record["text"], route))
+        assert "\\n" not in body[field]
+        assert all(line.startswith("• ") for line in body[field].split("\n"))
+
+
+def test_suggested_skills_skip_existing_ones():
+    record = next(record for record in RECORDS if record["route"] == "suggest-skills")
+    body, _ = VALIDATORS["suggest-skills"](A.parse_gemini_json(record["text"], "suggest-skills"))
+    lowered = {skill.lower() for skill in body["suggestedSkills"]}
+    assert not lowered & {skill.lower() for skill in EXISTING_SKILLS}
+    assert all(skill == skill.strip() for skill in body["suggestedSkills"])
+
+
+@pytest.mark.parametrize("route", sorted(VALIDATORS))
+def test_reply_without_the_expected_fields_is_rejected(route):
+    body, error = VALIDATORS[route]({"unexpected": "shape"})
+    assert body is None
+    assert error
@@ -0,0 +1,46 @@
+"""Local pre-review spelling: lookups stay within their edit distance, and resume vocabulary is not flagged."""
+import os
+
+import pytest
+
+from pre_review import PreReviewer, SymmetricDeleteIndex
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+WORDS_PATH = os.path.join(DATA_DIR, "review_words.txt")
+SKIP_WORDS_PATH = os.path.join(DATA_DIR, "review_skip_words.txt")
+
+
+@pytest.fixture(scope="module")
+def reviewer():
+    return PreReviewer(WORDS_PATH, SKIP_WORDS_PATH)
+
+
+@pytest.mark.parametrize("word, max_distance, wrong", [("redis", 1, "trends"), ("acheiving", 2, "receiving")])
+def test_lookup_ignores_words_beyond_max_distance(reviewer, word, max_distance, wrong):
+    result = reviewer._spelling.lookup(word, max_distance)
+    assert result is None or (result[0] != wrong and result[1] <= max_distance)
+    assert not any(finding["original"].lower() == word for _, finding in reviewer.analyze(f"Worked with {word} daily."))
+
+
+def test_lookup_never_returns_a_farther_candidate():
+    index = SymmetricDeleteIndex(["trends"], max_distance=2)
+    assert index.lookup("redis", 1) is None
+    assert index.lookup("trend", 1) == ("trends", 1)
+
+
+def test_lookup_still_corrects_close_typos(reviewer):
+    assert reviewer._spelling.lookup("managment", 2) == ("management", 1)
+    assert reviewer._spelling.lookup("teh", 1) == ("the", 1)
+
+
+def test_capitalized_typo_behind_a_bullet_is_checked(reviewer):
+    for bullet in ("• ", "- ", "1. ", ""):
+        findings = reviewer.analyze(f"{bullet}Recieved the award.")
+        assert [finding["original"] for _, finding in findings] == ["Recieved"]
+
+
+@pytest.mark.parametrize("text", ["Recognized for excellence in bedside care.",
+                                  "Led the administration of tableau and figma dashboards.",
+                                  "Built redis caches on kubernetes with terraform."])
+def test_common_resume_words_and_tools_are_not_flagged(reviewer, text):
+    assert not [finding for _, finding in reviewer.analyze(text) if finding["type"] == "Spelling"]
@@ -0,0 +1,166 @@
+"""SingleFlight coalescing: shared results and errors, and followers of a leader that gave up."""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from singleflight import FlightAbandoned, SingleFlight
+
+
+def run_concurrently(flight, key, fn, followers, abandoned=None):
+    """Starts a leader running fn, then followers for the same key. Returns {"leader": ..., "followers": [...]}."""
+    started = threading.Event()
+    release = threading.Event()
+    outcomes = {"followers": []}
+    lock = threading.Lock()
+
+    def leader_fn():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    def call(slot, target):
+        try:
+            outcome = ("ok", flight.do(key, target, abandoned))
+        except BaseException as e:
+            outcome = ("error", e)
+        with lock:
+            if slot == "leader":
+                outcomes["leader"] = outcome
+            else:
+                outcomes["followers"].append(outcome)
+
+    leader = threading.Thread(target=call, args=("leader", leader_fn))
+    leader.start()
+    started.wait(5)
+    threads = [threading.Thread(target=call, args=("follower", fn)) for _ in range(followers)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()["coalescedCalls"] < followers:
+        time.sleep(0.005)
+    release.set()
+    for thread in [leader] + threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_followers_share_one_call_and_get_copies():
+    flight = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return {"suggestedSkills": ["Airflow"]}
+
+    outcomes = run_concurrently(flight, "key", fn, followers=3)
+    assert len(calls) == 1
+    assert outcomes["leader"] == ("ok", {"suggestedSkills": ["Airflow"]})
+    results = [result for _, result in outcomes["followers"]]
+    assert results == [{"suggestedSkills": ["Airflow"]}] * 3
+    results[0]["suggestedSkills"].append("Kafka")
+    assert outcomes["leader"][1]["suggestedSkills"] == ["Airflow"]
+    assert flight.stats() == {"upstreamCalls": 1, "coalescedCalls": 3, "inFlight": 0, "dedupeRatio": 0.75}
+
+
+def test_leader_error_reaches_followers():
+    flight = SingleFlight()
+
+    def fn():
+        raise ValueError("upstream said no")
+
+    outcomes = run_concurrently(flight, "key", fn, followers=2)
+    for kind, error in [outcomes["leader"]] + outcomes["followers"]:
+        assert kind == "error" and isinstance(error, ValueError)
+
+
+def test_followers_of_an_abandoned_call_get_flight_abandoned():
+    flight = SingleFlight()
+
+    def fn():
+        raise TimeoutError("the leader's deadline passed")
+
+    outcomes = run_concurrently(flight, "key", fn, followers=2,
+                                abandoned=lambda error: isinstance(error, TimeoutError))
+    assert isinstance(outcomes["leader"][1], TimeoutError)
+    for kind, error in outcomes["followers"]:
+        assert kind == "error" and isinstance(error, FlightAbandoned)
+
+
+def test_key_is_free_again_after_a_call():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.do("key", lambda: 2) == 2
+    assert flight.stats()["upstreamCalls"] == 2
+
+
+def test_async_followers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ["Airflow"]
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", fn) for _ in range(4)))
+
+    assert asyncio.run(main()) == [["Airflow"]] * 4
+    assert len(calls) == 1
+
+
+def test_async_cancelled_leader_abandons_the_call():
+    flight = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(5)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", fn))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do_async("key", fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(FlightAbandoned):
+            await follower
+
+    asyncio.run(main())
+
+
+def test_follower_retries_when_the_leader_request_times_out(monkeypatch):
+    """A follower with time left becomes the new leader instead of failing with the leader's 504."""
+    import app as A
+
+    calls = []
+
+    def generate(prompt, route=None, timeout=None, **kwargs):
+        # Like a real client, gives up once the request's timeout passes.
+        calls.append(route)
+        if timeout is not None and timeout < 0.3:
+            time.sleep(timeout)
+            raise TimeoutError("Upstream request timed out.")
+        time.sleep(0.3)
+        return SimpleNamespace(text='{"suggestedSkills": ["Airflow"]}', usage_metadata=None)
+
+    monkeypatch.setattr(A.llm_backend, "generate", generate)
+    coalesced = A.gemini_flight.stats()["coalescedCalls"]
+    outcomes = {}
+
+    def request(name, deadline_seconds):
+        client = A.app.test_client()
+        response = client.post("/api/suggest-skills", json={"jobTitle": "Coalesced", "skipCache": True},
+                               headers={"X-Request-Timeout": str(deadline_seconds)})
+        outcomes[name] = response.status_code
+
+    leader = threading.Thread(target=request, args=("leader", 0.15))
+    leader.start()
+    time.sleep(0.05)
+    follower = threading.Thread(target=request, args=("follower", 5))
+    follower.start()
+    leader.join(5)
+    follower.join(5)
+    assert outcomes == {"leader": 504, "follower": 200}
+    assert A.gemini_flight.stats()["coalescedCalls"] == coalesced + 1
+    assert len(calls) == 2
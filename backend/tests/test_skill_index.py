@@ -0,0 +1,80 @@
+"""SkillIndex matching and the learned-titles file shared by worker processes; write-back from /api/suggest-skills."""
+import json
+import multiprocessing
+import os
+import sys
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+
+import app as A
+from lazy import Lazy
+from skill_index import SkillIndex
+
+SKILLS = ["SQL", "Python", "Airflow", "Spark", "dbt", "Kafka", "Snowflake"]
+
+
+def test_suggest_ranks_skills_the_user_lacks():
+    index = SkillIndex(os.path.join(A.data_dir, "skill_index.json"))
+    skills, confidence = index.suggest("Sr. Data Analyst", ["sql", "Excel"])
+    assert confidence == 1.0
+    assert skills and not {"SQL", "Excel"} & set(skills)
+
+
+def test_saving_keeps_titles_other_processes_learned(tmp_path):
+    learned_path = str(tmp_path / "learned.json")
+    first, second = SkillIndex(learned_path=learned_path), SkillIndex(learned_path=learned_path)
+    first.add("Zookeeper", SKILLS)
+    second.add("Beekeeper", SKILLS)
+    with open(learned_path, encoding="utf-8") as f:
+        assert {entry["title"] for entry in json.load(f)["titles"]} == {"Zookeeper", "Beekeeper"}
+    assert second.match("Zookeeper")[1] == 1.0
+    assert len(SkillIndex(learned_path=learned_path)) == 2
+
+
+ANIMALS = ["Bee", "Yak", "Owl", "Emu", "Elk", "Gnu", "Ant", "Cat", "Dog", "Eel", "Fox", "Hen", "Pig", "Ram",
+           "Rat", "Cod", "Koi", "Ape", "Bat", "Cow"]
+
+
+def learn_titles(learned_path, worker):
+    index = SkillIndex(learned_path=learned_path)
+    for animal in ANIMALS[worker::4]:
+        index.add(f"{animal} Keeper", SKILLS)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs fork and fcntl locks")
+def test_concurrent_workers_lose_no_learned_titles(tmp_path):
+    learned_path = str(tmp_path / "learned.json")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=learn_titles, args=(learned_path, worker)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert len(SkillIndex(learned_path=learned_path)) == 20
+
+
+def test_write_back_learns_the_title_without_the_users_skills(monkeypatch, tmp_path):
+    prompts = []
+
+    def generate(prompt, route=None, **kwargs):
+        prompts.append(prompt)
+        return SimpleNamespace(text=json.dumps({"suggestedSkills": SKILLS}), usage_metadata=None)
+
+    learned_path = str(tmp_path / "learned.json")
+    monkeypatch.setattr(A, "skill_index", Lazy(partial(SkillIndex, learned_path=learned_path), "skill-index"))
+    monkeypatch.setattr(A, "SKILL_INDEX_WRITE_BACK", True)
+    monkeypatch.setattr(A.llm_backend, "generate", generate)
+    client = A.app.test_client()
+
+    response = client.post("/api/suggest-skills", json={"jobTitle": "Pipeline Wrangler", "skills": ["SQL", "Excel"]})
+    assert response.get_json() == {"suggestedSkills": SKILLS[1:]}
+    assert "Excel" not in prompts[0]
+    with open(learned_path, encoding="utf-8") as f:
+        assert list(json.load(f)["titles"][0]["skills"]) == SKILLS
+
+    response = client.post("/api/suggest-skills", json={"jobTitle": "Pipeline Wrangler", "skills": ["Kafka"]})
+    assert "SQL" in response.get_json()["suggestedSkills"]
+    assert "Kafka" not in response.get_json()["suggestedSkills"]
+    assert len(prompts) == 1
@@ -0,0 +1,184 @@
+"""Tenants: spec parsing, per-tenant quotas, the key store, and how the API attributes and restricts requests."""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import app as A
+from job_queue import JobStore
+from tenants import ANONYMOUS_TENANT, Tenant, TenantQuotaError, TenantStore, api_key_from_headers, parse_tenant_specs
+
+
+def test_parse_tenant_specs():
+    assert parse_tenant_specs("web:weight=3:rpm=120:tpm=400000, reports:rpm=30,,batch") == {
+        "web": {"weight": 3.0, "rpm": 120, "tpm": 400000},
+        "reports": {"rpm": 30},
+        "batch": {},
+    }
+    assert parse_tenant_specs("") == {}
+
+
+@pytest.mark.parametrize("spec", ["web:burst=3", "web:rpm=fast", ":rpm=3"])
+def test_parse_tenant_specs_rejects_malformed_entries(spec):
+    with pytest.raises(ValueError):
+        parse_tenant_specs(spec)
+
+
+def test_api_key_from_headers():
+    assert api_key_from_headers({"X-API-Key": " key "}) == "key"
+    assert api_key_from_headers({"Authorization": "Bearer key"}) == "key"
+    assert api_key_from_headers({"Authorization": "Basic key"}) is None
+    assert api_key_from_headers({}) is None
+
+
+def test_request_quota_answers_429_with_retry_after():
+    tenant = Tenant("web", requests_per_minute=2)
+    tenant.acquire_request()
+    tenant.acquire_request()
+    with pytest.raises(TenantQuotaError) as raised:
+        tenant.acquire_request()
+    assert raised.value.status_code == 429
+    assert raised.value.quota == "requests" and raised.value.tenant_id == "web"
+    assert raised.value.retry_after >= 29
+    assert tenant.stats()["quotaRejections"] == 1
+
+
+def test_token_quota_counts_model_calls_it_lets_through():
+    tenant = Tenant("web", tokens_per_minute=1000)
+    tenant.acquire_tokens(600)
+    with pytest.raises(TenantQuotaError) as raised:
+        tenant.acquire_tokens(600)
+    assert raised.value.quota == "tokens"
+    stats = tenant.stats()
+    assert (stats["modelCalls"], stats["tokens"], stats["quotaRejections"]) == (1, 600, 1)
+    tenant.record_tokens(600, 700)
+    assert tenant.stats()["tokens"] == 700
+    assert tenant.stats()["tokenBudgetRemaining"] < 400
+
+
+def test_tenant_without_quotas_is_unlimited():
+    tenant = Tenant("web")
+    for _ in range(100):
+        tenant.acquire_request()
+        tenant.acquire_tokens(10_000)
+    assert tenant.stats()["modelCalls"] == 100
+
+
+def test_weight_must_be_positive():
+    with pytest.raises(ValueError):
+        Tenant("web", weight=0)
+
+
+def test_store_identifies_tenants_by_key():
+    store = TenantStore()
+    store.register(Tenant(ANONYMOUS_TENANT))
+    web = store.register(Tenant("web"), api_keys=["web-key"])
+    assert store.identify("web-key") is web
+    assert store.identify("unknown-key") is None
+    assert store.identify(None).id == ANONYMOUS_TENANT
+    store.require_key = True
+    assert store.identify(None) is None
+
+
+def test_store_round_trips_through_its_file(tmp_path):
+    path = str(tmp_path / "tenants.json")
+    store = TenantStore(path)
+    web = store.register(Tenant("web", weight=2, requests_per_minute=60), api_keys=["web-key"])
+    store.record_request(web, 0.2, 200)
+    store.record_request(web, 0.3, 502)
+    store.save()
+    assert "web-key" not in open(path, encoding="utf-8").read()
+
+    reloaded = TenantStore(path).identify("web-key")
+    assert (reloaded.id, reloaded.weight, reloaded.requests_per_minute) == ("web", 2.0, 60)
+    assert (reloaded.usage["requests"], reloaded.usage["errors"]) == (2, 1)
+
+
+# --- The API ---
+
+@pytest.fixture
+def tenants(monkeypatch):
+    """Registers two tenants with fresh ids and keys, and sets the admin key."""
+    suffix = str(time.monotonic_ns())
+    first = A.tenant_store.register(Tenant(f"first-{suffix}"), api_keys=[f"first-key-{suffix}"])
+    second = A.tenant_store.register(Tenant(f"second-{suffix}", requests_per_minute=1), api_keys=[f"second-key-{suffix}"])
+    monkeypatch.setattr(A, "ADMIN_API_KEY", f"admin-key-{suffix}")
+    return SimpleNamespace(first=first, second=second, first_key=f"first-key-{suffix}",
+                           second_key=f"second-key-{suffix}", admin_key=f"admin-key-{suffix}")
+
+
+def test_unknown_key_is_refused(tenants):
+    response = A.app.test_client().post("/api/suggest-skills", json={"jobTitle": "Dev"},
+                                        headers={"X-API-Key": "not-a-key"})
+    assert response.status_code == 401
+
+
+def test_spent_request_quota_is_answered_429(tenants):
+    client = A.app.test_client()
+    headers = {"X-API-Key": tenants.second_key}
+    assert client.post("/api/suggest-skills", json={"jobTitle": "Dev", "skipCache": True}, headers=headers).status_code == 200
+    response = client.post("/api/suggest-skills", json={"jobTitle": "Dev 2", "skipCache": True}, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.parametrize("path", ["/api/cache/stats", "/api/singleflight/stats", "/api/governor/stats"])
+def test_operational_stats_need_the_admin_key(tenants, path):
+    client = A.app.test_client()
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"X-API-Key": tenants.first_key}).status_code == 403
+    assert client.get(path, headers={"X-API-Key": tenants.admin_key}).status_code == 200
+
+
+def test_tenant_stats_show_a_tenant_only_its_own_entry(tenants):
+    client = A.app.test_client()
+    assert list(client.get("/api/tenants/stats").get_json()) == [ANONYMOUS_TENANT]
+    assert client.get("/api/tenants/stats", headers={"X-API-Key": "not-a-key"}).status_code == 401
+    own = client.get("/api/tenants/stats", headers={"X-API-Key": tenants.first_key}).get_json()
+    assert list(own) == [tenants.first.id]
+    everything = client.get("/api/tenants/stats", headers={"X-API-Key": tenants.admin_key}).get_json()
+    assert {tenants.first.id, tenants.second.id, ANONYMOUS_TENANT} <= set(everything)
+
+
+def test_job_status_is_only_shown_to_its_tenant(tenants, monkeypatch, tmp_path):
+    monkeypatch.setattr(A, "job_store", JobStore(str(tmp_path / "jobs.sqlite3")))
+    monkeypatch.setattr(A, "job_workers", SimpleNamespace(ensure_started=lambda: None, notify=lambda: None))
+    client = A.app.test_client()
+    created = client.post("/api/jobs", json={"tasks": [{"id": "1", "route": "generate-summary",
+                                                        "payload": {"currentSummary": "Data engineer"}}]},
+                          headers={"X-API-Key": tenants.first_key})
+    assert created.status_code == 202
+    status_url = created.get_json()["statusUrl"]
+    owner = client.get(status_url, headers={"X-API-Key": tenants.first_key})
+    assert owner.status_code == 200 and owner.get_json()["tenant"] == tenants.first.id
+    assert client.get(status_url, headers={"X-API-Key": tenants.second_key}).status_code == 404
+    assert client.get(status_url).status_code == 404
+
+
+def test_only_the_tenant_whose_call_goes_upstream_is_charged(tenants, monkeypatch):
+    stub_generate = A.llm_backend.generate
+
+    def slow_generate(*args, **kwargs):
+        time.sleep(0.2)
+        return stub_generate(*args, **kwargs)
+
+    monkeypatch.setattr(A.llm_backend, "generate", slow_generate)
+    monkeypatch.setattr(tenants.second, "request_bucket", None)
+    statuses = []
+
+    def request(api_key):
+        response = A.app.test_client().post("/api/generate-summary",
+                                            json={"jobTitle": "Dev", "currentSummary": "coalesced", "skipCache": True},
+                                            headers={"X-API-Key": api_key})
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=request, args=(api_key,))
+               for api_key in (tenants.first_key, tenants.second_key, tenants.second_key)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(5)
+    assert statuses == [200, 200, 200]
+    assert tenants.first.stats()["modelCalls"] + tenants.second.stats()["modelCalls"] == 1